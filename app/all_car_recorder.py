@@ -0,0 +1,426 @@
+#!/usr/bin/env python3
+"""
+Full-field recorder: every active car's position, velocity, lap distance and inputs,
+quantized and stored per channel with XOR compression
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import time
+import zlib
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+
+from rF2data import rFactor2Constants
+from struct_views import field_view
+from quantization import Quantizer, quantizer
+
+FILE_MAGIC = b"LMUCARS2"
+CHUNK_MAGIC = b"CHNK"
+# magic, number of frames, number of vehicles, number of channels
+CHUNK_HEADER = struct.Struct("<4sIHH")
+# channel name length, compressed size, stored dtype, quantization scale (0 for floats) and offset
+CHANNEL_HEADER = struct.Struct("<BI3sdd")
+
+# Channel name -> field of rF2VehicleTelemetry (mLapDist comes from rF2VehicleScoring)
+TELEMETRY_CHANNELS = {
+    "pos_x": "mPos.x",
+    "pos_y": "mPos.y",
+    "pos_z": "mPos.z",
+    "vel_x": "mLocalVel.x",
+    "vel_y": "mLocalVel.y",
+    "vel_z": "mLocalVel.z",
+    "throttle": "mUnfilteredThrottle",
+    "brake": "mUnfilteredBrake",
+    "steering": "mUnfilteredSteering",
+    "clutch": "mUnfilteredClutch",
+}
+CHANNELS = ["elapsed_time"] + list(TELEMETRY_CHANNELS) + ["lap_dist"]
+
+# Sparse time index written next to the recording (<path>.idx), one entry per chunk. The
+# elapsed time restarts at every session, so each session is a segment with its own sorted times
+INDEX_MAGIC = b"LMUIDX02"
+INDEX_DTYPE = np.dtype([
+    ("segment", "<i4"),
+    ("et_first", "<f8"),
+    ("et_last", "<f8"),
+    ("offset", "<i8"),
+    ("size", "<i8"),
+    ("frames", "<i4"),
+])
+
+DEFAULT_CHUNK_FRAMES = 512
+COMPRESSION_LEVEL = 3
+
+
+def encode_channel(values: np.ndarray) -> bytes:
+    """
+    XOR compression of a (frames, vehicles) channel of floats or quantized integers.
+
+    Each value is XORed with the previous sample of the same car, which zeroes the sign,
+    exponent and high mantissa bytes of slowly varying signals. Bytes are then grouped by
+    significance (byte shuffle) so those zero runs are contiguous, and deflated.
+    """
+    bits = np.ascontiguousarray(values).view(f"u{values.dtype.itemsize}")
+    xored = bits.copy()
+    xored[1:] ^= bits[:-1]
+    shuffled = xored.view(np.uint8).reshape(xored.shape + (-1,)).transpose(2, 1, 0)
+    return zlib.compress(np.ascontiguousarray(shuffled).tobytes(), COMPRESSION_LEVEL)
+
+
+def decode_channel(data: bytes, num_frames: int, num_vehicles: int, dtype=np.float64) -> np.ndarray:
+    """Inverse of encode_channel()"""
+    dtype = np.dtype(dtype)
+    shuffled = np.frombuffer(zlib.decompress(data), dtype=np.uint8).reshape(dtype.itemsize, num_vehicles, num_frames)
+    xored = np.ascontiguousarray(shuffled.transpose(2, 1, 0)).view(f"u{dtype.itemsize}")
+    xored = xored.reshape(num_frames, num_vehicles)
+    return np.bitwise_xor.accumulate(xored, axis=0).view(dtype)
+
+
+class AllCarRecorder:
+    """
+    Records the active vehicle slots of rF2Telemetry at every telemetry update.
+
+    Frames are accumulated in preallocated arrays and written as one chunk every chunk_frames
+    frames, or earlier when the set of vehicles on track changes. Only the mNumVehicles active
+    slots are stored, sorted by vehicle ID so that each column always holds the same car.
+    Channels are quantized with their profile (see quantization.py) unless full_precision.
+    Every chunk gets an entry in the <path>.idx time index (see AllCarRecording); a new session
+    (mSession change or elapsed time going backwards) starts a new chunk and index segment.
+    """
+
+    def __init__(self, sim_info, path: str, chunk_frames: int = DEFAULT_CHUNK_FRAMES, full_precision: bool = False):
+        self.sim_info = sim_info
+        self.path = path
+        self.chunk_frames = chunk_frames
+        self.quantizers = {name: quantizer(name, full_precision) for name in CHANNELS}
+        self.frames_written = 0
+        self.bytes_written = 0
+        self.raw_bytes = 0
+        self._file = open(path, "wb")
+        self._file.write(FILE_MAGIC)
+        self._index_file = open(f"{path}.idx", "wb")
+        self._index_file.write(INDEX_MAGIC)
+        self.bytes_written += len(FILE_MAGIC)
+
+        telemetry_vehicles = sim_info.Rf2Tele.mVehicles
+        self._telemetry_ids = field_view(telemetry_vehicles, "mID")
+        self._telemetry_et = field_view(telemetry_vehicles, "mElapsedTime")
+        self._telemetry_views = {name: field_view(telemetry_vehicles, path) for name, path in TELEMETRY_CHANNELS.items()}
+        self._scoring_ids = field_view(sim_info.Rf2Scor.mVehicles, "mID")
+        self._scoring_lap_dist = field_view(sim_info.Rf2Scor.mVehicles, "mLapDist")
+
+        self._vehicle_ids: Optional[np.ndarray] = None
+        self._buffers = {name: np.empty((chunk_frames, rFactor2Constants.MAX_MAPPED_VEHICLES)) for name in CHANNELS}
+        self._count = 0
+        self._version: Optional[int] = None
+        self.segment = 0
+        self._session: Optional[int] = None
+        self._last_et = -np.inf
+
+    def capture(self) -> bool:
+        """Record the current telemetry update if it was not recorded yet"""
+        telemetry = self.sim_info.Rf2Tele
+        version = telemetry.mVersionUpdateEnd
+        if version == self._version:
+            return False
+        self._version = version
+
+        n = max(0, min(telemetry.mNumVehicles, rFactor2Constants.MAX_MAPPED_VEHICLES))
+        if n == 0:
+            return False
+        ids = self._telemetry_ids[:n]
+        order = np.argsort(ids, kind="stable")
+        vehicle_ids = ids[order]
+        et = float(self._telemetry_et[:n].max())
+        session = self.sim_info.Rf2Scor.mScoringInfo.mSession
+        if self._session is not None and (session != self._session or et < self._last_et):
+            self.flush()
+            self.segment += 1
+        self._session = session
+        self._last_et = et
+        if self._vehicle_ids is None or not np.array_equal(vehicle_ids, self._vehicle_ids):
+            self.flush()
+            self._vehicle_ids = vehicle_ids.copy()
+
+        row = self._count
+        self._buffers["elapsed_time"][row, :n] = self._telemetry_et[:n][order]
+        for name, view in self._telemetry_views.items():
+            self._buffers[name][row, :n] = view[:n][order]
+
+        self._buffers["lap_dist"][row, :n] = self._lap_dist(vehicle_ids)
+
+        self._count += 1
+        if self._count == self.chunk_frames:
+            self.flush()
+        return True
+
+    def _lap_dist(self, vehicle_ids: np.ndarray) -> np.ndarray:
+        """Lap distance of the vehicles, which lives in the scoring slots, matched by vehicle ID"""
+        n = max(0, min(self.sim_info.Rf2Scor.mScoringInfo.mNumVehicles, rFactor2Constants.MAX_MAPPED_VEHICLES))
+        lap_dist = np.full(len(vehicle_ids), np.nan)
+        if n == 0:
+            return lap_dist
+        scoring_ids = self._scoring_ids[:n]
+        order = np.argsort(scoring_ids, kind="stable")
+        sorted_ids = scoring_ids[order]
+        match = np.minimum(np.searchsorted(sorted_ids, vehicle_ids), n - 1)
+        found = sorted_ids[match] == vehicle_ids
+        lap_dist[found] = self._scoring_lap_dist[:n][order][match[found]]
+        return lap_dist
+
+    def flush(self):
+        """Write the frames accumulated so far as one chunk"""
+        if self._count == 0 or self._vehicle_ids is None:
+            self._count = 0
+            return
+        n = len(self._vehicle_ids)
+        parts = [CHUNK_HEADER.pack(CHUNK_MAGIC, self._count, n, len(CHANNELS)),
+                 self._vehicle_ids.astype("<i4").tobytes()]
+        for name in CHANNELS:
+            channel_quantizer = self.quantizers[name]
+            encoded = encode_channel(channel_quantizer.encode(self._buffers[name][:self._count, :n]))
+            parts.append(CHANNEL_HEADER.pack(len(name), len(encoded), channel_quantizer.dtype.str.encode(),
+                                             channel_quantizer.scale or 0.0, channel_quantizer.offset))
+            parts.append(name.encode())
+            parts.append(encoded)
+        chunk = b"".join(parts)
+        self._file.write(chunk)
+
+        frame_et = self._buffers["elapsed_time"][:self._count, :n].max(axis=1)
+        entry = np.array([(self.segment, frame_et[0], frame_et[-1], self.bytes_written, len(chunk), self._count)],
+                         dtype=INDEX_DTYPE)
+        self._index_file.write(entry.tobytes())
+        self.bytes_written += len(chunk)
+        self.raw_bytes += self._count * n * len(CHANNELS) * 8
+        self.frames_written += self._count
+        self._count = 0
+
+    def close(self):
+        self.flush()
+        self._file.close()
+        self._index_file.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "frames": self.frames_written,
+            "bytes": self.bytes_written,
+            "raw_bytes": self.raw_bytes,
+            "ratio": round(self.raw_bytes / self.bytes_written, 2) if self.bytes_written else None,
+        }
+
+
+def read_chunk(data, offset: int, channels: Optional[List[str]] = None) -> Tuple[Dict[str, Any], int]:
+    """
+    Decode the chunk starting at offset, return it and the offset of the next chunk.
+    Only the requested channels are decompressed (all of them by default).
+    """
+    magic, num_frames, num_vehicles, num_channels = CHUNK_HEADER.unpack_from(data, offset)
+    if magic != CHUNK_MAGIC:
+        raise ValueError(f"Corrupted recording: no chunk at offset {offset}")
+    offset += CHUNK_HEADER.size
+    vehicle_ids = np.frombuffer(data, dtype="<i4", count=num_vehicles, offset=offset).copy()
+    offset += 4 * num_vehicles
+    decoded = {}
+    for _ in range(num_channels):
+        name_length, size, dtype, scale, quantizer_offset = CHANNEL_HEADER.unpack_from(data, offset)
+        offset += CHANNEL_HEADER.size
+        name = bytes(data[offset:offset + name_length]).decode()
+        offset += name_length
+        if channels is None or name in channels:
+            channel_quantizer = Quantizer(dtype.decode(), scale or None, quantizer_offset)
+            codes = decode_channel(data[offset:offset + size], num_frames, num_vehicles, channel_quantizer.dtype)
+            decoded[name] = channel_quantizer.decode(codes)
+        offset += size
+    return {"vehicle_ids": vehicle_ids, "frames": num_frames, "channels": decoded}, offset
+
+
+def read_recording(path: str, channels: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Decode a recording chunk by chunk from its memory map, only one chunk is in memory at a time"""
+    recording = AllCarRecording(path)
+    try:
+        yield from recording.chunks(channels)
+    finally:
+        recording.close()
+
+
+class AllCarRecording:
+    """
+    Random access to a recording through its sparse time index.
+
+    slice() binary-searches each segment (session) of the index for the chunks overlapping the
+    time range, reads them with one contiguous slice of the memory-mapped file per segment and
+    only decodes the requested channels. The index is rebuilt from the chunk headers when the
+    .idx file is missing or in an older layout.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "rb")
+        try:
+            self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            self._file.close()
+            raise
+        try:
+            if self._mmap[:len(FILE_MAGIC)] != FILE_MAGIC:
+                raise ValueError(f"{path} is not an all-car recording")
+            self.index = self._load_index()
+        except BaseException:
+            self.close()
+            raise
+
+    def _load_index(self) -> np.ndarray:
+        index_path = f"{self.path}.idx"
+        if os.path.exists(index_path):
+            with open(index_path, "rb") as f:
+                if f.read(len(INDEX_MAGIC)) == INDEX_MAGIC:
+                    index = np.fromfile(f, dtype=INDEX_DTYPE)
+                    # Drop the entries of chunks not fully written (recorder still running or killed)
+                    return index[index["offset"] + index["size"] <= len(self._mmap)]
+        return self.build_index()
+
+    def build_index(self) -> np.ndarray:
+        """
+        Scan the chunk headers and the elapsed time channel to rebuild the index. The session is
+        not stored in the chunks, a new segment starts where the elapsed time goes backwards.
+        """
+        entries = []
+        offset = len(FILE_MAGIC)
+        segment = 0
+        last_et = -np.inf
+        while offset + CHUNK_HEADER.size <= len(self._mmap):
+            chunk, next_offset = read_chunk(self._mmap, offset, ["elapsed_time"])
+            frame_et = chunk["channels"]["elapsed_time"].max(axis=1)
+            if frame_et[0] < last_et:
+                segment += 1
+            last_et = frame_et[-1]
+            entries.append((segment, frame_et[0], frame_et[-1], offset, next_offset - offset, chunk["frames"]))
+            offset = next_offset
+        index = np.array(entries, dtype=INDEX_DTYPE)
+        with open(f"{self.path}.idx", "wb") as f:
+            f.write(INDEX_MAGIC)
+            f.write(index.tobytes())
+        return index
+
+    def chunks(self, channels: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+        """Decode the indexed chunks one at a time, only the requested channels (all by default)"""
+        for offset in self.index["offset"].tolist():
+            chunk, _ = read_chunk(self._mmap, offset, channels)
+            yield chunk
+
+    @property
+    def segments(self) -> List[int]:
+        """Segments (sessions) of the recording, in recording order"""
+        return np.unique(self.index["segment"]).tolist()
+
+    @property
+    def start_et(self) -> Optional[float]:
+        return float(self.index["et_first"][0]) if len(self.index) else None
+
+    @property
+    def end_et(self) -> Optional[float]:
+        return float(self.index["et_last"][-1]) if len(self.index) else None
+
+    def slice(self, et_start: float, et_end: float, channels: Optional[List[str]] = None,
+              segment: Optional[int] = None, max_values: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Frames with et_start <= elapsed time <= et_end, in one segment (session) or in all of them.
+        Returns the vehicle IDs (columns), the frame elapsed times and segments and one
+        (frames, vehicles) array per channel, NaN where a car was not on track. Raises a
+        ValueError before decoding anything when the chunks of the range hold more than
+        max_values values of the requested channels.
+        """
+        channels = [name for name in (channels or CHANNELS) if name in CHANNELS]
+        selected = []
+        # Elapsed times are only sorted within a segment, each one is searched on its own
+        boundaries = np.flatnonzero(np.diff(self.index["segment"])) + 1
+        for entries in np.split(self.index, boundaries) if len(self.index) else []:
+            if segment is not None and entries["segment"][0] != segment:
+                continue
+            first = int(np.searchsorted(entries["et_last"], et_start, side="left"))
+            last = int(np.searchsorted(entries["et_first"], et_end, side="right"))
+            if last > first:
+                selected.append(entries[first:last])
+        if max_values is not None:
+            # Cars per chunk from the chunk headers, nothing is decompressed yet
+            values = sum(int(frames) * CHUNK_HEADER.unpack_from(self._mmap, int(offset))[2]
+                         for entries in selected for offset, frames in zip(entries["offset"], entries["frames"]))
+            values *= len(set(channels) | {"elapsed_time"})
+            if values > max_values:
+                raise ValueError(f"Slice too large: {values} values, at most {max_values}")
+
+        chunks = []
+        chunk_segments = []
+        for entries in selected:
+            # One contiguous read covering every chunk of the range
+            start = int(entries["offset"][0])
+            data = memoryview(self._mmap)[start:int(entries["offset"][-1] + entries["size"][-1])]
+            offset = 0
+            try:
+                for _ in range(len(entries)):
+                    chunk, offset = read_chunk(data, offset, channels + ["elapsed_time"])
+                    chunks.append(chunk)
+            finally:
+                data.release()
+            chunk_segments += [int(entries["segment"][0])] * len(entries)
+        if not chunks:
+            return {"vehicle_ids": np.empty(0, dtype=np.int32), "elapsed_time": np.empty(0),
+                    "segment": np.empty(0, dtype=np.int32),
+                    "channels": {name: np.empty((0, 0)) for name in channels}}
+
+        vehicle_ids = np.unique(np.concatenate([chunk["vehicle_ids"] for chunk in chunks]))
+        num_frames = sum(chunk["frames"] for chunk in chunks)
+        result = {name: np.full((num_frames, len(vehicle_ids)), np.nan) for name in set(channels) | {"elapsed_time"}}
+        row = 0
+        for chunk in chunks:
+            columns = np.searchsorted(vehicle_ids, chunk["vehicle_ids"])
+            for name, values in chunk["channels"].items():
+                result[name][row:row + chunk["frames"], columns] = values
+            row += chunk["frames"]
+
+        # Frame time at the top level; the elapsed_time channel keeps the time of each car
+        elapsed_time = np.nanmax(result["elapsed_time"], axis=1)
+        keep = (elapsed_time >= et_start) & (elapsed_time <= et_end)
+        segments = np.repeat(chunk_segments, [chunk["frames"] for chunk in chunks]).astype(np.int32)
+        return {
+            "vehicle_ids": vehicle_ids,
+            "elapsed_time": elapsed_time[keep],
+            "segment": segments[keep],
+            "channels": {name: result[name][keep] for name in channels},
+        }
+
+    def close(self):
+        self._mmap.close()
+        self._file.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect an all-car recording")
+    parser.add_argument("path", help="recording file")
+    args = parser.parse_args()
+
+    recording = AllCarRecording(args.path)
+    print(f"Elapsed time {recording.start_et} - {recording.end_et}, {len(recording.index)} index entries, "
+          f"{len(recording.segments)} segments")
+    recording.close()
+
+    start_time = time.perf_counter()
+    frames = 0
+    decoded_bytes = 0
+    vehicle_sets: List[int] = []
+    for chunk in read_recording(args.path):
+        frames += chunk["frames"]
+        decoded_bytes += sum(values.nbytes for values in chunk["channels"].values())
+        vehicle_sets.append(len(chunk["vehicle_ids"]))
+    elapsed = time.perf_counter() - start_time
+    print(f"{frames} frames, {len(vehicle_sets)} chunks, up to {max(vehicle_sets, default=0)} cars")
+    print(f"Decoded {decoded_bytes / 1e6:.1f} MB in {elapsed:.2f}s ({decoded_bytes / 1e6 / max(elapsed, 1e-9):.0f} MB/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,46 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, FileResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 import uvicorn
+import asyncio
+import json
 import math
 import csv
 import os
+import tempfile
+from contextlib import asynccontextmanager
 from datetime import datetime
-from rF2data import SimInfo
+from starlette.background import BackgroundTask
+from rF2data import SimInfo, SubscribedBuffer, rFactor2Constants
+from lap_stats import LapStatsEngine
+from stint import StintEngine
+from track_map import TrackMap, track_map_path
+from batch_analysis import run_batch
+from frames import get_session_name, CSV_HEADERS
+from events import EventEngine
+from mini_sectors import MiniSectorEngine
+from damage import DamageMonitor
+from dsp import DSPStage
+from all_car_recorder import AllCarRecording, CHANNELS
+from quantization import quantizer
+from columnar_export import session_table, write_table, parse_laps, FORMATS
+from lap_matrix import LapMatrix, CHANNELS as LAP_MATRIX_CHANNELS, DEFAULT_BIN_SIZE
+from profiler import run_profile, profile_path
+from reference_lap import (ReferenceLapFile, reference_lap_path, REFERENCE_LAP_DIR, FILE_EXTENSION,
+                           IMPORTED_SUFFIX, MAX_IMPORT_BYTES)
 
-app = FastAPI(title="LMU Telemetry API", description="API for LMU telemetry data")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run the background telemetry poller while the API is up"""
+    app.state.telemetry_poller = asyncio.create_task(poll_telemetry())
+    try:
+        yield
+    finally:
+        app.state.telemetry_poller.cancel()
+
+app = FastAPI(title="LMU Telemetry API", description="API for LMU telemetry data", lifespan=lifespan)
 
 # Add CORS middleware to allow frontend requests
 app.add_middleware(
@@ -21,6 +51,73 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+BRAKE_TEMP = quantizer("brake_temp")
+# Largest all-car recording slice served at once: elapsed time span and values (frames x cars x channels)
+MAX_SLICE_SECONDS = 600.0
+MAX_SLICE_VALUES = 5_000_000
+
+# Live engines fed by the background telemetry poller
+lap_stats = LapStatsEngine()
+stint = StintEngine()
+mini_sectors: Optional[MiniSectorEngine] = None
+damage_monitor: Optional[DamageMonitor] = None
+dsp = DSPStage()
+# One queue per /events subscriber
+event_subscribers = set()
+# Queue of each /channels/stream subscriber and the derived channels it asked for
+channel_subscribers: Dict[asyncio.Queue, set] = {}
+
+def player_telemetry(info) -> Optional[Any]:
+    """Telemetry of the player's car: the scoring slot with mIsPlayer gives its ID, None without a player"""
+    scoring = info.Rf2Scor
+    for i in range(min(scoring.mScoringInfo.mNumVehicles, rFactor2Constants.MAX_MAPPED_VEHICLES)):
+        if scoring.mVehicles[i].mIsPlayer:
+            player_id = scoring.mVehicles[i].mID
+            break
+    else:
+        return None
+    telemetry = info.Rf2Tele
+    for i in range(min(telemetry.mNumVehicles, rFactor2Constants.MAX_MAPPED_VEHICLES)):
+        if telemetry.mVehicles[i].mID == player_id:
+            return telemetry.mVehicles[i]
+    return None
+
+async def poll_telemetry(interval: float = 0.02):
+    """Feed the live engines from shared memory at a fixed rate"""
+    global mini_sectors, damage_monitor
+    info = None
+    while True:
+        try:
+            if info is None:
+                info = SimInfo([SubscribedBuffer.Telemetry, SubscribedBuffer.Scoring])
+                event_engine = EventEngine(info)
+                mini_sectors = MiniSectorEngine(info)
+                damage_monitor = DamageMonitor(info)
+            vehicle = player_telemetry(info)
+            if vehicle is not None:
+                lap_stats.update(vehicle)
+                stint.update(vehicle, info.Rf2Scor.mScoringInfo)
+            if vehicle is not None and dsp.update(vehicle) and channel_subscribers:
+                for message in dsp.messages():
+                    for queue, channels in channel_subscribers.items():
+                        if message["channel"] in channels and not queue.full():
+                            queue.put_nowait(message)
+            mini_sectors.poll()
+            events = event_engine.poll()
+            damage = damage_monitor.poll()
+            if damage:
+                events.append(damage)
+            for event in events:
+                for queue in event_subscribers:
+                    # A subscriber too slow to drain its queue misses events rather than stalling the poller
+                    if not queue.full():
+                        queue.put_nowait(event)
+        except Exception as e:
+            print(f"Error polling telemetry data: {e}")
+            info = None
+            await asyncio.sleep(1.0)
+        await asyncio.sleep(interval)
+
 def calculate_total_acceleration(local_accel):
     """Calculate total acceleration magnitude from 3D acceleration vector"""
     try:
@@ -49,6 +146,8 @@ class TelemetryDataPoint(BaseModel):
     vehicleName: str
     trackName: str
     place: int
+    elapsedTime: Optional[float] = None  # sim clock of the frame (mElapsedTime)
+    telemetryVersion: Optional[int] = None
 
 class SessionInfo(BaseModel):
     currentSession: int
@@ -59,6 +158,25 @@ class SessionInfo(BaseModel):
 class ExportRequest(BaseModel):
     data: List[TelemetryDataPoint]
     sessionInfo: SessionInfo
+    appendTo: Optional[str] = None  # filename returned by a previous export, to stream a session in chunks
+
+class BatchAnalysisRequest(BaseModel):
+    directory: str = "export"
+    output: Optional[str] = "batch_results.csv"
+    minBrakeIntensity: float = 50
+    workers: Optional[int] = None
+
+class LapMatrixRequest(BaseModel):
+    directory: str = "export"
+    channel: str = "time"
+    trackName: Optional[str] = None  # track of the first recording by default
+    binSize: float = DEFAULT_BIN_SIZE
+    drivers: Optional[List[str]] = None
+    output: Optional[str] = None  # matrix file (.lapm), memory-mapped instead of held in memory
+
+class LocateRequest(BaseModel):
+    trackName: str
+    positions: List[List[float]]  # world [x, z] pairs
 
 @app.get("/data")
 def get_telemetry_data():
@@ -67,7 +185,7 @@ def get_telemetry_data():
     Returns: JSON with acceleration, braking, clutch, gear, and additional telemetry
     """
     try:
-        info = SimInfo()
+        info = SimInfo(SubscribedBuffer.Telemetry)
         vehicle = info.Rf2Tele.mVehicles[0]
         
         # Basic controls
@@ -127,7 +245,7 @@ def get_acceleration_data():
     Returns: JSON with various acceleration metrics
     """
     try:
-        info = SimInfo()
+        info = SimInfo(SubscribedBuffer.Telemetry)
         vehicle = info.Rf2Tele.mVehicles[0]
         
         total_acceleration = calculate_total_acceleration(vehicle.mLocalAccel)
@@ -158,14 +276,14 @@ def get_braking_data():
     Returns: JSON with braking metrics and related data
     """
     try:
-        info = SimInfo()
+        info = SimInfo(SubscribedBuffer.Telemetry)
         vehicle = info.Rf2Tele.mVehicles[0]
         
         brake = float(vehicle.mUnfilteredBrake)
         brake_filtered = float(vehicle.mFilteredBrake)
         
         # Get brake temperatures and pressures from wheels
-        brake_temps = [float(vehicle.mWheels[i].mBrakeTemp) for i in range(4)]
+        brake_temps = [BRAKE_TEMP.round(vehicle.mWheels[i].mBrakeTemp) for i in range(4)]
         brake_pressures = [float(vehicle.mWheels[i].mBrakePressure) for i in range(4)]
         
         return JSONResponse(content={
@@ -190,33 +308,355 @@ def get_braking_data():
         print(f"Error reading braking data: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to read braking data: {str(e)}")
 
+@app.get("/lap-stats")
+def get_lap_stats():
+    """
+    Get the statistics of the last completed lap and of the lap in progress
+    Returns: JSON with max speed, brake zones, full throttle time, min corner speed, tyre temps and fuel used
+    """
+    return JSONResponse(content={
+        "last_lap": lap_stats.last_summary,
+        "current_lap": lap_stats.current()
+    })
+
+@app.get("/stint")
+def get_stint():
+    """
+    Get the fuel and tyre projection computed at the last crossing of the line
+    Returns: JSON with fuel and wear per lap, laps remaining on fuel and tyres, and the pit window
+    """
+    return JSONResponse(content={"projection": stint.last_projection})
+
+@app.get("/mini-sectors")
+def get_mini_sectors():
+    """
+    Get the mini-sector timing of every car on track
+    Returns: JSON with the last and best time of each mini-sector per car and the session best
+    """
+    if mini_sectors is None:
+        raise HTTPException(status_code=503, detail="Not connected to LMU shared memory")
+    return JSONResponse(content=mini_sectors.to_dict())
+
+@app.get("/damage")
+def get_damage():
+    """
+    Get the damage state of every car on track
+    Returns: JSON with the tracked max and accumulated impact magnitude, last impact, dent severity and detached parts per car
+    """
+    if damage_monitor is None:
+        raise HTTPException(status_code=503, detail="Not connected to LMU shared memory")
+    return JSONResponse(content=damage_monitor.to_dict())
+
+def load_track_map(track_name: str) -> TrackMap:
+    """Load the saved map of a track or raise a 404"""
+    try:
+        return TrackMap.load(track_map_path(track_name))
+    except OSError:
+        raise HTTPException(status_code=404, detail=f"No track map for {track_name}, drive a few laps with the WebSocket server first")
+
+@app.get("/events")
+async def stream_events():
+    """
+    Server-Sent Events stream of discrete events (pit entry/exit, pit stops, impacts, laps, flags, session changes)
+    and of the damage of the cars whose damage changed
+    Returns: text/event-stream, one JSON event per message
+    """
+    queue = asyncio.Queue(maxsize=1000)
+    event_subscribers.add(queue)
+
+    async def event_stream():
+        try:
+            while True:
+                event = await queue.get()
+                yield f"event: {event.get('event', event['type'])}\ndata: {json.dumps(event)}\n\n"
+        finally:
+            event_subscribers.discard(queue)
+
+    return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+@app.get("/channels")
+def get_channels():
+    """
+    Get the derived channels of the player (brake rate, steering rate, jerk, smoothed yaw rate)
+    Returns: JSON with the unit, source fields and latest value of each channel
+    """
+    return JSONResponse(content=dsp.to_dict())
+
+@app.get("/channels/stream")
+async def stream_channels(channels: Optional[str] = None):
+    """
+    Server-Sent Events stream of the derived channels, all of them or a comma-separated selection
+    Returns: text/event-stream, one JSON message per channel and telemetry update
+    """
+    selected = set(channels.split(",")) if channels else set(dsp.channels)
+    unknown = selected - set(dsp.channels)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown channels: {', '.join(sorted(unknown))}")
+    queue = asyncio.Queue(maxsize=1000)
+    channel_subscribers[queue] = selected
+
+    async def channel_stream():
+        try:
+            while True:
+                message = await queue.get()
+                yield f"event: {message['channel']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            channel_subscribers.pop(queue, None)
+
+    return StreamingResponse(channel_stream(), media_type="text/event-stream")
+
+@app.get("/channels/{name}")
+def get_channel_window(name: str, samples: Optional[int] = None):
+    """
+    Get the recent samples of a derived channel
+    Returns: JSON with the elapsed time and value of the last samples (512 at most), oldest first
+    """
+    channel = dsp.channels.get(name)
+    if channel is None:
+        raise HTTPException(status_code=404, detail=f"Unknown channel: {name}")
+    return JSONResponse(content=channel.window(samples))
+
+@app.get("/track-map")
+def get_track_map(track: str):
+    """
+    Get the learnt centreline and corners of a track
+    Returns: JSON with the centreline points (world x/z) and the corner boundaries in lap distance
+    """
+    return JSONResponse(content=load_track_map(track).to_dict())
+
+@app.post("/track-map/locate")
+def locate_positions(request: LocateRequest):
+    """
+    Batch lookup of lap distance and corner ID for world positions
+    Returns: JSON with one lap distance and one corner ID (-1 on straights) per position
+    """
+    track_map = load_track_map(request.trackName)
+    if not request.positions:
+        return JSONResponse(content={"lapDist": [], "corner": []})
+    try:
+        lap_dist, corner = track_map.locate_many(request.positions)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid positions: {str(e)}")
+    return JSONResponse(content={
+        "lapDist": [round(d, 1) for d in lap_dist.tolist()],
+        "corner": corner.tolist()
+    })
+
+def export_directory(directory: str) -> str:
+    """The export directory or one of its subfolders, raise a 400 for any other directory"""
+    root = os.path.realpath("export")
+    path = os.path.realpath(directory)
+    if path != root and not path.startswith(root + os.sep):
+        raise HTTPException(status_code=400, detail=f"Directory outside of export/: {directory}")
+    if not os.path.isdir(path):
+        raise HTTPException(status_code=404, detail=f"Directory not found: {directory}")
+    return path
+
+def export_output(name: Optional[str]) -> Optional[str]:
+    """Output file of a request, written in the export directory whatever the path given"""
+    if not name:
+        return None
+    os.makedirs("export", exist_ok=True)
+    return os.path.join(os.path.realpath("export"), os.path.basename(name))
+
+@app.post("/batch-analysis")
+def batch_analysis(request: BatchAnalysisRequest):
+    """
+    Analyze every CSV export of the export directory (or one of its subfolders) with a process pool
+    Returns: JSON with one result row per session, unchanged files are served from the cache
+    """
+    directory = export_directory(request.directory)
+    try:
+        summary = run_batch(directory, export_output(request.output),
+                            min_brake_intensity=request.minBrakeIntensity, workers=request.workers)
+    except Exception as e:
+        print(f"Error during batch analysis: {e}")
+        raise HTTPException(status_code=500, detail=f"Error during batch analysis: {str(e)}")
+    return JSONResponse(content=summary)
+
+@app.post("/lap-matrix")
+def lap_matrix_report(request: LapMatrixRequest):
+    """
+    Consistency report over every lap of the session recordings of the export directory (or one of
+    its subfolders), on a lap distance grid
+    Returns: JSON with the lap time spread, best theoretical lap, variance hotspots and outlier laps
+    """
+    directory = export_directory(request.directory)
+    if request.channel not in LAP_MATRIX_CHANNELS:
+        raise HTTPException(status_code=400, detail=f"Unknown channel {request.channel}, expected one of {', '.join(LAP_MATRIX_CHANNELS)}")
+    try:
+        matrix = LapMatrix.build([directory], request.channel, request.binSize, request.trackName,
+                                 output=export_output(request.output))
+        if request.drivers:
+            matrix = matrix.for_drivers(request.drivers)
+        report = matrix.report()
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error building the lap matrix: {e}")
+        raise HTTPException(status_code=500, detail=f"Error building the lap matrix: {str(e)}")
+    return JSONResponse(content=report)
+
+@app.get("/recordings/{name}/slice")
+def recording_slice(name: str, start: float, end: float, channels: Optional[str] = None, segment: Optional[int] = None):
+    """
+    Random access into an all-car recording of the export directory
+    Returns: JSON with the vehicle IDs and, per channel, one row of values per frame between start and end (elapsed time),
+    in one segment (session of the recording) or in all of them
+    """
+    path = os.path.join("export", os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Recording not found: {name}")
+    if not (math.isfinite(start) and math.isfinite(end) and start <= end):
+        raise HTTPException(status_code=400, detail="start and end must be finite with start <= end")
+    if end - start > MAX_SLICE_SECONDS:
+        raise HTTPException(status_code=400, detail=f"Slices are limited to {MAX_SLICE_SECONDS:g} seconds")
+    selected = channels.split(",") if channels else None
+    unknown = [channel for channel in selected or [] if channel not in CHANNELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown channels: {', '.join(unknown)}")
+    try:
+        recording = AllCarRecording(path)
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    try:
+        frames = recording.slice(start, end, selected, segment, max_values=MAX_SLICE_VALUES)
+    except ValueError as e:
+        # Slice over the value limit or corrupted chunk
+        raise HTTPException(status_code=400, detail=str(e))
+    finally:
+        recording.close()
+    return JSONResponse(content={
+        "vehicle_ids": frames["vehicle_ids"].tolist(),
+        "elapsed_time": frames["elapsed_time"].tolist(),
+        "segment": frames["segment"].tolist(),
+        "channels": {channel: [[None if math.isnan(v) else v for v in row] for row in values.tolist()]
+                     for channel, values in frames["channels"].items()}
+    })
+
+@app.get("/recordings/{name}/export")
+def export_recording(name: str, format: str = "parquet", channels: Optional[str] = None, laps: Optional[str] = None,
+                     start: Optional[float] = None, end: Optional[float] = None):
+    """
+    Export a session recording (.frames) of the export directory to Parquet or Arrow
+    Returns: the file, with the selected channels, laps (e.g. 3,5-7) and elapsed time range only
+    """
+    path = os.path.join("export", os.path.basename(name))
+    if not name.endswith(".frames") or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Session recording not found: {name}")
+    if format not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unknown format {format}, expected one of {', '.join(FORMATS)}")
+    try:
+        selected_laps = parse_laps(laps) if laps else None
+        table = session_table(path, channels.split(",") if channels else None, selected_laps, start, end)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    extension = FORMATS[format]
+    fd, output = tempfile.mkstemp(suffix=extension, dir="export")
+    os.close(fd)
+    try:
+        write_table(table, output, format)
+    except Exception as e:
+        os.remove(output)
+        print(f"Error during {format} export: {e}")
+        raise HTTPException(status_code=500, detail=f"Error during {format} export: {str(e)}")
+    return FileResponse(output, media_type="application/octet-stream",
+                        filename=os.path.splitext(os.path.basename(name))[0] + extension,
+                        background=BackgroundTask(os.remove, output))
+
+def reference_lap_file(name: str) -> str:
+    """Path of a reference lap file or raise a 404"""
+    path = os.path.join(REFERENCE_LAP_DIR, os.path.basename(name))
+    if not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail=f"Reference lap not found: {name}")
+    return path
+
+@app.get("/reference-laps")
+def list_reference_laps():
+    """
+    List the reference lap files (best laps saved by the WebSocket server and imported laps)
+    Returns: JSON with the track, car, driver and lap time of each file
+    """
+    laps = []
+    if os.path.isdir(REFERENCE_LAP_DIR):
+        for filename in sorted(os.listdir(REFERENCE_LAP_DIR)):
+            if not filename.endswith(FILE_EXTENSION):
+                continue
+            try:
+                with ReferenceLapFile.open(os.path.join(REFERENCE_LAP_DIR, filename)) as lap:
+                    laps.append(lap.to_dict())
+            except (OSError, ValueError) as e:
+                print(f"Skipping reference lap {filename}: {e}")
+    return JSONResponse(content={"laps": laps})
+
+@app.get("/reference-laps/{name}")
+def export_reference_lap(name: str):
+    """
+    Download a reference lap file to share it
+    Returns: the binary file, to be imported with POST /reference-laps
+    """
+    return FileResponse(reference_lap_file(name), media_type="application/octet-stream", filename=os.path.basename(name))
+
+@app.post("/reference-laps")
+async def import_reference_lap(request: Request):
+    """
+    Import a reference lap file sent as the request body, stored as <track>_<car>_<driver>_imported.lap.
+    An existing file is never replaced.
+    Returns: JSON with the name it was stored under and its metadata
+    """
+    too_large = HTTPException(status_code=413, detail=f"Reference lap files are limited to {MAX_IMPORT_BYTES} bytes")
+    if int(request.headers.get("content-length") or 0) > MAX_IMPORT_BYTES:
+        raise too_large
+    data = bytearray()
+    async for chunk in request.stream():
+        data += chunk
+        if len(data) > MAX_IMPORT_BYTES:
+            raise too_large
+    data = bytes(data)
+    try:
+        lap = ReferenceLapFile(data)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    metadata = lap.metadata
+    lap.close()
+    path = reference_lap_path(metadata.get("trackName", ""), metadata.get("vehicleName", ""), metadata.get("driverName", ""),
+                              suffix=IMPORTED_SUFFIX)
+    os.makedirs(REFERENCE_LAP_DIR, exist_ok=True)
+    try:
+        with open(path, "xb") as f:
+            f.write(data)
+    except FileExistsError:
+        raise HTTPException(status_code=409, detail=f"Reference lap already exists: {os.path.basename(path)}")
+    return JSONResponse(content={"success": True, "name": os.path.basename(path), **metadata})
+
 @app.post("/export-csv")
 async def export_telemetry_csv(request: ExportRequest):
     """
     Export telemetry data to CSV file
     """
     try:
-        # Create filename with timestamp
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        driver_name = request.data[0].driverName.replace(" ", "_") if request.data else "unknown"
-        vehicle_name = request.data[0].vehicleName.replace(" ", "_") if request.data else "unknown"
-        track_name = request.sessionInfo.trackName.replace(" ", "_") if request.sessionInfo else "unknown"
-        filename = f"telemetry_{driver_name}_{track_name}_{vehicle_name}_{timestamp}.csv"
-        filepath = os.path.join("export", filename)
+        append = False
+        if request.appendTo:
+            filename = os.path.basename(request.appendTo)
+            filepath = os.path.join("export", filename)
+            append = os.path.isfile(filepath)
+        if not append:
+            # Create filename with timestamp
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            driver_name = request.data[0].driverName.replace(" ", "_") if request.data else "unknown"
+            vehicle_name = request.data[0].vehicleName.replace(" ", "_") if request.data else "unknown"
+            track_name = request.data[0].trackName.replace(" ", "_") if request.data else "unknown"
+            filename = f"telemetry_{driver_name}_{track_name}_{vehicle_name}_{timestamp}.csv"
+            filepath = os.path.join("export", filename)
         
         # Ensure export directory exists
         os.makedirs("export", exist_ok=True)
         
-        # Define CSV headers
-        headers = [
-            "timestamp", "session", "session_name", "gear", "brake_percent", 
-            "throttle_percent", "driver_name", "vehicle_name", "track_name", "place"
-        ]
-        
-        # Write CSV file
-        with open(filepath, 'w', newline='', encoding='utf-8') as csvfile:
+        # Write CSV file, or append the chunk to the file of the previous ones
+        with open(filepath, 'a' if append else 'w', newline='', encoding='utf-8') as csvfile:
             writer = csv.writer(csvfile)
-            writer.writerow(headers)
+            if not append:
+                writer.writerow(CSV_HEADERS)
             
             for point in request.data:
                 # Convert session number to readable name
@@ -232,12 +672,15 @@ async def export_telemetry_csv(request: ExportRequest):
                     point.driverName,
                     point.vehicleName,
                     point.trackName,
-                    point.place
+                    point.place,
+                    "" if point.elapsedTime is None else point.elapsedTime,
+                    "" if point.telemetryVersion is None else point.telemetryVersion
                 ])
         
         return JSONResponse(content={
             "success": True,
             "message": "CSV export successful",
+            "appended": append,
             "filename": filename,
             "filepath": filepath,
             "total_points": len(request.data),
@@ -252,20 +695,25 @@ async def export_telemetry_csv(request: ExportRequest):
         print(f"Error during CSV export: {e}")
         raise HTTPException(status_code=500, detail=f"Error during CSV export: {str(e)}")
 
-def get_session_name(session: int) -> str:
-    """Convert session number to readable name"""
-    if session == 0:
-        return "Test"
-    elif 1 <= session <= 4:
-        return f"Practice_{session}"
-    elif 5 <= session <= 8:
-        return f"Qualifying_{session - 4}"
-    elif session == 9:
-        return "Warmup"
-    elif 10 <= session <= 13:
-        return f"Race_{session - 9}"
-    else:
-        return f"Unknown_{session}"
+@app.post("/admin/profile")
+async def profile(seconds: float = 30, interval_ms: float = 10, idle: bool = False):
+    """
+    Sample the stacks of every thread of the API for a bounded time (one session at a time)
+    Returns: collapsed stacks, one "thread;outer;...;leaf count" line per stack, for flamegraph.pl or speedscope
+    """
+    try:
+        sampler = await run_profile(seconds, interval_ms / 1000.0, idle)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    path = sampler.save(profile_path("api"))
+    summary = sampler.summary()
+    return PlainTextResponse(sampler.collapsed(), headers={
+        "Content-Disposition": f"attachment; filename={os.path.basename(path)}",
+        "X-Profile-Samples": str(summary["samples"]),
+        "X-Profile-Overhead-Percent": str(summary["overheadPercent"]),
+    })
 
 @app.get("/")
 def root():
@@ -277,7 +725,21 @@ def root():
             "/data": "Complete telemetry data (acceleration, braking, gear, etc.)",
             "/acceleration": "Detailed acceleration data only", 
             "/braking": "Detailed braking data only",
+            "/lap-stats": "Statistics of the last completed lap and the lap in progress",
+            "/stint": "Fuel and tyre wear per lap, laps remaining and pit window",
+            "/mini-sectors": "Last and best mini-sector times of every car",
+            "/damage": "Tracked impacts, dents and detached parts of every car",
+            "/channels": "Derived channels (brake rate, steering rate, jerk, yaw rate), /channels/{name} for recent samples, /channels/stream for SSE",
+            "/events": "Server-Sent Events stream of pit, impact, lap, flag and session events",
+            "/track-map": "Learnt centreline and corners of a track",
+            "/track-map/locate": "Lap distance and corner of world positions (POST)",
+            "/batch-analysis": "Braking, session and consistency analysis of a directory of exports (POST)",
+            "/lap-matrix": "Consistency report (percentiles, best theoretical lap, hotspots, outlier laps) over many laps (POST)",
+            "/recordings/{name}/slice": "Frames of an all-car recording between two elapsed times",
+            "/recordings/{name}/export": "Parquet or Arrow export of a session recording with channel, lap and time selection",
+            "/reference-laps": "Reference lap files, GET /reference-laps/{name} to export one, POST to import",
             "/export-csv": "Export telemetry data to CSV (POST)",
+            "/admin/profile": "Sample the API stacks for N seconds, collapsed stacks for a flame graph (POST)",
             "/docs": "Interactive API documentation"
         }
     }
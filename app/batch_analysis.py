@@ -0,0 +1,390 @@
+#!/usr/bin/env python3
+"""
+Batch analysis of telemetry exports: braking segments, lap stats, session stats and consistency
+computed over a whole directory of CSV exports and session recordings (.frames) with a process pool
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import logging
+import os
+import time
+import types
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from itertools import islice
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+
+from columnar_export import lap_numbers
+from frames import FrameBuffer, PEDAL, get_session_name
+from lap_stats import LapStatsEngine
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bump when the analysis output changes so that cached results are recomputed
+ANALYSIS_VERSION = 2
+
+DEFAULT_CACHE_DIR = os.path.join("export", ".batch_cache")
+DEFAULT_CHUNK_ROWS = 65536
+FULL_THROTTLE_PERCENT = 98.0
+
+RESULT_COLUMNS = [
+    "file", "session_name", "driver_name", "vehicle_name", "track_name", "samples", "duration_s",
+    "braking_segments", "mean_peak_brake_percent", "mean_segment_samples", "segment_samples_std",
+    "peak_brake_std", "full_throttle_fraction", "mean_brake_percent",
+    # Lap stats, only for the session recordings (the CSV exports have no lap distance)
+    "laps", "best_lap_time_s", "mean_lap_time_s", "lap_time_std", "mean_brake_zones_per_lap",
+    "mean_full_throttle_time_s",
+]
+EXPORT_EXTENSIONS = (".csv", ".frames")
+
+
+def read_export_chunks(path: str, chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Dict[str, np.ndarray]]:
+    """Read a CSV export chunk by chunk, yielding one array per column"""
+    with open(path, newline="", encoding="utf-8") as csvfile:
+        reader = csv.reader(csvfile)
+        headers = next(reader, None)
+        if not headers:
+            return
+        while True:
+            rows = list(islice(reader, chunk_rows))
+            if not rows:
+                return
+            columns = list(zip(*rows))
+            yield {name: np.array(values) for name, values in zip(headers, columns)}
+
+
+def find_braking_segments(brake_percent: np.ndarray, min_brake_intensity: float = 50) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of the notebook braking segmentation.
+
+    A segment starts on the last 0 before the brake is pressed and ends on the first 0 after it
+    is released (both included). Only segments reaching min_brake_intensity are kept.
+    Returns the start and end indices of the segments.
+    """
+    brake = np.asarray(brake_percent, dtype=np.float64)
+    if len(brake) < 2:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    zero = brake == 0
+    starts = np.flatnonzero(zero[:-1] & ~zero[1:])
+    ends = np.flatnonzero(~zero[:-1] & zero[1:]) + 1
+    # Pair every start with the first release after it; a start without release is incomplete
+    ends_index = np.searchsorted(ends, starts, side="right")
+    complete = ends_index < len(ends)
+    starts, ends = starts[complete], ends[ends_index[complete]]
+    if len(starts) == 0:
+        return starts, ends
+    keep = _segment_peaks(brake, starts, ends) >= min_brake_intensity
+    return starts[keep], ends[keep]
+
+
+def _segment_peaks(brake: np.ndarray, starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Max brake value of each [start, end] segment"""
+    bounds = np.empty(2 * len(starts), dtype=np.int64)
+    bounds[0::2] = starts
+    bounds[1::2] = ends + 1
+    padded = np.append(brake, 0.0)
+    return np.maximum.reduceat(padded, bounds)[0::2]
+
+
+class SessionAccumulator:
+    """Streaming aggregates of one session of an export, fed chunk by chunk"""
+
+    def __init__(self, session_name: str, driver_name: str, vehicle_name: str, track_name: str):
+        self.session_name = session_name
+        self.driver_name = driver_name
+        self.vehicle_name = vehicle_name
+        self.track_name = track_name
+        self.samples = 0
+        self.brake_sum = 0.0
+        self.full_throttle = 0
+        self.first_timestamp: Optional[str] = None
+        self.last_timestamp: Optional[str] = None
+        self.segment_samples: List[int] = []
+        self.segment_peaks: List[float] = []
+        self.lap_summaries: List[Dict[str, Any]] = []
+        # Brake values since the last 0, re-analysed with the next chunk. A long one is reduced to
+        # the 0 and its peak, the samples dropped are added back to the length of its segment.
+        self._carry = np.empty(0)
+        self._carry_dropped = 0
+
+    def add(self, timestamps: np.ndarray, brake: np.ndarray, throttle: np.ndarray, min_brake_intensity: float):
+        if len(brake) == 0:
+            return
+        if self.first_timestamp is None:
+            self.first_timestamp = str(timestamps[0])
+        self.last_timestamp = str(timestamps[-1])
+        self.samples += len(brake)
+        self.brake_sum += float(brake.sum())
+        self.full_throttle += int(np.count_nonzero(throttle >= FULL_THROTTLE_PERCENT))
+
+        values = np.concatenate((self._carry, brake))
+        starts, ends = find_braking_segments(values, min_brake_intensity)
+        if len(starts):
+            lengths = ends - starts + 1
+            lengths[starts == 0] += self._carry_dropped
+            self.segment_samples.extend(lengths.tolist())
+            self.segment_peaks.extend(_segment_peaks(values, starts, ends).tolist())
+        # Keep the segment open at the chunk boundary (from the last 0) so that it is not lost;
+        # without any 0 no segment can start in these values
+        zeros = np.flatnonzero(values == 0)
+        if not len(zeros):
+            self._carry, self._carry_dropped = np.empty(0), 0
+            return
+        tail = values[zeros[-1]:]
+        dropped = self._carry_dropped if zeros[-1] == 0 else 0
+        if len(tail) > 2:
+            dropped += len(tail) - 2
+            tail = np.array([0.0, tail[1:].max()])
+        self._carry, self._carry_dropped = tail, dropped
+
+    def to_row(self, file_name: str) -> Dict[str, Any]:
+        segment_samples = np.array(self.segment_samples, dtype=np.float64)
+        segment_peaks = np.array(self.segment_peaks, dtype=np.float64)
+        samples = self.samples or 1
+        laps = [summary for summary in self.lap_summaries if summary["lapTime"] is not None]
+        lap_times = np.array([summary["lapTime"] for summary in laps], dtype=np.float64)
+        return {
+            "file": file_name,
+            "session_name": self.session_name,
+            "driver_name": self.driver_name,
+            "vehicle_name": self.vehicle_name,
+            "track_name": self.track_name,
+            "samples": self.samples,
+            "duration_s": _duration(self.first_timestamp, self.last_timestamp),
+            "braking_segments": len(segment_samples),
+            "mean_peak_brake_percent": round(float(segment_peaks.mean()), 2) if len(segment_peaks) else None,
+            "mean_segment_samples": round(float(segment_samples.mean()), 2) if len(segment_samples) else None,
+            # Consistency: the lower the spread of the braking events, the more consistent the driver
+            "segment_samples_std": round(float(segment_samples.std()), 2) if len(segment_samples) else None,
+            "peak_brake_std": round(float(segment_peaks.std()), 2) if len(segment_peaks) else None,
+            "full_throttle_fraction": round(self.full_throttle / samples, 4),
+            "mean_brake_percent": round(self.brake_sum / samples, 2),
+            "laps": len(laps),
+            "best_lap_time_s": round(float(lap_times.min()), 3) if len(laps) else None,
+            "mean_lap_time_s": round(float(lap_times.mean()), 3) if len(laps) else None,
+            "lap_time_std": round(float(lap_times.std()), 3) if len(laps) else None,
+            "mean_brake_zones_per_lap": round(float(np.mean([s["brakeZones"] for s in laps])), 2) if laps else None,
+            "mean_full_throttle_time_s": round(float(np.mean([s["fullThrottleTime"] for s in laps])), 3) if laps else None,
+        }
+
+
+def _duration(first: Optional[str], last: Optional[str]) -> Optional[float]:
+    """Seconds between two ISO timestamps written by the dashboard"""
+    try:
+        start = datetime.fromisoformat(first.replace("Z", "+00:00"))
+        end = datetime.fromisoformat(last.replace("Z", "+00:00"))
+        return round((end - start).total_seconds(), 3)
+    except (AttributeError, ValueError):
+        return None
+
+
+def analyze_export(path: str, min_brake_intensity: float = 50,
+                   chunk_rows: int = DEFAULT_CHUNK_ROWS) -> List[Dict[str, Any]]:
+    """Analyze one CSV export or session recording, returning one result row per session"""
+    if path.endswith(".frames"):
+        return analyze_recording(path, min_brake_intensity, chunk_rows)
+    sessions: Dict[str, SessionAccumulator] = {}
+    for chunk in read_export_chunks(path, chunk_rows):
+        session_names = chunk["session_name"]
+        brake = chunk["brake_percent"].astype(np.float64)
+        throttle = chunk["throttle_percent"].astype(np.float64)
+        # Split the chunk into runs of the same session
+        boundaries = np.flatnonzero(session_names[1:] != session_names[:-1]) + 1
+        for start, end in zip(np.concatenate(([0], boundaries)), np.concatenate((boundaries, [len(brake)]))):
+            name = str(session_names[start])
+            if name not in sessions:
+                sessions[name] = SessionAccumulator(name, str(chunk["driver_name"][start]),
+                                                    str(chunk["vehicle_name"][start]), str(chunk["track_name"][start]))
+            sessions[name].add(chunk["timestamp"][start:end], brake[start:end], throttle[start:end],
+                               min_brake_intensity)
+    file_name = os.path.basename(path)
+    return [session.to_row(file_name) for session in sessions.values()]
+
+
+class _RecordedSample:
+    """
+    The rF2VehicleTelemetry fields LapStatsEngine reads, filled from a session recording frame.
+    Speed, acceleration, fuel, tyre temperatures and sectors are not recorded and stay at zero.
+    """
+
+    def __init__(self):
+        zero = types.SimpleNamespace(x=0.0, y=0.0, z=0.0)
+        self.mLocalVel = self.mLocalAccel = zero
+        self.mWheels = [types.SimpleNamespace(mTemperature=(0.0, 0.0, 0.0)) for _ in range(4)]
+        self.mFuel = 0.0
+        self.mCurrentSector = -1
+        self.mElapsedTime = self.mLapStartET = self.mFilteredThrottle = self.mFilteredBrake = 0.0
+        self.mLapNumber = 0
+
+
+def _iso_timestamps(timestamps: np.ndarray) -> np.ndarray:
+    """Wall clock seconds as the ISO timestamps of the CSV exports"""
+    return np.char.add(np.datetime_as_string((timestamps * 1000).astype("datetime64[ms]"), unit="ms"), "Z")
+
+
+def analyze_recording(path: str, min_brake_intensity: float = 50,
+                      chunk_rows: int = DEFAULT_CHUNK_ROWS) -> List[Dict[str, Any]]:
+    """
+    Analyze one session recording (.frames), returning one result row per session. The laps come
+    from the recorded line crossings (or the lap distance) and are summarized by LapStatsEngine.
+    """
+    frames, names = FrameBuffer.read_binary(path)
+    with open(f"{path}.json", encoding="utf-8") as f:
+        events = json.load(f).get("events", [])
+    laps = lap_numbers(frames, events, np.array([n[2] for n in names], dtype=object))
+    sessions: Dict[Tuple[int, str], Tuple[SessionAccumulator, LapStatsEngine]] = {}
+    sample = _RecordedSample()
+    for range_start, range_end, driver, vehicle, track in names:
+        for start in range(range_start, range_end, chunk_rows):
+            chunk = frames[start:min(start + chunk_rows, range_end)]
+            chunk_laps = laps[start:start + len(chunk)]
+            brake, throttle = PEDAL.decode(chunk["brake"]), PEDAL.decode(chunk["throttle"])
+            timestamps = _iso_timestamps(chunk["timestamp"])
+            session_numbers = chunk["session"]
+            boundaries = np.flatnonzero(session_numbers[1:] != session_numbers[:-1]) + 1
+            for run_start, run_end in zip(np.concatenate(([0], boundaries)),
+                                          np.concatenate((boundaries, [len(chunk)]))):
+                key = (int(session_numbers[run_start]), driver)
+                if key not in sessions:
+                    sessions[key] = (SessionAccumulator(get_session_name(key[0]), driver, vehicle, track),
+                                     LapStatsEngine())
+                accumulator, engine = sessions[key]
+                accumulator.add(timestamps[run_start:run_end], brake[run_start:run_end] * 100,
+                                throttle[run_start:run_end] * 100, min_brake_intensity)
+                for i in range(run_start, run_end):
+                    if chunk_laps[i] < 0 or chunk["elapsed_time"][i] != chunk["elapsed_time"][i]:
+                        continue
+                    sample.mElapsedTime = float(chunk["elapsed_time"][i])
+                    if int(chunk_laps[i]) != sample.mLapNumber:
+                        sample.mLapNumber = int(chunk_laps[i])
+                        sample.mLapStartET = sample.mElapsedTime
+                    sample.mFilteredBrake = float(brake[i])
+                    sample.mFilteredThrottle = float(throttle[i])
+                    summary = engine.update(sample)
+                    if summary is not None:
+                        accumulator.lap_summaries.append(summary)
+    file_name = os.path.basename(path)
+    rows = []
+    for accumulator, _ in sessions.values():
+        # The first lap started before the recording did
+        accumulator.lap_summaries = accumulator.lap_summaries[1:]
+        rows.append(accumulator.to_row(file_name))
+    return rows
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """SHA-256 of a file content, read block by block (with its JSON sidecar for a session recording)"""
+    digest = hashlib.sha256()
+    for name in [path, f"{path}.json"] if path.endswith(".frames") else [path]:
+        with open(name, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def _process_file(path: str, cache_dir: str, min_brake_intensity: float, chunk_rows: int) -> Tuple[str, bool, List[Dict[str, Any]]]:
+    """Worker: return the cached results of a file, or analyze it and cache them"""
+    key = f"{file_hash(path)}_v{ANALYSIS_VERSION}_b{min_brake_intensity:g}"
+    cache_path = os.path.join(cache_dir, f"{key}.json")
+    try:
+        with open(cache_path, encoding="utf-8") as f:
+            rows = json.load(f)
+        # The same content can be exported under another name
+        for row in rows:
+            row["file"] = os.path.basename(path)
+        return path, True, rows
+    except (OSError, ValueError):
+        pass
+
+    rows = analyze_export(path, min_brake_intensity, chunk_rows)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(rows, f)
+    os.replace(tmp_path, cache_path)
+    return path, False, rows
+
+
+def find_exports(directory: str) -> List[str]:
+    """CSV exports and session recordings of a directory, sorted by name"""
+    return sorted(
+        os.path.join(directory, name) for name in os.listdir(directory)
+        if name.endswith(EXPORT_EXTENSIONS) and os.path.isfile(os.path.join(directory, name))
+    )
+
+
+def run_batch(directory: str, output: Optional[str] = None, cache_dir: str = DEFAULT_CACHE_DIR,
+              min_brake_intensity: float = 50, workers: Optional[int] = None,
+              chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Dict[str, Any]:
+    """
+    Analyze every export of a directory with a process pool and write one consolidated table.
+    Files whose content was already analyzed with the same parameters are read from the cache.
+    """
+    start_time = time.perf_counter()
+    os.makedirs(cache_dir, exist_ok=True)
+    paths = [path for path in find_exports(directory)
+             if not output or os.path.abspath(path) != os.path.abspath(output)]
+    results: Dict[str, List[Dict[str, Any]]] = {}
+    errors: Dict[str, str] = {}
+    cached = 0
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(_process_file, path, cache_dir, min_brake_intensity, chunk_rows): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            try:
+                _, from_cache, rows = future.result()
+            except Exception as e:
+                logger.error(f"Error analyzing {path}: {e}")
+                errors[os.path.basename(path)] = str(e)
+                continue
+            cached += from_cache
+            results[path] = rows
+
+    table = [row for path in paths for row in results.get(path, [])]
+    if output:
+        os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+        with open(output, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.DictWriter(csvfile, fieldnames=RESULT_COLUMNS)
+            writer.writeheader()
+            writer.writerows(table)
+
+    return {
+        "files": len(paths),
+        "analyzed": len(results) - cached,
+        "cached": cached,
+        "errors": errors,
+        "rows": table,
+        "output": output,
+        "elapsed_s": round(time.perf_counter() - start_time, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze a directory of LMU telemetry exports")
+    parser.add_argument("directory", nargs="?", default="export", help="directory containing the CSV exports and session recordings")
+    parser.add_argument("-o", "--output", default="batch_results.csv",
+                        help="consolidated results table (CSV)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help="per-file results cache")
+    parser.add_argument("--min-brake-intensity", type=float, default=50,
+                        help="minimum brake percentage for a braking segment")
+    parser.add_argument("-j", "--workers", type=int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="rows read per chunk")
+    args = parser.parse_args()
+
+    summary = run_batch(args.directory, args.output, args.cache_dir, args.min_brake_intensity,
+                        args.workers, args.chunk_rows)
+    logger.info(f"{summary['files']} files: {summary['analyzed']} analyzed, {summary['cached']} from cache, "
+                f"{len(summary['errors'])} errors in {summary['elapsed_s']}s -> {summary['output']}")
+
+
+if __name__ == "__main__":
+    main()
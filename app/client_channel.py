@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+"""
+Per-client delivery with rate control and backpressure for the WebSocket server
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from typing import Optional, Dict, Any, List, Tuple
+
+from topics import DERIVED_CHANNELS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RATE = 10.0
+MAX_RATE = 60.0
+MIN_RATE = 1.0
+# Bytes waiting in the connection write buffer above which the client is considered behind,
+# and below which its rate is raised back
+HIGH_WATER_BYTES = 64 * 1024
+LOW_WATER_BYTES = 8 * 1024
+# Discrete messages (events, lap stats, metadata) kept for a client that is behind
+MAX_QUEUED_MESSAGES = 256
+
+# Kinds of pending messages
+MESSAGE = 0  # discrete, queued in order
+STREAM = 1   # continuous, latest value only
+
+# Topics delivered whatever the subscriptions
+ALWAYS_DELIVERED = {"sessionMetadata", "clientStats", "profileResult"}
+# Topics only delivered to the clients that subscribed to them (latency probes of loadtest.py,
+# derived channels of the DSP stage)
+OPT_IN_TOPICS = {"probe"} | DERIVED_CHANNELS
+
+
+class ClientChannel:
+    """
+    Outgoing messages of one WebSocket client.
+
+    Continuous streams (telemetry, delta) are latest-value: the client receives the newest value
+    at each tick of its rate. Discrete messages are queued in order. A client still receiving the
+    previous tick, or with a full write buffer, has its rate halved until it catches up. Messages
+    are tagged with a topic and a client can subscribe to a subset of the topics.
+    """
+
+    def __init__(self, websocket, rate: float = DEFAULT_RATE):
+        self.websocket = websocket
+        self.requested_rate = rate
+        self.rate = rate
+        self.metadata_id: Optional[int] = None
+        self.subscriptions: Optional[set] = None
+        self._latest: Dict[str, str] = {}
+        self._queue: deque = deque()
+        self.sent = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.skipped_ticks = 0
+        self.slowdowns = 0
+        self._sending: Optional[asyncio.Future] = None
+        self.connected_at = time.time()
+
+    def wants(self, topic: Optional[str]) -> bool:
+        if topic in OPT_IN_TOPICS:
+            return self.subscriptions is not None and topic in self.subscriptions
+        return self.subscriptions is None or topic is None or topic in ALWAYS_DELIVERED or topic in self.subscriptions
+
+    def push(self, message: str, topic: Optional[str] = None):
+        """Queue a discrete message, the oldest one is dropped when the queue is full"""
+        if not self.wants(topic):
+            return
+        if len(self._queue) >= MAX_QUEUED_MESSAGES:
+            self._queue.popleft()
+            self.dropped += 1
+        self._queue.append((topic, message))
+
+    def offer(self, stream: str, message: str):
+        """Replace the pending value of a continuous stream"""
+        if not self.wants(stream):
+            return
+        if stream in self._latest:
+            self.coalesced += 1
+        self._latest[stream] = message
+
+    def take(self) -> List[Tuple[int, Optional[str], str]]:
+        """Pending (kind, topic, message): the queued messages first, then the stream values"""
+        pending = [(MESSAGE, topic, message) for topic, message in self._queue]
+        pending += [(STREAM, stream, message) for stream, message in self._latest.items()]
+        self._queue.clear()
+        self._latest.clear()
+        return pending
+
+    def set_rate(self, rate: float):
+        self.requested_rate = min(max(float(rate), MIN_RATE), MAX_RATE)
+        self.rate = self.requested_rate
+
+    def buffered_bytes(self) -> int:
+        """Bytes written to the connection but not sent yet"""
+        transport = getattr(self.websocket, "transport", None)
+        if transport is None:
+            return 0
+        return transport.get_write_buffer_size()
+
+    def sending(self) -> bool:
+        """True while the messages of the previous tick are still being sent"""
+        return self._sending is not None and not self._sending.done()
+
+    def _adapt(self) -> bool:
+        """
+        Adjust the rate to the connection, False when this tick must be skipped. The client is
+        behind when the previous send is still in progress after a whole tick (the connection
+        blocks in send() once its write limit is reached) or too much is buffered.
+        """
+        sending = self.sending()
+        buffered = self.buffered_bytes()
+        if sending or buffered > HIGH_WATER_BYTES:
+            if self.rate > MIN_RATE:
+                self.rate = max(self.rate / 2, MIN_RATE)
+                self.slowdowns += 1
+                reason = "send in progress" if sending else f"{buffered} bytes buffered"
+                logger.info(f"Client {self.name} is behind ({reason}), rate lowered to {self.rate:g} Hz")
+            self.skipped_ticks += 1
+            return False
+        if buffered < LOW_WATER_BYTES and self.rate < self.requested_rate:
+            self.rate = min(self.rate * 2, self.requested_rate)
+        return True
+
+    def _finish_send(self) -> Optional[BaseException]:
+        """Clear the previous send once it is done, return its error if it failed"""
+        task = self._sending
+        if task is None or not task.done():
+            return None
+        self._sending = None
+        return None if task.cancelled() else task.exception()
+
+    async def _send(self, pending: List[Tuple[int, Optional[str], str]]):
+        for _, _, message in pending:
+            await self.websocket.send(message)
+        self.sent += len(pending)
+
+    async def _deliver(self):
+        """
+        Send the pending messages at the client rate. The sends of a tick run in their own task,
+        so a client that stops reading slows the ticks down instead of blocking them.
+        """
+        try:
+            while True:
+                await asyncio.sleep(1.0 / self.rate)
+                error = self._finish_send()
+                if error is not None:
+                    # Closing the connection ends the handler, which unregisters the client
+                    logger.info(f"Client {self.name}: send failed ({error!r}), closing the connection")
+                    await self.websocket.close()
+                    return
+                if not self._adapt():
+                    continue
+                pending = self.take()
+                if pending:
+                    self._sending = asyncio.ensure_future(self._send(pending))
+        finally:
+            if self._sending is not None:
+                self._sending.cancel()
+                self._finish_send()
+                self._sending = None
+
+    async def run(self):
+        """Send the pending messages at the client rate until the connection closes"""
+        await self._deliver()
+
+    def handle_message(self, message) -> Optional[Dict[str, Any]]:
+        """
+        Control messages from the client: setRate, subscribe and getStats. Other requests are
+        returned for the server to handle.
+        """
+        try:
+            request = json.loads(message)
+        except (TypeError, ValueError):
+            return None
+        if not isinstance(request, dict):
+            return None
+        if request.get("type") == "setRate":
+            try:
+                self.set_rate(request["rate"])
+            except (KeyError, TypeError, ValueError):
+                return None
+        elif request.get("type") == "subscribe":
+            topics = request.get("topics")
+            self.subscriptions = set(topics) if isinstance(topics, list) else None
+        elif request.get("type") == "getStats":
+            self.push(json.dumps(self.stats()), "clientStats")
+        else:
+            return request
+        return None
+
+    @property
+    def name(self) -> str:
+        address = getattr(self.websocket, "remote_address", None)
+        return f"{address[0]}:{address[1]}" if address else "?"
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "type": "clientStats",
+            "rate": self.rate,
+            "requestedRate": self.requested_rate,
+            "behind": self.rate < self.requested_rate,
+            "bufferedBytes": self.buffered_bytes(),
+            "sending": self.sending(),
+            "subscriptions": sorted(self.subscriptions) if self.subscriptions is not None else None,
+            "queued": len(self._queue),
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "skippedTicks": self.skipped_ticks,
+            "slowdowns": self.slowdowns,
+            "connectedFor": round(time.time() - self.connected_at, 1),
+        }
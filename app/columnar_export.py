@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+"""
+Arrow / Parquet export of session recordings with channel, lap and time range selection
+
+    python columnar_export.py export/session_Hugo_Le_Mans_20250811_231630.frames --laps 3-7 --channels brake_percent,lap_dist
+"""
+
+import argparse
+import json
+import os
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+
+from frames import FrameBuffer, PEDAL, get_session_name
+
+# Columns of the CSV exports first (same names), then the ones only the binary recordings have
+COLUMNS = [
+    "timestamp", "session", "session_name", "gear", "brake_percent", "throttle_percent",
+    "driver_name", "vehicle_name", "track_name", "place", "elapsed_time", "telemetry_version",
+    "lap", "lap_dist", "corner",
+]
+# Low-cardinality string columns, stored once per distinct value
+DICTIONARY_COLUMNS = ["session_name", "driver_name", "vehicle_name", "track_name"]
+
+FORMATS = {"parquet": ".parquet", "arrow": ".arrow"}
+COMPRESSION = "zstd"
+
+
+def parse_laps(laps: str) -> List[Tuple[int, int]]:
+    """Lap selection "3,5-7" as inclusive (first, last) ranges"""
+    ranges = []
+    for part in laps.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        first, _, last = part.partition("-")
+        ranges.append((int(first), int(last or first)))
+    return ranges
+
+
+def lap_numbers(frames: np.ndarray, events: List[Dict[str, Any]], driver_names: np.ndarray) -> np.ndarray:
+    """
+    Lap of every frame of the player, -1 when unknown. Line crossings come from the stint
+    projections, or the lapCompleted events of the player, or else the lap distance wrapping
+    (laps then counted from 1 at the start of the recording).
+    """
+    et = frames["elapsed_time"]
+    crossings = [(e["et"], e["lap"]) for e in events if e.get("type") == "stintProjection"]
+    if not crossings and len(driver_names):
+        players = set(driver_names.tolist())
+        crossings = [(e["et"], e["lap"] + 1) for e in events
+                     if e.get("event") == "lapCompleted" and e.get("driverName") in players]
+    if crossings:
+        crossings.sort()
+        starts = np.array([c[0] for c in crossings])
+        laps = np.array([c[1] for c in crossings])
+        index = np.searchsorted(starts, et, side="right") - 1
+        # Frames before the first crossing are on the lap before it
+        result = np.where(index >= 0, laps[np.maximum(index, 0)], laps[0] - 1)
+        result[np.isnan(et)] = -1
+        return result.astype(np.int32)
+    lap_dist = frames["lap_dist"].astype(np.float64)
+    known = ~np.isnan(lap_dist)
+    if not known.any():
+        return np.full(len(frames), -1, dtype=np.int32)
+    dist = lap_dist[known]
+    wrapped = np.concatenate(([False], np.diff(dist) < -np.nanmax(dist) / 2))
+    result = np.full(len(frames), -1, dtype=np.int32)
+    result[known] = 1 + np.cumsum(wrapped)
+    return result
+
+
+def session_table(path: str, channels: Optional[List[str]] = None, laps: Optional[List[Tuple[int, int]]] = None,
+                  start: Optional[float] = None, end: Optional[float] = None) -> pa.Table:
+    """
+    Arrow table of a session recording (FrameBuffer.write_binary), restricted to the selected
+    channels (all of COLUMNS by default), laps and elapsed time range. Every column is converted
+    from the record array in one vectorized operation.
+    """
+    frames, names = FrameBuffer.read_binary(path)
+    with open(f"{path}.json", encoding="utf-8") as f:
+        events = json.load(f).get("events", [])
+
+    # Index of the name range of every frame, for the dictionary columns
+    name_index = np.repeat(np.arange(len(names), dtype=np.int32), [end_ - start_ for start_, end_, *_ in names])
+    driver_names = np.array([n[2] for n in names], dtype=object)
+    laps_column = lap_numbers(frames, events, driver_names)
+
+    mask = np.ones(len(frames), dtype=bool)
+    et = frames["elapsed_time"]
+    if start is not None:
+        mask &= et >= start
+    if end is not None:
+        mask &= et <= end
+    if laps:
+        selected = np.zeros(len(frames), dtype=bool)
+        for first, last in laps:
+            selected |= (laps_column >= first) & (laps_column <= last)
+        mask &= selected
+    rows = np.flatnonzero(mask)
+    frames = frames[rows]
+    name_index = name_index[rows]
+    laps_column = laps_column[rows]
+
+    def names_column(position: int) -> pa.DictionaryArray:
+        values = [n[position] for n in names]
+        dictionary, indices = np.unique(values, return_inverse=True) if values else (np.array([], dtype=str), [])
+        return pa.DictionaryArray.from_arrays(np.asarray(indices, dtype=np.int32)[name_index], pa.array(dictionary.tolist()))
+
+    def session_names() -> pa.DictionaryArray:
+        sessions, inverse = np.unique(frames["session"], return_inverse=True)
+        return pa.DictionaryArray.from_arrays(inverse.astype(np.int32),
+                                              pa.array([get_session_name(int(s)) for s in sessions]))
+
+    builders = {
+        "timestamp": lambda: pa.array((frames["timestamp"] * 1e6).astype(np.int64), pa.timestamp("us", tz="UTC")),
+        "session": lambda: pa.array(frames["session"]),
+        "session_name": session_names,
+        "gear": lambda: pa.array(frames["gear"]),
+        "brake_percent": lambda: pa.array((PEDAL.decode(frames["brake"]) * 100).astype(np.float32)),
+        "throttle_percent": lambda: pa.array((PEDAL.decode(frames["throttle"]) * 100).astype(np.float32)),
+        "driver_name": lambda: names_column(2),
+        "vehicle_name": lambda: names_column(3),
+        "track_name": lambda: names_column(4),
+        "place": lambda: pa.array(frames["place"]),
+        "elapsed_time": lambda: pa.array(frames["elapsed_time"], from_pandas=True),
+        "telemetry_version": lambda: pa.array(frames["version"]),
+        "lap": lambda: pa.array(laps_column, mask=laps_column < 0),
+        "lap_dist": lambda: pa.array(frames["lap_dist"], from_pandas=True),
+        "corner": lambda: pa.array(frames["corner"], mask=frames["corner"] < 0),
+    }
+    columns = channels or COLUMNS
+    unknown = [c for c in columns if c not in builders]
+    if unknown:
+        raise ValueError(f"Unknown channels: {', '.join(unknown)}")
+    return pa.table({column: builders[column]() for column in columns})
+
+
+def write_table(table: pa.Table, path: str, format: str = "parquet") -> str:
+    """Write a table as Parquet or Arrow IPC (Feather v2), compressed"""
+    if format == "parquet":
+        pq.write_table(table, path, compression=COMPRESSION,
+                       use_dictionary=[c for c in DICTIONARY_COLUMNS if c in table.column_names])
+    elif format == "arrow":
+        feather.write_feather(table, path, compression=COMPRESSION)
+    else:
+        raise ValueError(f"Unknown format {format}, expected one of {', '.join(FORMATS)}")
+    return path
+
+
+def export_session(path: str, output: Optional[str] = None, format: str = "parquet",
+                   channels: Optional[List[str]] = None, laps: Optional[List[Tuple[int, int]]] = None,
+                   start: Optional[float] = None, end: Optional[float] = None) -> Dict[str, Any]:
+    """Export a session recording, return a summary of the written file"""
+    if format not in FORMATS:
+        raise ValueError(f"Unknown format {format}, expected one of {', '.join(FORMATS)}")
+    table = session_table(path, channels, laps, start, end)
+    output = output or os.path.splitext(path)[0] + FORMATS[format]
+    write_table(table, output, format)
+    return {
+        "filename": os.path.basename(output),
+        "filepath": output,
+        "format": format,
+        "rows": table.num_rows,
+        "columns": table.column_names,
+        "bytes": os.path.getsize(output),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export a session recording to Parquet or Arrow")
+    parser.add_argument("path", help="session recording (.frames) written by the WebSocket server")
+    parser.add_argument("-o", "--output", help="output file (next to the recording by default)")
+    parser.add_argument("--format", choices=list(FORMATS), default="parquet")
+    parser.add_argument("--channels", help=f"comma-separated columns among {', '.join(COLUMNS)}")
+    parser.add_argument("--laps", help="laps to keep, e.g. 3,5-7")
+    parser.add_argument("--start", type=float, help="first elapsed time (s) to keep")
+    parser.add_argument("--end", type=float, help="last elapsed time (s) to keep")
+    args = parser.parse_args()
+    summary = export_session(args.path, args.output, args.format,
+                             args.channels.split(",") if args.channels else None,
+                             parse_laps(args.laps) if args.laps else None, args.start, args.end)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
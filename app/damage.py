@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""
+Damage and impact state of every car, from rF2Extended.mTrackedDamages and the telemetry damage
+fields, diffed at each update so that only the cars whose damage changed are sent
+"""
+
+from typing import Optional, Dict, Any
+
+import numpy as np
+
+from rF2data import rFactor2Constants
+from struct_views import field_view
+
+MAX_VEHICLES = rFactor2Constants.MAX_MAPPED_VEHICLES
+MAX_IDS = rFactor2Constants.MAX_MAPPED_IDS
+
+# Columns of the per-slot state matrix: every damage field of a car in one row, so a single
+# comparison finds the changed cars
+STATE_COLUMNS = {
+    "maxImpact": slice(0, 1),
+    "accumulatedImpact": slice(1, 2),
+    "lastImpactET": slice(2, 3),
+    "lastImpactMagnitude": slice(3, 4),
+    "detached": slice(4, 5),
+    "dentSeverity": slice(5, 13),
+    "wheelsDetached": slice(13, 17),
+}
+STATE_WIDTH = 17
+TELEMETRY_FIELDS = {
+    "lastImpactET": "mLastImpactET",
+    "lastImpactMagnitude": "mLastImpactMagnitude",
+    "detached": "mDetached",
+    "dentSeverity": "mDentSeverity",
+    "wheelsDetached": "mWheels.mDetached",
+}
+
+
+class DamageMonitor:
+    """
+    Tracks the damage of the whole field without per-car Python loops.
+
+    The telemetry fields of the 128 vehicle slots and the 512 mTrackedDamages entries (indexed by
+    vehicle ID, reset by the game on a pit visit or a session restart) are read through zero-copy
+    NumPy views into a preallocated (slots, 17) state matrix, compared with the previous one in
+    one vectorized pass. poll() only returns the rows that changed, and nothing is read while
+    neither the telemetry nor the extended buffer was updated.
+    """
+
+    def __init__(self, sim_info):
+        self.sim_info = sim_info
+        vehicles = sim_info.Rf2Tele.mVehicles
+        self._ids = field_view(vehicles, "mID")
+        self._views = {name: field_view(vehicles, path) for name, path in TELEMETRY_FIELDS.items()}
+        tracked = sim_info.Rf2Ext.mTrackedDamages
+        self._max_impact = field_view(tracked, "mMaxImpactMagnitude")
+        self._accumulated_impact = field_view(tracked, "mAccumulatedImpactMagnitude")
+        self._version: Optional[tuple] = None
+
+        self.state = np.zeros((MAX_VEHICLES, STATE_WIDTH))
+        self._previous = np.zeros((MAX_VEHICLES, STATE_WIDTH))
+        self.vehicle_ids = np.full(MAX_VEHICLES, -1, dtype=np.int32)
+        self._previous_ids = np.full(MAX_VEHICLES, -1, dtype=np.int32)
+        self.num_vehicles = 0
+
+    def _read(self, n: int):
+        """Copy the current damage of the first n slots into the state matrix"""
+        state = self.state[:n]
+        ids = self._ids[:n]
+        self.vehicle_ids[:n] = ids
+        # mTrackedDamages is indexed by vehicle ID, not by slot
+        tracked = (ids >= 0) & (ids < MAX_IDS)
+        slots = np.where(tracked, ids, 0)
+        state[:, STATE_COLUMNS["maxImpact"]] = np.where(tracked, self._max_impact[slots], 0.0)[:, None]
+        state[:, STATE_COLUMNS["accumulatedImpact"]] = np.where(tracked, self._accumulated_impact[slots], 0.0)[:, None]
+        for name, view in self._views.items():
+            state[:, STATE_COLUMNS[name]] = view[:n].reshape(n, -1)
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """
+        damage message with the cars whose damage changed since the previous update and the IDs of
+        the cars gone since then (removed), if any
+        """
+        telemetry = self.sim_info.Rf2Tele
+        version = (telemetry.mVersionUpdateEnd, self.sim_info.Rf2Ext.mVersionUpdateEnd)
+        if version == self._version:
+            return None
+        self._version = version
+
+        self.state, self._previous = self._previous, self.state
+        self.vehicle_ids, self._previous_ids = self._previous_ids, self.vehicle_ids
+        previous_n, n = self.num_vehicles, max(0, min(telemetry.mNumVehicles, MAX_VEHICLES))
+        self.num_vehicles = n
+        self._read(n)
+        # Slots past the previous count held no car: everything in them is new
+        self._previous_ids[previous_n:] = -1
+
+        changed = (self.state[:n] != self._previous[:n]).any(axis=1) | (self.vehicle_ids[:n] != self._previous_ids[:n])
+        slots = np.flatnonzero(changed)
+        # Cars that left the session (or whose slot was taken by another one)
+        previous_ids = self._previous_ids[:previous_n]
+        removed = np.setdiff1d(previous_ids[previous_ids >= 0], self.vehicle_ids[:n])
+        if not len(slots) and not len(removed):
+            return None
+        return {"type": "damage", "et": round(self.sim_info.Rf2Scor.mScoringInfo.mCurrentET, 3),
+                **self._rows(slots), "removed": removed.tolist()}
+
+    def _rows(self, slots: np.ndarray) -> Dict[str, Any]:
+        state = self.state[slots]
+
+        def column(name: str) -> np.ndarray:
+            return state[:, STATE_COLUMNS[name]]
+
+        return {
+            "vehicleIds": self.vehicle_ids[slots].tolist(),
+            "maxImpact": np.round(column("maxImpact")[:, 0], 1).tolist(),
+            "accumulatedImpact": np.round(column("accumulatedImpact")[:, 0], 1).tolist(),
+            "lastImpactET": np.round(column("lastImpactET")[:, 0], 3).tolist(),
+            "lastImpactMagnitude": np.round(column("lastImpactMagnitude")[:, 0], 1).tolist(),
+            "detached": (column("detached")[:, 0] != 0).tolist(),
+            "dentSeverity": column("dentSeverity").astype(np.int8).tolist(),
+            "wheelsDetached": (column("wheelsDetached") != 0).tolist(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Damage of every car on track at the last update"""
+        return {"type": "damageTable", **self._rows(np.arange(self.num_vehicles))}
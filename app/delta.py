@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+"""
+Live delta to the best lap, computed from a reference lap sampled on a fixed lap distance grid
+"""
+
+import math
+from typing import Optional, Dict, Any, NamedTuple, Sequence
+
+import numpy as np
+
+# Distance (meters) between two points of the lap distance grid
+DEFAULT_GRID_SPACING = 2.0
+# A lap can only become the reference if it covered at least this fraction of the grid
+MIN_LAP_COVERAGE = 0.98
+# Samples further apart than this (meters) are not interpolated (teleport, pit lane)
+MAX_FILL_DISTANCE = 100.0
+
+# Channels recorded on the grid next to the lap time, for trace overlays and reference lap files
+TRACE_CHANNELS = ("speed", "throttle", "brake", "steering", "gear", "pos_x", "pos_z")
+
+
+class ReferenceLap(NamedTuple):
+    """Best lap elapsed time at every grid point, swapped as a whole on a new personal best"""
+    lap_number: int
+    lap_time: float
+    times: np.ndarray
+    # (len(TRACE_CHANNELS), points) values on the grid, NaN when not recorded
+    channels: Optional[np.ndarray] = None
+    # Reference lap file the lap was loaded from, None for the laps driven in this session
+    source: Optional[str] = None
+
+
+class DeltaEngine:
+    """
+    Delta to the best lap, updated on every sampled frame.
+
+    The lap in progress is written into a preallocated grid as it is driven, so that it can be
+    promoted to reference in one assignment when it turns out to be a personal best. The delta
+    itself is an O(1) grid lookup plus a linear interpolation. The trace channels are recorded on
+    the same grid; a reference loaded from another driver's file is pinned with set_reference()
+    and stays the reference while the personal best keeps being tracked in best.
+    """
+
+    def __init__(self, lap_length: float, grid_spacing: float = DEFAULT_GRID_SPACING):
+        self.lap_length = float(lap_length)
+        self.grid_spacing = grid_spacing
+        self.num_points = int(math.ceil(self.lap_length / grid_spacing)) + 1
+        self.reference: Optional[ReferenceLap] = None
+        self.best: Optional[ReferenceLap] = None
+        self.pinned = False
+        self.delta: Optional[float] = None
+        self.trace: Optional[np.ndarray] = None
+        # Row 0 is the lap time, the next ones the TRACE_CHANNELS
+        self._current = np.full((1 + len(TRACE_CHANNELS), self.num_points), np.nan)
+        self._no_values = np.full(len(TRACE_CHANNELS), np.nan)
+        self._lap_number: Optional[int] = None
+        self._lap_start_et = 0.0
+        self._last_index = -1
+        self._last_dist = 0.0
+        self._last = np.full(1 + len(TRACE_CHANNELS), np.nan)
+
+    def set_reference(self, reference: ReferenceLap):
+        """Compare against a lap loaded from a file until clear_reference()"""
+        if len(reference.times) != self.num_points:
+            raise ValueError(f"Reference lap has {len(reference.times)} grid points, expected {self.num_points}")
+        self.reference = reference
+        self.pinned = True
+
+    def clear_reference(self):
+        """Go back to comparing against the personal best"""
+        self.reference = self.best
+        self.pinned = False
+
+    def update(self, lap_number: int, lap_start_et: float, elapsed: float, lap_dist: float,
+               values: Optional[Sequence[float]] = None) -> Optional[float]:
+        """
+        Consume one frame, return the delta (seconds, positive when slower) or None.
+        values are the TRACE_CHANNELS of the frame.
+        """
+        if self._lap_number is None:
+            self._start_lap(lap_number, lap_start_et)
+        elif lap_number != self._lap_number:
+            self._complete_lap(lap_start_et - self._lap_start_et)
+            self._start_lap(lap_number, lap_start_et)
+
+        lap_time = elapsed - self._lap_start_et
+        if not 0.0 <= lap_dist <= self.lap_length or lap_time < 0.0:
+            self.delta = None
+            self.trace = None
+            return None
+        sample = np.concatenate(([lap_time], self._no_values if values is None else values))
+        self._record(lap_dist, sample)
+
+        reference = self.reference
+        if reference is None:
+            self.delta = None
+            self.trace = None
+            return None
+        position = lap_dist / self.grid_spacing
+        i = min(int(position), self.num_points - 2)
+        frac = position - i
+        reference_time = reference.times[i] + frac * (reference.times[i + 1] - reference.times[i])
+        self.delta = float(lap_time - reference_time)
+        if reference.channels is not None:
+            self.trace = reference.channels[:, i] + frac * (reference.channels[:, i + 1] - reference.channels[:, i])
+        return self.delta
+
+    def _record(self, lap_dist: float, sample: np.ndarray):
+        """Write the lap time and channels of the grid points passed since the previous frame"""
+        index = int(lap_dist / self.grid_spacing)
+        if self._last_index < 0 or lap_dist - self._last_dist > MAX_FILL_DISTANCE:
+            if self._last_index < 0 and index == 0:
+                self._current[:, 0] = sample
+        elif index > self._last_index:
+            grid = np.arange(self._last_index + 1, index + 1) * self.grid_spacing
+            t = (grid - self._last_dist) / max(lap_dist - self._last_dist, 1e-9)
+            self._current[:, self._last_index + 1:index + 1] = self._last[:, None] + t * (sample - self._last)[:, None]
+        if index >= self._last_index:
+            self._last_index = index
+            self._last_dist = lap_dist
+            self._last = sample
+
+    def _start_lap(self, lap_number: int, lap_start_et: float):
+        self._lap_number = lap_number
+        self._lap_start_et = lap_start_et
+        self._current = np.full((1 + len(TRACE_CHANNELS), self.num_points), np.nan)
+        self._last_index = -1
+
+    def _complete_lap(self, lap_time: float):
+        """Promote the lap just completed to reference if it is a valid personal best"""
+        rows = self._current
+        times = rows[0]
+        times[0] = 0.0
+        times[-1] = lap_time
+        covered = np.count_nonzero(~np.isnan(times)) / self.num_points
+        if covered < MIN_LAP_COVERAGE or lap_time <= 0.0:
+            return
+        if self.best is not None and lap_time >= self.best.lap_time:
+            return
+        # Fill the few grid points missed (stutter, pause) from their neighbours
+        grid = np.arange(self.num_points)
+        for row in rows:
+            missing = np.isnan(row)
+            if missing.any() and not missing.all():
+                row[missing] = np.interp(grid[missing], grid[~missing], row[~missing])
+        # Single reference assignment: readers either see the old or the new best lap
+        self.best = ReferenceLap(self._lap_number, lap_time, times, rows[1:])
+        if not self.pinned:
+            self.reference = self.best
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        reference = self.reference
+        return {
+            "type": "delta",
+            "delta": round(self.delta, 3) if self.delta is not None else None,
+            "bestLap": reference.lap_number if reference else None,
+            "bestLapTime": round(reference.lap_time, 3) if reference else None,
+            "reference": reference.source if reference else None,
+            # Reference lap channels at the current lap distance, for trace overlays
+            "trace": _trace_dict(self.trace),
+        }
+
+
+def _trace_dict(trace: Optional[np.ndarray]) -> Optional[Dict[str, Any]]:
+    if trace is None:
+        return None
+    return {name: None if math.isnan(value) else round(value, 3) for name, value in zip(TRACE_CHANNELS, trace.tolist())}
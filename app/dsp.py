@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Streaming signal processing of the player telemetry: derived channels (rates, jerk, smoothed
+yaw rate) computed incrementally per telemetry update with filters and finite differences
+"""
+
+import math
+from abc import ABC, abstractmethod
+from operator import attrgetter
+from typing import Optional, Dict, Any, List, Sequence
+
+import numpy as np
+
+# Nominal rate of the telemetry updates, the filters are designed for it
+DEFAULT_SAMPLE_RATE = 50.0
+# Recent output samples kept per derived channel
+DEFAULT_WINDOW = 512
+
+
+def butterworth_lowpass(cutoff: float, rate: float = DEFAULT_SAMPLE_RATE):
+    """(b, a) of a 2nd order Butterworth low-pass filter (bilinear transform)"""
+    k = math.tan(math.pi * cutoff / rate)
+    norm = 1.0 / (1.0 + math.sqrt(2.0) * k + k * k)
+    b0 = k * k * norm
+    return (b0, 2.0 * b0, b0), (1.0, 2.0 * (k * k - 1.0) * norm, (1.0 - math.sqrt(2.0) * k + k * k) * norm)
+
+
+def moving_average(length: int) -> np.ndarray:
+    """Taps of a moving average FIR filter"""
+    return np.full(length, 1.0 / length)
+
+
+class Operator(ABC):
+    """One processing step of a derived channel, applied to a vector of width values per sample"""
+
+    @abstractmethod
+    def reset(self, width: int):
+        """Allocate the state for width values per sample"""
+
+    @abstractmethod
+    def __call__(self, x: np.ndarray, dt: float) -> np.ndarray:
+        """Process one sample taken dt seconds after the previous one"""
+
+
+class Difference(Operator):
+    """First derivative by backward finite difference over the sample interval"""
+
+    def reset(self, width: int):
+        self._previous = np.full(width, np.nan)
+        self.out = np.full(width, np.nan)
+
+    def __call__(self, x: np.ndarray, dt: float) -> np.ndarray:
+        np.subtract(x, self._previous, out=self.out)
+        self.out /= dt
+        self._previous[:] = x
+        return self.out
+
+
+class FIRFilter(Operator):
+    """
+    FIR filter over the last len(taps) samples. The samples are written twice in a ring of
+    twice the length, so the window is always one contiguous slice and the filter one dot product.
+    """
+
+    def __init__(self, taps: Sequence[float]):
+        # Reversed once, so the oldest sample of the window meets the last tap
+        self.taps = np.asarray(taps, dtype=np.float64)[::-1].copy()
+
+    def reset(self, width: int):
+        self._ring = np.full((2 * len(self.taps), width), np.nan)
+        self._position = 0
+        self._primed = False
+        self.out = np.full(width, np.nan)
+
+    def __call__(self, x: np.ndarray, dt: float) -> np.ndarray:
+        length = len(self.taps)
+        if not self._primed:
+            if np.isnan(x).any():
+                return self.out
+            # Start from a steady state on the first sample instead of a ramp from zero
+            self._ring[:] = x
+            self._primed = True
+        self._ring[self._position] = x
+        self._ring[self._position + length] = x
+        self._position = (self._position + 1) % length
+        np.dot(self.taps, self._ring[self._position:self._position + length], out=self.out)
+        return self.out
+
+
+class IIRFilter(Operator):
+    """IIR filter (b, a) in transposed direct form II, the state of every column preallocated"""
+
+    def __init__(self, b: Sequence[float], a: Sequence[float]):
+        a0 = a[0]
+        self.b = np.asarray(b, dtype=np.float64) / a0
+        self.a = np.asarray(a, dtype=np.float64) / a0
+        order = max(len(self.a), len(self.b))
+        self.b = np.pad(self.b, (0, order - len(self.b)))
+        self.a = np.pad(self.a, (0, order - len(self.a)))
+
+    def reset(self, width: int):
+        self._state = np.zeros((len(self.a) - 1, width))
+        self._primed = False
+        self._scratch = np.empty(width)
+        self.out = np.full(width, np.nan)
+
+    def __call__(self, x: np.ndarray, dt: float) -> np.ndarray:
+        if not self._primed:
+            if np.isnan(x).any():
+                return self.out
+            # State of a filter that has seen x forever: no start-up transient
+            y = x * self.b.sum() / self.a.sum()
+            for i in range(len(self._state)):
+                self._state[i] = self.b[i + 1:].sum() * x - self.a[i + 1:].sum() * y
+            self._primed = True
+        out, state, scratch = self.out, self._state, self._scratch
+        np.multiply(self.b[0], x, out=out)
+        out += state[0]
+        for i in range(len(state)):
+            np.multiply(self.b[i + 1], x, out=state[i])
+            np.multiply(self.a[i + 1], out, out=scratch)
+            state[i] -= scratch
+            if i + 1 < len(state):
+                state[i] += state[i + 1]
+        return out
+
+
+class DerivedChannel:
+    """
+    A channel computed from telemetry fields (paths like "mLocalAccel.x") by a chain of
+    operators. Inputs, operator states and the window of recent outputs are allocated once.
+    """
+
+    def __init__(self, name: str, sources: Sequence[str], operators: Sequence[Operator], unit: str = "",
+                 window: int = DEFAULT_WINDOW):
+        self.name = name
+        self.sources = list(sources)
+        self.operators = list(operators)
+        self.unit = unit
+        self._getters = [attrgetter(source) for source in self.sources]
+        self._input = np.empty(len(self.sources))
+        self._times = np.full(window, np.nan)
+        self._values = np.full((window, len(self.sources)), np.nan)
+        self._count = 0
+        self.reset()
+
+    def reset(self):
+        for operator in self.operators:
+            operator.reset(len(self.sources))
+        self._times.fill(np.nan)
+        self._values.fill(np.nan)
+        self._count = 0
+
+    def update(self, telemetry, et: float, dt: float) -> np.ndarray:
+        """Process one sample, return the output vector (NaN until the operators are primed)"""
+        x = self._input
+        for i, getter in enumerate(self._getters):
+            x[i] = getter(telemetry)
+        for operator in self.operators:
+            x = operator(x, dt)
+        slot = self._count % len(self._times)
+        self._times[slot] = et
+        self._values[slot] = x
+        self._count += 1
+        return x
+
+    @property
+    def latest(self) -> Optional[np.ndarray]:
+        return self._values[(self._count - 1) % len(self._times)] if self._count else None
+
+    def value(self) -> Any:
+        """Latest output for JSON: a number for single-source channels, a list otherwise"""
+        latest = self.latest
+        if latest is None or np.isnan(latest).any():
+            return None
+        values = np.round(latest, 4).tolist()
+        return values[0] if len(values) == 1 else values
+
+    def window(self, samples: Optional[int] = None) -> Dict[str, Any]:
+        """The last samples outputs, oldest first"""
+        size = len(self._times)
+        count = min(self._count, size, samples if samples is not None else size)
+        rows = np.arange(self._count - count, self._count) % size
+        values = np.round(self._values[rows], 4).astype(object)
+        values[np.isnan(self._values[rows])] = None
+        return {
+            "channel": self.name,
+            "unit": self.unit,
+            "sources": self.sources,
+            "et": np.round(self._times[rows], 3).tolist(),
+            "values": [row[0] for row in values.tolist()] if len(self.sources) == 1 else values.tolist(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"channel": self.name, "unit": self.unit, "sources": self.sources, "value": self.value()}
+
+
+def default_channels(rate: float = DEFAULT_SAMPLE_RATE, window: int = DEFAULT_WINDOW) -> List[DerivedChannel]:
+    """Brake application rate, steering rate, jerk and smoothed yaw rate (topics.DERIVED_CHANNELS)"""
+    return [
+        DerivedChannel("brakeRate", ["mUnfilteredBrake"],
+                       [Difference(), IIRFilter(*butterworth_lowpass(8.0, rate))], "1/s", window),
+        DerivedChannel("steeringRate", ["mUnfilteredSteering"],
+                       [Difference(), IIRFilter(*butterworth_lowpass(8.0, rate))], "1/s", window),
+        # Acceleration is noisy: filtered before it is differentiated
+        DerivedChannel("jerk", ["mLocalAccel.x", "mLocalAccel.y", "mLocalAccel.z"],
+                       [IIRFilter(*butterworth_lowpass(5.0, rate)), Difference()], "m/s^3", window),
+        DerivedChannel("yawRate", ["mLocalRot.y"], [FIRFilter(moving_average(5))], "rad/s", window),
+    ]
+
+
+class DSPStage:
+    """
+    Runs every registered derived channel on each new telemetry sample of the player.
+
+    Samples are told apart by mElapsedTime: a repeated one is ignored and one going backwards
+    (new session, restart) resets the channels. The step between two samples is their real
+    interval, so the differences stay correct when updates are missed.
+    """
+
+    def __init__(self, channels: Optional[Sequence[DerivedChannel]] = None):
+        self.channels: Dict[str, DerivedChannel] = {}
+        for channel in channels if channels is not None else default_channels():
+            self.register(channel)
+        self.et: Optional[float] = None
+
+    def register(self, channel: DerivedChannel):
+        """Add a derived channel, replacing the one with the same name"""
+        self.channels[channel.name] = channel
+
+    def reset(self):
+        for channel in self.channels.values():
+            channel.reset()
+        self.et = None
+
+    def update(self, telemetry) -> bool:
+        """Feed the telemetry of the player, True when it was a new sample"""
+        et = telemetry.mElapsedTime
+        if self.et is not None and et <= self.et:
+            if et == self.et:
+                return False
+            self.reset()
+        dt = et - self.et if self.et is not None else math.nan
+        self.et = et
+        for channel in self.channels.values():
+            channel.update(telemetry, et, dt)
+        return True
+
+    def messages(self) -> List[Dict[str, Any]]:
+        """One derived message per channel with the latest values"""
+        et = round(self.et, 3) if self.et is not None else None
+        return [{"type": "derived", "channel": name, "et": et, "value": channel.value()}
+                for name, channel in self.channels.items()]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"et": self.et, "channels": [channel.to_dict() for channel in self.channels.values()]}
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Event detection: diffs consecutive shared memory snapshots of every car and emits discrete events
+(pit entry/exit, pit stops, impacts, laps, flags, session changes) instead of raw samples
+"""
+
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from rF2data import rFactor2Constants
+from session_metadata import StringCache
+from struct_views import field_view
+
+SCORING_FIELDS = ("mID", "mInPits", "mNumPitstops", "mTotalLaps", "mLastLapTime")
+TELEMETRY_FIELDS = ("mID", "mLastImpactET", "mLastImpactMagnitude")
+
+# Impacts below this magnitude (curb strikes, light contacts) are not reported
+MIN_IMPACT_MAGNITUDE = 50.0
+
+
+class EventEngine:
+    """
+    Polls the mapped buffers and returns the events that happened since the previous poll.
+
+    Per-vehicle fields are read through zero-copy NumPy views over the 128 vehicle slots and
+    compared with the previous snapshot in one vectorized pass per field. A buffer whose
+    mVersionUpdateEnd did not move is not diffed at all.
+    """
+
+    def __init__(self, sim_info, strings: Optional[StringCache] = None):
+        self.sim_info = sim_info
+        self.strings = strings or StringCache()
+        self._scoring_views = {name: field_view(sim_info.Rf2Scor.mVehicles, name) for name in SCORING_FIELDS}
+        self._telemetry_views = {name: field_view(sim_info.Rf2Tele.mVehicles, name) for name in TELEMETRY_FIELDS}
+        self._scoring: Optional[Dict[str, np.ndarray]] = None
+        self._telemetry: Optional[Dict[str, np.ndarray]] = None
+        self._scoring_version: Optional[int] = None
+        self._telemetry_version: Optional[int] = None
+        self._global: Optional[Dict[str, Any]] = None
+
+    def poll(self) -> List[Dict[str, Any]]:
+        """Events since the previous call (nothing on the first call, which only takes the snapshot)"""
+        events: List[Dict[str, Any]] = []
+        scoring = self.sim_info.Rf2Scor
+        et = round(scoring.mScoringInfo.mCurrentET, 3)
+
+        if scoring.mVersionUpdateEnd != self._scoring_version:
+            self._scoring_version = scoring.mVersionUpdateEnd
+            self._poll_global(scoring.mScoringInfo, et, events)
+            self._poll_scoring(scoring.mScoringInfo.mNumVehicles, et, events)
+
+        telemetry = self.sim_info.Rf2Tele
+        if telemetry.mVersionUpdateEnd != self._telemetry_version:
+            self._telemetry_version = telemetry.mVersionUpdateEnd
+            self._poll_telemetry(telemetry.mNumVehicles, et, events)
+
+        return events
+
+    def _snapshot(self, views: Dict[str, np.ndarray], num_vehicles: int) -> Dict[str, np.ndarray]:
+        n = max(0, min(num_vehicles, rFactor2Constants.MAX_MAPPED_VEHICLES))
+        return {name: view[:n].copy() for name, view in views.items()}
+
+    @staticmethod
+    def _same_slots(current: Dict[str, np.ndarray], previous: Dict[str, np.ndarray]) -> np.ndarray:
+        """Mask of the slots still holding the same vehicle (slots are re-used in multiplayer)"""
+        n = min(len(current["mID"]), len(previous["mID"]))
+        same = np.zeros(len(current["mID"]), dtype=bool)
+        same[:n] = current["mID"][:n] == previous["mID"][:n]
+        return same
+
+    def _changed(self, current, previous, name: str, same: np.ndarray) -> np.ndarray:
+        """Slots of the vehicles whose field changed"""
+        n = min(len(current[name]), len(previous[name]))
+        changed = np.zeros(len(current[name]), dtype=bool)
+        changed[:n] = current[name][:n] != previous[name][:n]
+        return np.flatnonzero(changed & same)
+
+    def _poll_scoring(self, num_vehicles: int, et: float, events: List[Dict[str, Any]]):
+        current = self._snapshot(self._scoring_views, num_vehicles)
+        previous, self._scoring = self._scoring, current
+        if previous is None:
+            return
+        same = self._same_slots(current, previous)
+
+        for slot in self._changed(current, previous, "mInPits", same):
+            in_pits = bool(current["mInPits"][slot])
+            events.append(self._vehicle_event("pitEntry" if in_pits else "pitExit", et, slot))
+        for slot in self._changed(current, previous, "mNumPitstops", same):
+            if current["mNumPitstops"][slot] > previous["mNumPitstops"][slot]:
+                events.append(self._vehicle_event("pitStop", et, slot, pitstops=int(current["mNumPitstops"][slot])))
+        for slot in self._changed(current, previous, "mTotalLaps", same):
+            if current["mTotalLaps"][slot] > previous["mTotalLaps"][slot]:
+                lap_time = float(current["mLastLapTime"][slot])
+                events.append(self._vehicle_event("lapCompleted", et, slot, lap=int(current["mTotalLaps"][slot]),
+                                                  lapTime=round(lap_time, 3) if lap_time > 0 else None))
+
+    def _poll_telemetry(self, num_vehicles: int, et: float, events: List[Dict[str, Any]]):
+        current = self._snapshot(self._telemetry_views, num_vehicles)
+        previous, self._telemetry = self._telemetry, current
+        if previous is None:
+            return
+        same = self._same_slots(current, previous)
+        for slot in self._changed(current, previous, "mLastImpactET", same):
+            magnitude = float(current["mLastImpactMagnitude"][slot])
+            if current["mLastImpactET"][slot] > previous["mLastImpactET"][slot] and magnitude >= MIN_IMPACT_MAGNITUDE:
+                vehicle_id = int(current["mID"][slot])
+                events.append({
+                    "type": "event", "event": "impact", "et": et, "vehicleId": vehicle_id,
+                    "driverName": self._driver_name(vehicle_id),
+                    "impactET": round(float(current["mLastImpactET"][slot]), 3),
+                    "magnitude": round(magnitude, 1),
+                })
+
+    def _poll_global(self, scoring_info, et: float, events: List[Dict[str, Any]]):
+        current = {
+            "session": scoring_info.mSession,
+            "gamePhase": scoring_info.mGamePhase,
+            "yellowFlagState": scoring_info.mYellowFlagState,
+            "sectorFlags": list(scoring_info.mSectorFlag),
+        }
+        previous, self._global = self._global, current
+        if previous is None:
+            return
+        for name, value in current.items():
+            if value != previous[name]:
+                events.append({"type": "event", "event": f"{name}Change", "et": et,
+                               "previous": previous[name], "value": value})
+
+    def _vehicle_event(self, name: str, et: float, slot: int, **details) -> Dict[str, Any]:
+        vehicle = self.sim_info.Rf2Scor.mVehicles[slot]
+        return {
+            "type": "event", "event": name, "et": et, "vehicleId": vehicle.mID,
+            "driverName": self.strings.decode(vehicle.mDriverName), **details,
+        }
+
+    def _driver_name(self, vehicle_id: int) -> Optional[str]:
+        """Driver name of a telemetry vehicle ID, looked up in the scoring slots"""
+        if self._scoring is None:
+            return None
+        slots = np.flatnonzero(self._scoring["mID"] == vehicle_id)
+        if not len(slots):
+            return None
+        return self.strings.decode(self.sim_info.Rf2Scor.mVehicles[int(slots[0])].mDriverName)
@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Compact telemetry frames and the server-side session buffer
+"""
+
+import csv
+import json
+import os
+import struct
+import time
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+import numpy as np
+
+from quantization import quantizer
+
+PEDAL = quantizer("brake")
+LAP_DIST = quantizer("lap_dist")
+ELAPSED_TIME = quantizer("elapsed_time")
+
+# Binary record of one frame, little endian, strings are kept once per session (see FrameBuffer)
+FRAME_STRUCT = struct.Struct("<ddIBBbBBfh")
+FRAME_DTYPE = np.dtype([
+    ("timestamp", "<f8"),   # server wall clock (seconds since epoch)
+    ("elapsed_time", "<f8"),  # sim clock (mElapsedTime), NaN when unknown
+    ("version", "<u4"),     # mVersionUpdateEnd of the telemetry buffer the frame was read from
+    ("session", "u1"),
+    ("place", "u1"),
+    ("gear", "i1"),
+    ("brake", "u1"),        # PEDAL codes, 0..255
+    ("throttle", "u1"),
+    ("lap_dist", "<f4"),    # NaN when unknown
+    ("corner", "<i2"),      # -1 on straights or when unknown
+])
+assert FRAME_DTYPE.itemsize == FRAME_STRUCT.size
+
+# Same columns as the /export-csv endpoint of the API
+CSV_HEADERS = [
+    "timestamp", "session", "session_name", "gear", "brake_percent",
+    "throttle_percent", "driver_name", "vehicle_name", "track_name", "place",
+    "elapsed_time", "telemetry_version"
+]
+
+
+def get_session_name(session: int) -> str:
+    """Convert session number to readable name"""
+    if session == 0:
+        return "Test"
+    elif 1 <= session <= 4:
+        return f"Practice_{session}"
+    elif 5 <= session <= 8:
+        return f"Qualifying_{session - 4}"
+    elif session == 9:
+        return "Warmup"
+    elif 10 <= session <= 13:
+        return f"Race_{session - 9}"
+    else:
+        return f"Unknown_{session}"
+
+
+class TelemetryResponse:
+    """Data structure for WebSocket response"""
+
+    __slots__ = ("driver_name", "vehicle_name", "track_name", "place", "gear", "brake", "throttle",
+                 "session", "lap_dist", "corner", "timestamp", "metadata_id", "elapsed_time", "version")
+
+    def __init__(self, driver_name: str, vehicle_name: str, track_name: str, place: int,
+                 gear: int, brake: float, throttle: float, session: int,
+                 lap_dist: Optional[float] = None, corner: Optional[int] = None,
+                 timestamp: Optional[float] = None, metadata_id: Optional[int] = None,
+                 elapsed_time: Optional[float] = None, version: Optional[int] = None):
+        self.driver_name = driver_name
+        self.vehicle_name = vehicle_name
+        self.track_name = track_name
+        self.place = place
+        self.gear = gear
+        self.brake = brake
+        self.throttle = throttle
+        self.session = session
+        self.lap_dist = lap_dist
+        self.corner = corner
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.metadata_id = metadata_id
+        self.elapsed_time = elapsed_time
+        self.version = version
+
+    def to_dict(self, full_precision: bool = False) -> Dict[str, Any]:
+        """
+        Convert to dictionary for JSON serialization.
+        Names are only sent in the sessionMetadata message matching metadataId.
+        Pedals and lap distance are quantized with their channel profile unless full_precision.
+        """
+        if full_precision:
+            brake, throttle, lap_dist = self.brake, self.throttle, self.lap_dist
+        else:
+            brake, throttle, lap_dist = PEDAL.round(self.brake), PEDAL.round(self.throttle), LAP_DIST.round(self.lap_dist)
+        return {
+            "metadataId": self.metadata_id,
+            "place": self.place,
+            "gear": self.gear,
+            "brake": brake,
+            "throttle": throttle,
+            "session": self.session,
+            "lapDist": lap_dist,
+            "corner": self.corner,
+            "elapsedTime": ELAPSED_TIME.round(self.elapsed_time),
+            "telemetryVersion": self.version
+        }
+
+    def to_json(self, full_precision: bool = False) -> str:
+        return json.dumps(self.to_dict(full_precision))
+
+    def to_bytes(self) -> bytes:
+        """Pack the numeric fields into a FRAME_STRUCT record"""
+        return FRAME_STRUCT.pack(
+            self.timestamp, _or_nan(self.elapsed_time), self.version or 0, self.session, self.place, self.gear,
+            PEDAL.code(self.brake), PEDAL.code(self.throttle),
+            _or_nan(self.lap_dist),
+            -1 if self.corner is None else self.corner,
+        )
+
+    def to_csv_row(self) -> List[Any]:
+        """Row in the CSV_HEADERS layout"""
+        return _csv_row(self.timestamp, self.session, self.gear, PEDAL.round(self.brake), PEDAL.round(self.throttle),
+                        self.driver_name, self.vehicle_name, self.track_name, self.place,
+                        _or_nan(self.elapsed_time), self.version or 0)
+
+    @classmethod
+    def from_bytes(cls, data: bytes, driver_name: str = "", vehicle_name: str = "", track_name: str = "") -> "TelemetryResponse":
+        timestamp, elapsed_time, version, session, place, gear, brake, throttle, lap_dist, corner = FRAME_STRUCT.unpack(data)
+        return cls(driver_name, vehicle_name, track_name, place, gear, PEDAL.value(brake), PEDAL.value(throttle), session,
+                   None if lap_dist != lap_dist else lap_dist, None if corner == -1 else corner, timestamp, None,
+                   None if elapsed_time != elapsed_time else elapsed_time, version)
+
+
+def record_to_frame(record, driver_name: str, vehicle_name: str, track_name: str,
+                    metadata_id: Optional[int] = None, timestamp: Optional[float] = None) -> TelemetryResponse:
+    """Frame of a FRAME_DTYPE record, stamped with timestamp (now by default) rather than the recorded one"""
+    return TelemetryResponse(
+        driver_name, vehicle_name, track_name, int(record["place"]), int(record["gear"]),
+        PEDAL.value(int(record["brake"])), PEDAL.value(int(record["throttle"])), int(record["session"]),
+        None if np.isnan(record["lap_dist"]) else round(float(record["lap_dist"]), 1),
+        None if record["corner"] == -1 else int(record["corner"]),
+        timestamp, metadata_id,
+        None if np.isnan(record["elapsed_time"]) else float(record["elapsed_time"]), int(record["version"]),
+    )
+
+
+def _or_nan(value: Optional[float]) -> float:
+    return float("nan") if value is None else value
+
+
+def _csv_row(timestamp: float, session: int, gear: int, brake: float, throttle: float,
+             driver_name: str, vehicle_name: str, track_name: str, place: int,
+             elapsed_time: float, version: int) -> List[Any]:
+    iso_timestamp = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(timestamp)) + f".{int(timestamp * 1000) % 1000:03d}Z"
+    return [iso_timestamp, session, get_session_name(session), gear, round(brake * 100, 1),
+            round(throttle * 100, 1), driver_name, vehicle_name, track_name, place,
+            "" if elapsed_time != elapsed_time else round(elapsed_time, 4), version]
+
+
+class FrameBuffer:
+    """
+    Server-side buffer of a whole session, FRAME_DTYPE.itemsize bytes per frame.
+
+    Frames are appended into preallocated NumPy chunks; driver, vehicle and track names are only
+    stored when they change, with the index of the first frame they apply to. Discrete events
+    are kept next to the frames with the index of the frame they happened at.
+    """
+
+    def __init__(self, chunk_size: int = 65536):
+        self.chunk_size = chunk_size
+        self._chunks: List[np.ndarray] = []
+        self._used = chunk_size  # fill level of the last chunk
+        self._count = 0
+        self._names: List[Tuple[int, str, str, str]] = []
+        self._events: List[Tuple[int, Dict[str, Any]]] = []
+
+    def __len__(self) -> int:
+        return self._count
+
+    @property
+    def nbytes(self) -> int:
+        return self._count * FRAME_DTYPE.itemsize
+
+    def append(self, frame: TelemetryResponse):
+        if self._used == self.chunk_size:
+            self._chunks.append(np.empty(self.chunk_size, dtype=FRAME_DTYPE))
+            self._used = 0
+        names = (frame.driver_name, frame.vehicle_name, frame.track_name)
+        if not self._names or self._names[-1][1:] != names:
+            self._names.append((self._count,) + names)
+        self._chunks[-1][self._used] = (
+            frame.timestamp, _or_nan(frame.elapsed_time), frame.version or 0, frame.session, frame.place, frame.gear,
+            PEDAL.code(frame.brake), PEDAL.code(frame.throttle),
+            _or_nan(frame.lap_dist),
+            -1 if frame.corner is None else frame.corner,
+        )
+        self._used += 1
+        self._count += 1
+
+    def add_event(self, event: Dict[str, Any]):
+        self._events.append((self._count, event))
+
+    def clear(self):
+        self._chunks = []
+        self._used = self.chunk_size
+        self._count = 0
+        self._names = []
+        self._events = []
+
+    def to_array(self) -> np.ndarray:
+        """All the buffered frames as one structured array"""
+        if not self._chunks:
+            return np.empty(0, dtype=FRAME_DTYPE)
+        return np.concatenate(self._chunks[:-1] + [self._chunks[-1][:self._used]])
+
+    def names(self) -> Iterator[Tuple[int, int, str, str, str]]:
+        """(start, end, driver, vehicle, track) ranges of frames sharing the same names"""
+        for i, (start, driver, vehicle, track) in enumerate(self._names):
+            end = self._names[i + 1][0] if i + 1 < len(self._names) else self._count
+            yield start, end, driver, vehicle, track
+
+    def to_bytes(self) -> bytes:
+        """Binary form: the raw FRAME_DTYPE records"""
+        return self.to_array().tobytes()
+
+    def write_binary(self, path: str):
+        """Write the records and a JSON sidecar with the names and events"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.to_array().tofile(path)
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({"dtype": FRAME_DTYPE.descr, "names": list(self.names()),
+                       "events": [{"frame": index, **event} for index, event in self._events]}, f)
+
+    def write_csv(self, path: str):
+        """Write the buffer in the /export-csv layout"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        frames = self.to_array()
+        with open(path, "w", newline="", encoding="utf-8") as csvfile:
+            writer = csv.writer(csvfile)
+            writer.writerow(CSV_HEADERS)
+            for start, end, driver, vehicle, track in self.names():
+                rows = frames[start:end]
+                brakes = PEDAL.decode(rows["brake"]).tolist()
+                throttles = PEDAL.decode(rows["throttle"]).tolist()
+                for row, brake, throttle in zip(rows.tolist(), brakes, throttles):
+                    timestamp, elapsed_time, version, session, place, gear = row[:6]
+                    writer.writerow(_csv_row(timestamp, session, gear, brake, throttle, driver, vehicle, track, place,
+                                             elapsed_time, version))
+
+    @classmethod
+    def read_binary(cls, path: str) -> Tuple[np.ndarray, List[Tuple[int, int, str, str, str]]]:
+        """Read back a file written by write_binary()"""
+        with open(f"{path}.json", encoding="utf-8") as f:
+            meta = json.load(f)
+        return np.fromfile(path, dtype=FRAME_DTYPE), [tuple(n) for n in meta["names"]]
@@ -0,0 +1,437 @@
+#!/usr/bin/env python3
+"""
+Laps x distance bins matrices of a channel over a session or a whole season of recordings, and
+the consistency analyses computed on them in a few vectorized passes
+
+    python lap_matrix.py export --channel time --bin-size 10 -o export/le_mans.lapm
+"""
+
+import argparse
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+import numpy as np
+
+from columnar_export import lap_numbers
+from delta import MIN_LAP_COVERAGE, MAX_FILL_DISTANCE
+from frames import FrameBuffer, FRAME_DTYPE, PEDAL
+from track_map import TrackMap, track_map_path
+
+DEFAULT_BIN_SIZE = 10.0
+# Finer bins only add noise, and the matrix grows with lap length / bin size
+MIN_BIN_SIZE = 1.0
+# time: seconds spent in the bin, speed: mean speed through the bin (m/s), the others the mean value
+CHANNELS = ("time", "speed", "brake", "throttle", "gear")
+MATRIX_EXTENSION = ".lapm"
+# Modified z-score (Iglewicz and Hoaglin) above which a lap is an outlier
+OUTLIER_THRESHOLD = 3.5
+# Bins whose spread is above this percentile of all bins form the variance hotspots
+HOTSPOT_PERCENTILE = 90.0
+
+LAP_DTYPE = np.dtype([
+    ("file", "<i4"),       # index in LapMatrix.files
+    ("driver", "<i4"),     # index in LapMatrix.drivers
+    ("lap", "<i4"),
+    ("start_et", "<f8"),   # sim clock at the line crossing that started the lap
+    ("lap_time", "<f8"),
+])
+
+
+def _bin_edges(lap_length: float, bin_size: float) -> np.ndarray:
+    """Lap distance of the bin boundaries, the last bin ends at the line"""
+    bins = int(np.ceil(lap_length / bin_size))
+    return np.minimum(np.arange(bins + 1) * bin_size, lap_length)
+
+
+def lap_rows(frames: np.ndarray, laps: np.ndarray, lap_length: float, bin_size: float,
+             channel: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Matrix rows of the complete laps of a recording and their (lap, start_et, lap_time).
+
+    The lap distance is unwrapped into one distance driven since the start of the recording, so
+    the times at every bin boundary of every lap come from a single interpolation. Laps covering
+    less than MIN_LAP_COVERAGE of the boundaries (out laps, laps cut by the recording), or with a
+    backwards jump (return to the garage), are left out.
+    """
+    edges = _bin_edges(lap_length, bin_size)
+    bins = len(edges) - 1
+    empty = np.empty((0, bins), dtype=np.float32), np.empty(0, dtype=LAP_DTYPE[["lap", "start_et", "lap_time"]])
+    et = frames["elapsed_time"]
+    dist = frames["lap_dist"].astype(np.float64)
+    known = np.isfinite(et) & np.isfinite(dist)
+    if known.sum() < 2:
+        return empty
+    et, dist, laps = et[known], np.clip(dist[known], 0.0, lap_length), laps[known]
+    order = np.argsort(et, kind="stable")
+    et, dist, laps = et[order], dist[order], laps[order]
+
+    step = np.diff(dist)
+    wrapped = step < -lap_length / 2
+    driven = dist + lap_length * np.concatenate(([0], np.cumsum(wrapped)))
+    # Backwards moves that are not a line crossing break the lap they happen in
+    broken = np.concatenate(([False], (step < -MAX_FILL_DISTANCE) & ~wrapped))
+    monotonic = np.maximum.accumulate(driven)
+    lap_index = np.floor(monotonic / lap_length).astype(np.int64)
+    first = int(lap_index[0])
+    count = int(lap_index[-1]) - first + 1
+
+    # Boundaries of every lap, shifted by the distance driven before it: (count, bins + 1)
+    targets = (np.arange(first, first + count)[:, None] * lap_length + edges[None, :]).ravel()
+    times = np.interp(targets, monotonic, et).reshape(count, bins + 1)
+    # A boundary is known when frames no further apart than MAX_FILL_DISTANCE surround it
+    right = np.searchsorted(monotonic, targets, side="left")
+    inside = (right > 0) & (right < len(monotonic))
+    gap = np.full(len(targets), np.inf)
+    gap[inside] = monotonic[right[inside]] - monotonic[right[inside] - 1]
+    exact = right < len(monotonic)
+    exact[exact] = monotonic[right[exact]] == targets[exact]
+    valid = ((gap <= MAX_FILL_DISTANCE) | exact).reshape(count, bins + 1)
+    times[~valid] = np.nan
+
+    broken_laps = np.zeros(count, dtype=bool)
+    broken_laps[lap_index[broken] - first] = True
+    complete = valid[:, 0] & valid[:, -1] & (valid.mean(axis=1) >= MIN_LAP_COVERAGE) & ~broken_laps
+    rows = np.flatnonzero(complete)
+    if not len(rows):
+        return empty
+    times = times[rows]
+
+    if channel == "time":
+        values = np.diff(times, axis=1)
+    elif channel == "speed":
+        values = np.diff(edges)[None, :] / np.diff(times, axis=1)
+    elif channel in ("brake", "throttle", "gear"):
+        raw = frames[channel][known][order]
+        samples = PEDAL.decode(raw) if channel != "gear" else raw.astype(np.float64)
+        # Mean of the frames of each (lap, bin) cell in one bincount
+        row_of_lap = np.full(count, -1)
+        row_of_lap[rows] = np.arange(len(rows))
+        cell_row = row_of_lap[lap_index - first]
+        cell_bin = np.minimum(np.searchsorted(edges, monotonic - lap_index * lap_length, side="right") - 1, bins - 1)
+        selected = cell_row >= 0
+        cells = cell_row[selected] * bins + cell_bin[selected]
+        sums = np.bincount(cells, weights=samples[selected], minlength=len(rows) * bins)
+        counts = np.bincount(cells, minlength=len(rows) * bins)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = (sums / counts).reshape(len(rows), bins)
+    else:
+        raise ValueError(f"Unknown channel {channel}, expected one of {', '.join(CHANNELS)}")
+
+    # Lap numbers of the recording, read at the middle of each unwrapped lap
+    middle = np.searchsorted(monotonic, (first + rows + 0.5) * lap_length)
+    info = np.empty(len(rows), dtype=LAP_DTYPE[["lap", "start_et", "lap_time"]])
+    info["lap"] = laps[np.minimum(middle, len(laps) - 1)]
+    info["start_et"] = times[:, 0]
+    info["lap_time"] = times[:, -1] - times[:, 0]
+    return values.astype(np.float32), info
+
+
+def find_recordings(paths: Sequence[str]) -> List[str]:
+    """Session recordings (.frames) of the given files and directories, sorted by name"""
+    recordings = []
+    for path in paths:
+        if os.path.isdir(path):
+            recordings.extend(os.path.join(path, name) for name in sorted(os.listdir(path)) if name.endswith(".frames"))
+        else:
+            recordings.append(path)
+    return recordings
+
+
+def _read_sidecar(path: str) -> Tuple[List[Tuple[int, int, str, str, str]], List[Dict[str, Any]]]:
+    """Name ranges and events of a session recording, from its JSON sidecar"""
+    with open(f"{path}.json", encoding="utf-8") as f:
+        meta = json.load(f)
+    return [tuple(n) for n in meta["names"]], meta.get("events", [])
+
+
+def _longest_lap_dist(recordings, track_name: Optional[str]) -> float:
+    """Longest lap distance recorded on a track, the lap distances memory-mapped one recording at a time"""
+    longest = np.nan
+    for path, names, _ in recordings:
+        if not os.path.getsize(path):
+            continue
+        frames = np.memmap(path, dtype=FRAME_DTYPE, mode="r")
+        for start, end, _, _, track in names:
+            if track == track_name and end > start:
+                longest = np.fmax(longest, np.nanmax(frames["lap_dist"][start:end]))
+        del frames
+    return float(longest)
+
+
+class LapMatrix:
+    """
+    One channel of many laps resampled on the same lap distance bins: values[lap, bin].
+
+    Matrices built with an output path, or opened from a file, are memory-mapped: rows are
+    written to the file recording by recording and only the bins an analysis reads are paged
+    in. The lap table (file, driver, lap number, start and lap time) is kept next to the values.
+    """
+
+    def __init__(self, values: np.ndarray, laps: np.ndarray, channel: str, bin_size: float, lap_length: float,
+                 track_name: str = "", files: Optional[List[str]] = None, drivers: Optional[List[str]] = None):
+        self.values = values
+        self.laps = laps
+        self.channel = channel
+        self.bin_size = bin_size
+        self.lap_length = lap_length
+        self.track_name = track_name
+        self.files = files or []
+        self.drivers = drivers or []
+        self.path: Optional[str] = None
+
+    def __len__(self) -> int:
+        return len(self.laps)
+
+    @property
+    def edges(self) -> np.ndarray:
+        return _bin_edges(self.lap_length, self.bin_size)
+
+    @classmethod
+    def build(cls, paths: Sequence[str], channel: str = "time", bin_size: float = DEFAULT_BIN_SIZE,
+              track_name: Optional[str] = None, lap_length: Optional[float] = None,
+              output: Optional[str] = None) -> "LapMatrix":
+        """
+        Matrix of the complete laps of the recordings (files or directories of .frames) on one
+        track, the track of the first recording by default. The lap length comes from the learnt
+        track map, else from the longest lap distance recorded.
+        """
+        if channel not in CHANNELS:
+            raise ValueError(f"Unknown channel {channel}, expected one of {', '.join(CHANNELS)}")
+        if not bin_size >= MIN_BIN_SIZE:
+            raise ValueError(f"Bin size must be at least {MIN_BIN_SIZE:g} m, got {bin_size}")
+        # Only the sidecars are read up front, the frames of one recording at a time
+        recordings = []
+        for path in find_recordings(paths):
+            names, events = _read_sidecar(path)
+            if track_name is None and names:
+                track_name = names[0][4]
+            recordings.append((path, names, events))
+        if lap_length is None:
+            try:
+                lap_length = TrackMap.load(track_map_path(track_name)).lap_length
+            except (OSError, KeyError):
+                lap_length = _longest_lap_dist(recordings, track_name)
+        if not lap_length > 0:
+            raise ValueError(f"No lap distance recorded on {track_name}")
+
+        files: List[str] = []
+        drivers: List[str] = []
+        tables: List[np.ndarray] = []
+        blocks: List[np.ndarray] = []
+        out = open(output, "wb") if output else None
+        try:
+            for path, names, events in recordings:
+                frames, _ = FrameBuffer.read_binary(path)
+                driver_names = np.array([n[2] for n in names], dtype=object)
+                laps = lap_numbers(frames, events, driver_names)
+                # Each range of frames with the same names is one driver in one car on one track
+                for start, end, driver, _, track in names:
+                    if track != track_name or end <= start:
+                        continue
+                    values, info = lap_rows(frames[start:end], laps[start:end], lap_length, bin_size, channel)
+                    if not len(info):
+                        continue
+                    if path not in files:
+                        files.append(path)
+                    if driver not in drivers:
+                        drivers.append(driver)
+                    table = np.empty(len(info), dtype=LAP_DTYPE)
+                    table["file"] = files.index(path)
+                    table["driver"] = drivers.index(driver)
+                    for name in info.dtype.names:
+                        table[name] = info[name]
+                    tables.append(table)
+                    if out is not None:
+                        values.tofile(out)
+                    else:
+                        blocks.append(values)
+        finally:
+            if out is not None:
+                out.close()
+
+        laps = np.concatenate(tables) if tables else np.empty(0, dtype=LAP_DTYPE)
+        bins = len(_bin_edges(lap_length, bin_size)) - 1
+        matrix = cls(np.empty((0, bins), dtype=np.float32), laps, channel, bin_size, lap_length,
+                     track_name or "", [os.path.basename(f) for f in files], drivers)
+        if output:
+            matrix._write_header(output)
+            return cls.open(output) if len(laps) else matrix
+        if blocks:
+            matrix.values = np.concatenate(blocks)
+        return matrix
+
+    def _write_header(self, path: str):
+        with open(f"{path}.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "channel": self.channel, "binSize": self.bin_size, "lapLength": self.lap_length,
+                "trackName": self.track_name, "files": self.files, "drivers": self.drivers,
+                "laps": {name: self.laps[name].tolist() for name in LAP_DTYPE.names},
+            }, f)
+
+    def save(self, path: str) -> str:
+        """Write the values (raw float32 rows) and a JSON sidecar with the lap table"""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        np.asarray(self.values, dtype=np.float32).tofile(path)
+        self._write_header(path)
+        return path
+
+    @classmethod
+    def open(cls, path: str) -> "LapMatrix":
+        """Memory-map a matrix written by save() or build(output=...)"""
+        with open(f"{path}.json", encoding="utf-8") as f:
+            header = json.load(f)
+        laps = np.empty(len(header["laps"]["lap"]), dtype=LAP_DTYPE)
+        for name in LAP_DTYPE.names:
+            laps[name] = header["laps"][name]
+        bins = len(_bin_edges(header["lapLength"], header["binSize"])) - 1
+        values = (np.memmap(path, dtype=np.float32, mode="r", shape=(len(laps), bins)) if len(laps)
+                  else np.empty((0, bins), dtype=np.float32))
+        matrix = cls(values, laps, header["channel"], header["binSize"], header["lapLength"],
+                     header.get("trackName", ""), header.get("files"), header.get("drivers"))
+        matrix.path = path
+        return matrix
+
+    def select(self, laps: np.ndarray) -> "LapMatrix":
+        """Matrix of a subset of the laps (mask or indices), e.g. matrix.select(matrix.laps["driver"] == 0)"""
+        rows = np.flatnonzero(laps) if np.asarray(laps).dtype == bool else np.asarray(laps)
+        return LapMatrix(np.asarray(self.values[rows]), self.laps[rows], self.channel, self.bin_size,
+                         self.lap_length, self.track_name, self.files, self.drivers)
+
+    def for_drivers(self, drivers: Sequence[str]) -> "LapMatrix":
+        """Matrix of the laps of some drivers only"""
+        indices = [i for i, driver in enumerate(self.drivers) if driver in drivers]
+        return self.select(np.isin(self.laps["driver"], indices))
+
+    def percentiles(self, q: Sequence[float] = (5, 25, 50, 75, 95)) -> np.ndarray:
+        """(len(q), bins) percentiles of every bin across the laps"""
+        with np.errstate(invalid="ignore"):
+            return np.nanpercentile(self.values, q, axis=0)
+
+    def best_theoretical(self) -> Dict[str, Any]:
+        """Sum of the best time of every bin, and the lap each best comes from (time channel)"""
+        if self.channel != "time":
+            raise ValueError("The best theoretical lap needs a matrix of the time channel")
+        if not len(self):
+            return {"lapTime": None, "bestLapTime": None, "gain": None, "laps": []}
+        values = np.where(np.isnan(self.values), np.inf, self.values)
+        best_rows = np.argmin(values, axis=0)
+        lap_time = float(values[best_rows, np.arange(values.shape[1])].sum())
+        best_lap = float(np.nanmin(self.laps["lap_time"]))
+        rows, counts = np.unique(best_rows, return_counts=True)
+        contributions = sorted(zip(counts.tolist(), rows.tolist()), reverse=True)[:10]
+        return {
+            "lapTime": round(lap_time, 3),
+            "bestLapTime": round(best_lap, 3),
+            "gain": round(best_lap - lap_time, 3),
+            # Laps that hold the most bin bests
+            "laps": [{**self.lap_info(row), "bins": count} for count, row in contributions],
+        }
+
+    def hotspots(self, count: int = 10, percentiles: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """
+        Zones of consecutive bins whose interquartile range across the laps is in the top
+        (100 - HOTSPOT_PERCENTILE) %, largest total spread first: where the laps differ the most
+        """
+        quartiles = percentiles if percentiles is not None else self.percentiles((25, 50, 75))
+        spread = quartiles[-1] - quartiles[0]
+        if not len(self) or np.isnan(spread).all():
+            return []
+        hot = spread >= np.nanpercentile(spread, HOTSPOT_PERCENTILE)
+        changes = np.diff(np.concatenate(([0], hot.astype(np.int8), [0])))
+        starts, ends = np.flatnonzero(changes == 1), np.flatnonzero(changes == -1)
+        cumulative = np.concatenate(([0.0], np.cumsum(np.nan_to_num(spread))))
+        totals = cumulative[ends] - cumulative[starts]
+        edges = self.edges
+        order = np.argsort(totals)[::-1][:count]
+        return [{
+            "start": round(float(edges[starts[i]]), 1),
+            "end": round(float(edges[ends[i]]), 1),
+            "spread": round(float(totals[i]), 4),
+            "median": round(float(np.nansum(quartiles[1][starts[i]:ends[i]])
+                                  if self.channel == "time" else np.nanmean(quartiles[1][starts[i]:ends[i]])), 4),
+        } for i in order]
+
+    def lap_scores(self, median: Optional[np.ndarray] = None) -> np.ndarray:
+        """Mean absolute robust z-score of every lap against the median lap, bin by bin"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            values = np.asarray(self.values)
+            median = median if median is not None else np.nanmedian(values, axis=0)
+            deviation = values - median
+            mad = 1.4826 * np.nanmedian(np.abs(deviation), axis=0)
+            mad[~(mad > 0)] = np.nan
+            return np.nanmean(np.abs(deviation) / mad, axis=1)
+
+    def outliers(self, threshold: float = OUTLIER_THRESHOLD, median: Optional[np.ndarray] = None) -> List[Dict[str, Any]]:
+        """Laps whose score is an outlier among the scores of all laps (modified z-score over threshold)"""
+        if len(self) < 3:
+            return []
+        scores = self.lap_scores(median)
+        center = np.nanmedian(scores)
+        mad = np.nanmedian(np.abs(scores - center))
+        if not mad > 0:
+            return []
+        z = 0.6745 * (scores - center) / mad
+        rows = np.flatnonzero(z > threshold)
+        rows = rows[np.argsort(z[rows])[::-1]]
+        return [{**self.lap_info(row), "score": round(float(scores[row]), 3), "z": round(float(z[row]), 2)}
+                for row in rows]
+
+    def lap_info(self, row: int) -> Dict[str, Any]:
+        lap = self.laps[row]
+        return {
+            "index": int(row),
+            "file": self.files[lap["file"]] if lap["file"] < len(self.files) else None,
+            "driver": self.drivers[lap["driver"]] if lap["driver"] < len(self.drivers) else None,
+            "lap": int(lap["lap"]),
+            "startET": round(float(lap["start_et"]), 3),
+            "lapTime": round(float(lap["lap_time"]), 3),
+        }
+
+    def report(self, hotspot_count: int = 10, threshold: float = OUTLIER_THRESHOLD) -> Dict[str, Any]:
+        """Consistency report: lap time spread, best theoretical lap, variance hotspots and outlier laps"""
+        start_time = time.perf_counter()
+        quartiles = self.percentiles((25, 50, 75))
+        lap_times = self.laps["lap_time"]
+        report = {
+            "channel": self.channel,
+            "trackName": self.track_name,
+            "lapLength": self.lap_length,
+            "binSize": self.bin_size,
+            "bins": int(self.values.shape[1]),
+            "laps": len(self),
+            "files": len(self.files),
+            "drivers": self.drivers,
+            "lapTimes": {
+                "best": round(float(lap_times.min()), 3),
+                "median": round(float(np.median(lap_times)), 3),
+                "std": round(float(lap_times.std()), 3),
+            } if len(self) else None,
+            "bestTheoretical": self.best_theoretical() if self.channel == "time" else None,
+            "hotspots": self.hotspots(hotspot_count, quartiles),
+            "outliers": self.outliers(threshold, quartiles[1]),
+        }
+        report["elapsed_s"] = round(time.perf_counter() - start_time, 3)
+        return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Consistency analysis of many laps on a lap distance grid")
+    parser.add_argument("paths", nargs="*", default=["export"], help="session recordings (.frames) or directories of them")
+    parser.add_argument("--channel", choices=CHANNELS, default="time")
+    parser.add_argument("--bin-size", type=float, default=DEFAULT_BIN_SIZE, help="bin length (m)")
+    parser.add_argument("--track", help="track name (the track of the first recording by default)")
+    parser.add_argument("-o", "--output", help=f"write the matrix ({MATRIX_EXTENSION}) and memory-map it")
+    parser.add_argument("--open", action="store_true", help="read an existing matrix file instead of recordings")
+    args = parser.parse_args()
+
+    if args.open:
+        matrix = LapMatrix.open(args.paths[0])
+    else:
+        matrix = LapMatrix.build(args.paths, args.channel, args.bin_size, args.track, output=args.output)
+    print(json.dumps(matrix.report(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
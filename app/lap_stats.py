@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Incremental per-lap and per-sector statistics computed from the live telemetry stream
+"""
+
+import math
+from typing import Optional, Dict, Any, List
+
+from quantization import quantizer
+
+# Pedal thresholds (0.0-1.0)
+FULL_THROTTLE_THRESHOLD = 0.98
+BRAKE_ZONE_ON_THRESHOLD = 0.10
+BRAKE_ZONE_OFF_THRESHOLD = 0.02
+
+# Lateral acceleration (m/s^2) above which the car is considered to be cornering
+CORNER_LATERAL_ACCEL = 4.0
+
+# Gaps longer than this (seconds) between two samples are not counted as driving time
+MAX_SAMPLE_GAP = 1.0
+
+NUM_SECTORS = 3
+NUM_WHEELS = 4
+
+TYRE_TEMP = quantizer("tyre_temp")
+
+
+class StatsAccumulator:
+    """Running aggregates over one lap or one sector, O(1) memory"""
+
+    __slots__ = ("samples", "duration", "max_speed", "min_corner_speed", "brake_zones",
+                 "full_throttle_time", "fuel_used", "_tyre_temp_sum")
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.samples = 0
+        self.duration = 0.0
+        self.max_speed = 0.0
+        self.min_corner_speed = math.inf
+        self.brake_zones = 0
+        self.full_throttle_time = 0.0
+        self.fuel_used = 0.0
+        self._tyre_temp_sum = [0.0] * NUM_WHEELS
+
+    def add(self, dt: float, speed: float, cornering: bool, full_throttle: bool,
+            brake_zone_started: bool, fuel_delta: float, tyre_temps: List[float]):
+        """Fold one sample into the aggregates"""
+        self.samples += 1
+        self.duration += dt
+        if speed > self.max_speed:
+            self.max_speed = speed
+        if cornering and speed < self.min_corner_speed:
+            self.min_corner_speed = speed
+        if brake_zone_started:
+            self.brake_zones += 1
+        if full_throttle:
+            self.full_throttle_time += dt
+        self.fuel_used += fuel_delta
+        for i in range(NUM_WHEELS):
+            self._tyre_temp_sum[i] += tyre_temps[i]
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        samples = self.samples or 1
+        return {
+            "samples": self.samples,
+            "duration": round(self.duration, 3),
+            "maxSpeedKmh": round(self.max_speed * 3.6, 1),
+            "minCornerSpeedKmh": round(self.min_corner_speed * 3.6, 1) if self.min_corner_speed != math.inf else None,
+            "brakeZones": self.brake_zones,
+            "fullThrottleTime": round(self.full_throttle_time, 3),
+            "fuelUsed": round(self.fuel_used, 3),
+            # Celsius, front left / front right / rear left / rear right
+            "tyreTempAvg": [round(TYRE_TEMP.round(t / samples) - 273.15, 1) for t in self._tyre_temp_sum],
+        }
+
+
+class LapStatsEngine:
+    """
+    Incremental lap statistics fed one rF2VehicleTelemetry sample at a time.
+
+    Call update() on every sampled frame; it returns a lap summary message once
+    the lap number changes, None otherwise.
+    """
+
+    def __init__(self):
+        self.lap = StatsAccumulator()
+        self.sectors = [StatsAccumulator() for _ in range(NUM_SECTORS)]
+        self.last_summary: Optional[Dict[str, Any]] = None
+        self._lap_number: Optional[int] = None
+        self._lap_start_et = 0.0
+        self._last_et: Optional[float] = None
+        self._last_fuel: Optional[float] = None
+        self._braking = False
+
+    def reset(self):
+        """Forget the lap in progress (session change, car swap...)"""
+        self.lap.reset()
+        for sector in self.sectors:
+            sector.reset()
+        self._lap_number = None
+        self._last_et = None
+        self._last_fuel = None
+        self._braking = False
+
+    def update(self, telemetry) -> Optional[Dict[str, Any]]:
+        """Consume one telemetry sample, return the lap summary when a lap completes"""
+        elapsed = telemetry.mElapsedTime
+        lap_number = telemetry.mLapNumber
+
+        # Going back in time means a new session or a restart
+        if self._last_et is not None and elapsed < self._last_et:
+            self.reset()
+
+        summary = None
+        if self._lap_number is None:
+            self._lap_number = lap_number
+            self._lap_start_et = telemetry.mLapStartET
+        elif lap_number != self._lap_number:
+            summary = self._complete_lap(telemetry.mLapStartET)
+            self._lap_number = lap_number
+            self._lap_start_et = telemetry.mLapStartET
+
+        dt = 0.0 if self._last_et is None else elapsed - self._last_et
+        if dt < 0.0 or dt > MAX_SAMPLE_GAP:
+            dt = 0.0
+        self._last_et = elapsed
+
+        # Only count fuel going down so that refuelling does not cancel consumption
+        fuel = telemetry.mFuel
+        fuel_delta = 0.0
+        if self._last_fuel is not None and fuel < self._last_fuel:
+            fuel_delta = self._last_fuel - fuel
+        self._last_fuel = fuel
+
+        vel = telemetry.mLocalVel
+        speed = math.sqrt(vel.x**2 + vel.y**2 + vel.z**2)
+        cornering = abs(telemetry.mLocalAccel.x) >= CORNER_LATERAL_ACCEL
+        full_throttle = telemetry.mFilteredThrottle >= FULL_THROTTLE_THRESHOLD
+
+        brake = telemetry.mFilteredBrake
+        brake_zone_started = False
+        if not self._braking and brake >= BRAKE_ZONE_ON_THRESHOLD:
+            self._braking = True
+            brake_zone_started = True
+        elif self._braking and brake <= BRAKE_ZONE_OFF_THRESHOLD:
+            self._braking = False
+
+        wheels = telemetry.mWheels
+        tyre_temps = [sum(wheels[i].mTemperature) / 3.0 for i in range(NUM_WHEELS)]
+
+        sample = (dt, speed, cornering, full_throttle, brake_zone_started, fuel_delta, tyre_temps)
+        self.lap.add(*sample)
+        # Sign bit of mCurrentSector flags the pit lane, the lower bits hold the zero-based sector
+        sector = telemetry.mCurrentSector & 0x7FFFFFFF
+        if 0 <= sector < NUM_SECTORS:
+            self.sectors[sector].add(*sample)
+
+        return summary
+
+    def current(self) -> Dict[str, Any]:
+        """Aggregates of the lap in progress"""
+        return {
+            "lap": self._lap_number,
+            **self.lap.to_dict(),
+            "sectors": [sector.to_dict() for sector in self.sectors],
+        }
+
+    def _complete_lap(self, next_lap_start_et: float) -> Dict[str, Any]:
+        """Build the lap summary message and start accumulating the next lap"""
+        lap_time = next_lap_start_et - self._lap_start_et
+        summary = {
+            "type": "lapStats",
+            "lap": self._lap_number,
+            "lapTime": round(lap_time, 3) if lap_time > 0.0 else None,
+            **self.lap.to_dict(),
+            "sectors": [sector.to_dict() for sector in self.sectors],
+        }
+        self.last_summary = summary
+        self.lap.reset()
+        for sector in self.sectors:
+            sector.reset()
+        return summary
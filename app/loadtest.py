@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Client swarm load test of the WebSocket server: ramps up local clients against the server replaying
+a session recording, and measures latency, throughput, dropped frames and the server CPU/RSS
+
+    python loadtest.py run export/session_Hugo_Le_Mans_20250811_231630.frames --clients 10,100,500,1000 -o report.json
+    python loadtest.py compare baseline.json report.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+import psutil
+import websockets
+
+from frames import FrameBuffer
+
+REPORT_VERSION = 1
+DEFAULT_STEPS = [10, 50, 100, 250, 500, 1000]
+DEFAULT_DURATION = 15.0
+DEFAULT_PORT = 8765
+# Connections opened at once by a worker, and time given per client to connect before measuring
+CONNECT_CONCURRENCY = 100
+CONNECT_TIME_PER_CLIENT = 0.005
+MIN_CONNECT_TIME = 3.0
+STATS_TIMEOUT = 5.0
+SERVER_START_TIMEOUT = 15.0
+# RSS sampling period during a step
+MONITOR_INTERVAL = 0.5
+
+
+async def run_client(url: str, rate: float, measure_start: float, measure_end: float,
+                     result: Dict[str, Any], semaphore: asyncio.Semaphore):
+    """
+    One dashboard-like client at rate Hz, subscribed to the telemetry and the latency probes.
+    The latency of a frame is its receipt time minus the read time of its telemetry update, which
+    the probe just before it carries (client and server share the clock of this machine).
+    """
+    try:
+        async with semaphore:
+            websocket = await websockets.connect(url, max_size=None, open_timeout=30)
+        result["connected"] += 1
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        result["failed"] += 1
+        return
+    try:
+        await websocket.send(json.dumps({"type": "subscribe", "topics": ["telemetry", "probe"]}))
+        await websocket.send(json.dumps({"type": "setRate", "rate": rate}))
+        probe_version, probe_read_at = None, 0.0
+        while True:
+            timeout = measure_end - time.time()
+            if timeout <= 0:
+                break
+            try:
+                message = await asyncio.wait_for(websocket.recv(), timeout)
+            except asyncio.TimeoutError:
+                break
+            now = time.time()
+            if now < measure_start:
+                continue
+            data = json.loads(message)
+            if data.get("type") == "probe":
+                probe_version, probe_read_at = data["telemetryVersion"], data["readAt"]
+            elif "telemetryVersion" in data:
+                result["frames"] += 1
+                result["bytes"] += len(message)
+                if data["telemetryVersion"] == probe_version:
+                    result["latencies"].append(now - probe_read_at)
+
+        # Server-side delivery counters of this client
+        await websocket.send(json.dumps({"type": "getStats"}))
+        deadline = time.time() + STATS_TIMEOUT
+        while time.time() < deadline:
+            data = json.loads(await asyncio.wait_for(websocket.recv(), deadline - time.time()))
+            if data.get("type") == "clientStats":
+                result["stats"].append(data)
+                break
+    except (OSError, asyncio.TimeoutError, websockets.exceptions.WebSocketException):
+        result["errors"] += 1
+    finally:
+        await websocket.close()
+
+
+async def run_swarm(url: str, count: int, rate: float, measure_start: float, measure_end: float) -> Dict[str, Any]:
+    result = {"connected": 0, "failed": 0, "errors": 0, "frames": 0, "bytes": 0, "latencies": [], "stats": []}
+    semaphore = asyncio.Semaphore(CONNECT_CONCURRENCY)
+    await asyncio.gather(*(run_client(url, rate, measure_start, measure_end, result, semaphore) for _ in range(count)))
+    return result
+
+
+def swarm_worker(url: str, count: int, rate: float, measure_start: float, measure_end: float) -> Dict[str, Any]:
+    """Process pool entry point: count clients in this process"""
+    raise_open_files_limit()
+    return asyncio.run(run_swarm(url, count, rate, measure_start, measure_end))
+
+
+def raise_open_files_limit():
+    """Thousands of sockets need more than the usual 1024 file descriptors"""
+    try:
+        import resource
+    except ImportError:  # Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft != resource.RLIM_INFINITY and (hard == resource.RLIM_INFINITY or soft < hard):
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+
+def _percentiles(values: np.ndarray) -> Dict[str, Optional[float]]:
+    if not len(values):
+        return {"samples": 0, "mean": None, "p50": None, "p95": None, "p99": None, "max": None}
+    p50, p95, p99 = np.percentile(values, [50, 95, 99])
+    return {"samples": int(len(values)), "mean": round(float(values.mean()), 3), "p50": round(float(p50), 3),
+            "p95": round(float(p95), 3), "p99": round(float(p99), 3), "max": round(float(values.max()), 3)}
+
+
+class LoadTest:
+    """Runs the ramp steps against one server and builds the report"""
+
+    def __init__(self, url: str, rate: float, duration: float, workers: int,
+                 server: Optional[psutil.Process] = None, source_rate: Optional[float] = None):
+        self.url = url
+        self.rate = rate
+        self.duration = duration
+        self.workers = workers
+        self.server = server
+        self.source_rate = source_rate
+
+    def run_step(self, clients: int) -> Dict[str, Any]:
+        workers = max(1, min(self.workers, clients))
+        shares = [clients // workers + (1 if i < clients % workers else 0) for i in range(workers)]
+        measure_start = time.time() + max(MIN_CONNECT_TIME, clients * CONNECT_TIME_PER_CLIENT)
+        measure_end = measure_start + self.duration
+
+        with ProcessPoolExecutor(workers) as pool:
+            futures = [pool.submit(swarm_worker, self.url, share, self.rate, measure_start, measure_end)
+                       for share in shares]
+            server = self._monitor(measure_start, measure_end)
+            results = [future.result() for future in futures]
+
+        connected = sum(r["connected"] for r in results)
+        frames = sum(r["frames"] for r in results)
+        latencies = np.concatenate([np.asarray(r["latencies"]) for r in results]) * 1000.0
+        stats = [s for r in results for s in r["stats"]]
+        # A client gets at most one frame per tick, and no more than the source produces
+        per_client_rate = min(self.rate, self.source_rate) if self.source_rate else self.rate
+        expected = int(connected * per_client_rate * self.duration)
+        dropped = max(0, expected - frames)
+        server.update({
+            "coalesced": sum(s["coalesced"] for s in stats),
+            "queueDropped": sum(s["dropped"] for s in stats),
+            "skippedTicks": sum(s["skippedTicks"] for s in stats),
+            "slowdowns": sum(s["slowdowns"] for s in stats),
+            "behindClients": sum(1 for s in stats if s["behind"]),
+        })
+        return {
+            "clients": clients,
+            "connected": connected,
+            "failed": sum(r["failed"] for r in results),
+            "errors": sum(r["errors"] for r in results),
+            "durationS": self.duration,
+            "latencyMs": _percentiles(latencies),
+            "throughput": {
+                "framesPerS": round(frames / self.duration, 1),
+                "bytesPerS": round(sum(r["bytes"] for r in results) / self.duration),
+                "framesPerClientPerS": round(frames / self.duration / connected, 2) if connected else None,
+            },
+            "frames": {"expected": expected, "received": frames, "dropped": dropped,
+                       "droppedRatio": round(dropped / expected, 4) if expected else None},
+            "server": server,
+        }
+
+    def _monitor(self, measure_start: float, measure_end: float) -> Dict[str, Any]:
+        """Server CPU (average over the measurement window) and RSS (last and peak)"""
+        if self.server is None:
+            time.sleep(max(0.0, measure_end - time.time()))
+            return {"cpuPercent": None, "rssMb": None, "rssMbMax": None}
+        time.sleep(max(0.0, measure_start - time.time()))
+        self.server.cpu_percent(None)
+        rss_max = rss = self.server.memory_info().rss
+        while time.time() < measure_end:
+            time.sleep(min(MONITOR_INTERVAL, max(0.0, measure_end - time.time())))
+            rss = self.server.memory_info().rss
+            rss_max = max(rss_max, rss)
+        return {"cpuPercent": round(self.server.cpu_percent(None), 1),
+                "rssMb": round(rss / 2**20, 1), "rssMbMax": round(rss_max / 2**20, 1)}
+
+
+def start_server(recording: str, port: int, speed: float, log_path: Optional[str]) -> subprocess.Popen:
+    """Launch websocket_server.py on the replay of a recording and wait until it accepts connections"""
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "websocket_server.py", "--host", "127.0.0.1", "--port", str(port),
+         "--replay", os.path.abspath(recording), "--replay-speed", str(speed)],
+        cwd=os.path.dirname(os.path.abspath(__file__)), stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            asyncio.run(_ping(f"ws://127.0.0.1:{port}/ws"))
+            return process
+        except (OSError, websockets.exceptions.WebSocketException):
+            time.sleep(0.2)
+    process.terminate()
+    raise RuntimeError("Server did not start in time")
+
+
+async def _ping(url: str):
+    async with websockets.connect(url, open_timeout=2):
+        pass
+
+
+def source_rate(recording: str) -> Optional[float]:
+    """Frames per second of a recording"""
+    frames, _ = FrameBuffer.read_binary(recording)
+    span = float(frames["timestamp"][-1] - frames["timestamp"][0]) if len(frames) > 1 else 0.0
+    return (len(frames) - 1) / span if span > 0 else None
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def format_step(step: Dict[str, Any]) -> str:
+    latency, server = step["latencyMs"], step["server"]
+    return (f"{step['clients']:>6} clients ({step['connected']} connected, {step['failed']} failed): "
+            f"latency p50 {latency['p50']} ms, p95 {latency['p95']} ms, p99 {latency['p99']} ms, "
+            f"{step['throughput']['framesPerS']} frames/s, dropped {step['frames']['droppedRatio']}, "
+            f"server CPU {server['cpuPercent']} %, RSS {server['rssMb']} MB")
+
+
+def run(args: argparse.Namespace) -> Dict[str, Any]:
+    raise_open_files_limit()
+    process = None
+    if args.url:
+        url = args.url
+        server = psutil.Process(args.server_pid) if args.server_pid else None
+    else:
+        process = start_server(args.recording, args.port, args.speed, args.server_log)
+        url = f"ws://127.0.0.1:{args.port}/ws"
+        server = psutil.Process(process.pid)
+    rate = source_rate(args.recording) if args.recording else None
+    if rate:
+        rate *= args.speed
+
+    test = LoadTest(url, args.rate, args.duration, args.workers, server, rate)
+    report = {
+        "reportVersion": REPORT_VERSION,
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpuCount": os.cpu_count(),
+        "recording": os.path.basename(args.recording) if args.recording else None,
+        "sourceRate": round(rate, 2) if rate else None,
+        "settings": {"url": url, "rate": args.rate, "durationS": args.duration, "workers": args.workers,
+                     "speed": args.speed},
+        "steps": [],
+    }
+    try:
+        for clients in args.clients:
+            step = test.run_step(clients)
+            report["steps"].append(step)
+            print(format_step(step), flush=True)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    return report
+
+
+def compare(old: Dict[str, Any], new: Dict[str, Any]):
+    """Print the metrics of two reports side by side for the client counts they share"""
+    print(f"old: {old.get('commit')} {old.get('createdAt')}   new: {new.get('commit')} {new.get('createdAt')}")
+    metrics = [
+        ("p50 ms", lambda s: s["latencyMs"]["p50"]),
+        ("p95 ms", lambda s: s["latencyMs"]["p95"]),
+        ("p99 ms", lambda s: s["latencyMs"]["p99"]),
+        ("frames/s", lambda s: s["throughput"]["framesPerS"]),
+        ("dropped", lambda s: s["frames"]["droppedRatio"]),
+        ("CPU %", lambda s: s["server"]["cpuPercent"]),
+        ("RSS MB", lambda s: s["server"]["rssMb"]),
+    ]
+    old_steps = {s["clients"]: s for s in old["steps"]}
+    for step in new["steps"]:
+        before = old_steps.get(step["clients"])
+        if before is None:
+            continue
+        print(f"{step['clients']} clients")
+        for name, value in metrics:
+            a, b = value(before), value(step)
+            change = f"{(b - a) / a * 100:+.1f} %" if a and b is not None else ""
+            print(f"  {name:<10} {str(a):>12} -> {str(b):<12} {change}")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="WebSocket server load test")
+    commands = parser.add_subparsers(dest="command", required=True)
+    run_parser = commands.add_parser("run", help="ramp up clients and write a report")
+    run_parser.add_argument("recording", nargs="?", help="session recording (.frames) replayed by the server")
+    run_parser.add_argument("--clients", default=",".join(map(str, DEFAULT_STEPS)),
+                            type=lambda value: [int(v) for v in value.split(",")], help="client counts of the ramp steps")
+    run_parser.add_argument("--rate", type=float, default=10.0, help="rate (Hz) requested by each client")
+    run_parser.add_argument("--duration", type=float, default=DEFAULT_DURATION, help="measurement time per step (s)")
+    run_parser.add_argument("--workers", type=int, default=max(1, min((os.cpu_count() or 2) - 1, 8)),
+                            help="client processes")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    run_parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="port of the launched server")
+    run_parser.add_argument("--server-log", help="file receiving the output of the launched server")
+    run_parser.add_argument("--url", help="test an already running server instead of launching one")
+    run_parser.add_argument("--server-pid", type=int, help="PID of that server, for its CPU and RSS")
+    run_parser.add_argument("-o", "--output", default="loadtest_report.json", help="report file")
+    compare_parser = commands.add_parser("compare", help="compare two reports")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    args = parser.parse_args()
+    if args.command == "run" and not args.recording and not args.url:
+        parser.error("a recording to replay or the --url of a running server is required")
+    return args
+
+
+def main():
+    args = parse_args()
+    if args.command == "compare":
+        with open(args.old, encoding="utf-8") as f:
+            old = json.load(f)
+        with open(args.new, encoding="utf-8") as f:
+            new = json.load(f)
+        compare(old, new)
+        return
+    report = run(args)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
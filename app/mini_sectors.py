@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Mini-sector timing of every car, computed incrementally from mLapDist at each scoring update
+"""
+
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from rF2data import rFactor2Constants
+from struct_views import field_view
+
+DEFAULT_MINI_SECTORS = 100
+
+MAX_VEHICLES = rFactor2Constants.MAX_MAPPED_VEHICLES
+
+
+class MiniSectorEngine:
+    """
+    Splits the lap into count equal mini-sectors and times every car through them.
+
+    At each scoring update the mLapDist of all the slots is compared with the previous one in one
+    vectorized pass; every mini-sector boundary crossed since then gets a crossing time linearly
+    interpolated between the two updates (several boundaries can be crossed between two 5 Hz
+    updates). Last and best times live in preallocated (vehicles, count) arrays indexed by slot,
+    and poll() only returns the cells that changed.
+    """
+
+    def __init__(self, sim_info, count: int = DEFAULT_MINI_SECTORS):
+        self.sim_info = sim_info
+        self.count = count
+        vehicles = sim_info.Rf2Scor.mVehicles
+        self._ids = field_view(vehicles, "mID")
+        self._lap_dist = field_view(vehicles, "mLapDist")
+        self._version: Optional[int] = None
+        self.lap_length = 0.0
+
+        self.last = np.full((MAX_VEHICLES, count), np.nan)
+        self.best = np.full((MAX_VEHICLES, count), np.nan)
+        self.session_best = np.full(count, np.nan)
+        self._vehicle_ids = np.full(MAX_VEHICLES, -1, dtype=np.int32)
+        self._prev_dist = np.full(MAX_VEHICLES, np.nan)
+        self._prev_et = np.nan
+        # Sim time at which each car entered its current mini-sector, NaN until a boundary was crossed
+        self._sector_start = np.full(MAX_VEHICLES, np.nan)
+
+    def reset(self):
+        self.last.fill(np.nan)
+        self.best.fill(np.nan)
+        self.session_best.fill(np.nan)
+        self._vehicle_ids.fill(-1)
+        self._prev_dist.fill(np.nan)
+        self._sector_start.fill(np.nan)
+        self._prev_et = np.nan
+
+    def poll(self) -> Optional[Dict[str, Any]]:
+        """miniSectors message with the cells completed since the previous scoring update, if any"""
+        scoring = self.sim_info.Rf2Scor
+        if scoring.mVersionUpdateEnd == self._version:
+            return None
+        self._version = scoring.mVersionUpdateEnd
+        info = scoring.mScoringInfo
+        et = info.mCurrentET
+        if info.mLapDist <= 0:
+            return None
+        if info.mLapDist != self.lap_length or et < self._prev_et:
+            # New track or session restart
+            self.lap_length = info.mLapDist
+            self.reset()
+
+        n = max(0, min(info.mNumVehicles, MAX_VEHICLES))
+        ids = self._ids[:n]
+        dist = self._lap_dist[:n].astype(np.float64)
+        # Negative before the first crossing of the line at the start of a session
+        dist[dist < 0] = np.nan
+        reused = self._vehicle_ids[:n] != ids
+        if reused.any():
+            self._reset_slots(np.flatnonzero(reused))
+            self._vehicle_ids[:n] = ids
+
+        message = self._cross(n, dist, et)
+        self._prev_dist[:n] = dist
+        self._prev_et = et
+        return message
+
+    def _reset_slots(self, slots: np.ndarray):
+        self.last[slots] = np.nan
+        self.best[slots] = np.nan
+        self._prev_dist[slots] = np.nan
+        self._sector_start[slots] = np.nan
+
+    def _cross(self, n: int, dist: np.ndarray, et: float) -> Optional[Dict[str, Any]]:
+        length = self.lap_length
+        size = length / self.count
+        prev_dist = self._prev_dist[:n]
+        # Unwrap the distance of the cars that crossed the line since the previous update
+        travelled = dist - prev_dist
+        travelled[travelled < -length / 2] += length
+        known = ~np.isnan(travelled)
+        start = np.where(known, prev_dist, 0.0)
+        prev_sector = np.floor(start / size).astype(np.int64)
+        crossed = np.floor((start + np.where(known, travelled, 0.0)) / size).astype(np.int64) - prev_sector
+        # Cars moving backwards or teleported (garage, pit box) restart their timing
+        jumped = known & ((travelled < 0) | (crossed > self.count // 2))
+        self._sector_start[:n][jumped] = np.nan
+        crossed[~known | jumped | (et <= self._prev_et)] = 0
+
+        slots = np.flatnonzero(crossed)
+        if not len(slots):
+            return None
+        counts = crossed[slots]
+        slot = np.repeat(slots, counts)
+        step = np.arange(len(slot)) - np.repeat(np.cumsum(counts) - counts, counts)
+        boundary = prev_sector[slot] + 1 + step
+        # Crossing times interpolated between the two updates
+        fraction = (boundary * size - prev_dist[slot]) / travelled[slot]
+        cross_et = self._prev_et + fraction * (et - self._prev_et)
+        # Each mini-sector starts at the previous crossing of the same car
+        start_et = np.empty_like(cross_et)
+        first = step == 0
+        start_et[first] = self._sector_start[slots]
+        start_et[~first] = cross_et[np.flatnonzero(~first) - 1]
+        self._sector_start[slots] = cross_et[np.cumsum(counts) - 1]
+
+        timed = ~np.isnan(start_et)
+        slot, sector, times = slot[timed], (boundary[timed] - 1) % self.count, (cross_et - start_et)[timed]
+        if not len(slot):
+            return None
+        self.last[slot, sector] = times
+        personal_best = ~(self.best[slot, sector] <= times)
+        self.best[slot[personal_best], sector[personal_best]] = times[personal_best]
+        session_best = np.zeros(len(slot), dtype=bool)
+        for i in np.flatnonzero(personal_best):
+            if not self.session_best[sector[i]] <= times[i]:
+                self.session_best[sector[i]] = times[i]
+                session_best[i] = True
+        return {
+            "type": "miniSectors",
+            "et": round(et, 3),
+            "count": self.count,
+            "vehicleIds": self._vehicle_ids[slot].tolist(),
+            "sectors": sector.tolist(),
+            "times": np.round(times, 3).tolist(),
+            "personalBest": personal_best.tolist(),
+            "sessionBest": session_best.tolist(),
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Full last/best tables of the cars on track (null for the mini-sectors not timed yet)"""
+        n = max(0, min(self.sim_info.Rf2Scor.mScoringInfo.mNumVehicles, MAX_VEHICLES))
+        return {
+            "type": "miniSectorTable",
+            "count": self.count,
+            "lapLength": self.lap_length,
+            "vehicleIds": self._vehicle_ids[:n].tolist(),
+            "last": _to_json(self.last[:n]),
+            "best": _to_json(self.best[:n]),
+            "sessionBest": _to_json(self.session_best),
+        }
+
+
+def _to_json(values: np.ndarray) -> List[Any]:
+    rounded = np.round(values, 3).astype(object)
+    rounded[np.isnan(values)] = None
+    return rounded.tolist()
@@ -0,0 +1,157 @@
+#!/usr/bin/env python3
+"""
+On-demand statistical profiler for the running servers: samples the Python stacks of every thread
+for a bounded time and aggregates them as collapsed stacks (flamegraph.pl, speedscope, inferno)
+"""
+
+import asyncio
+import math
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from typing import Optional, Dict, Any, List, Tuple
+
+PROFILE_DIR = "profiles"
+DEFAULT_INTERVAL = 0.01
+MIN_INTERVAL = 0.001
+MAX_DURATION = 300.0
+# Leaf functions of threads waiting for work (event loop selector, idle executor workers)
+IDLE_LEAVES = {("select", "selectors.py"), ("wait", "threading.py"), ("get", "queue.py")}
+
+# One profiling session at a time per process
+_active: Optional["StackSampler"] = None
+
+
+class StackSampler:
+    """
+    Samples sys._current_frames() from a background thread every interval seconds.
+
+    Nothing is installed in the profiled code: no trace or profile hook, and the sampler thread
+    only exists while a session runs, so profiling costs nothing when it is off. While it runs
+    the cost is one stack walk per thread per sample (measured in overhead).
+    """
+
+    def __init__(self, interval: float = DEFAULT_INTERVAL, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples = 0
+        self.started_at = 0.0
+        self.elapsed = 0.0
+        self.sampling_time = 0.0
+        self._labels: Dict[Any, str] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, duration: float):
+        self.started_at = time.time()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(duration,), name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _run(self, duration: float):
+        own = threading.get_ident()
+        start = time.perf_counter()
+        deadline = start + duration
+        while not self._stop.is_set():
+            tick = time.perf_counter()
+            if tick >= deadline:
+                break
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident != own:
+                    self._sample(names.get(ident, str(ident)), frame)
+            self.samples += 1
+            self.sampling_time += time.perf_counter() - tick
+            self._stop.wait(max(0.0, tick + self.interval - time.perf_counter()))
+        self.elapsed = time.perf_counter() - start
+
+    def _sample(self, thread_name: str, frame):
+        codes = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            frame = frame.f_back
+        if not codes:
+            return
+        leaf = codes[0]
+        if not self.include_idle and (leaf.co_name, os.path.basename(leaf.co_filename)) in IDLE_LEAVES:
+            return
+        # Code objects are hashable: labels are only formatted once per distinct function
+        self.stacks[(thread_name,) + tuple(reversed(codes))] += 1
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            label = f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+            self._labels[code] = label
+        return label
+
+    def collapsed(self) -> str:
+        """One "thread;outer;...;leaf count" line per distinct stack"""
+        lines = []
+        for (thread_name, *codes), count in self.stacks.most_common():
+            lines.append(";".join([thread_name] + [self._label(code) for code in codes]) + f" {count}")
+        return "\n".join(lines) + "\n" if lines else ""
+
+    def top(self, count: int = 15) -> List[Tuple[str, int]]:
+        """Functions with the most samples at the top of the stack (self time)"""
+        leaves: Counter = Counter()
+        for stack, samples in self.stacks.items():
+            leaves[self._label(stack[-1])] += samples
+        return leaves.most_common(count)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "startedAt": self.started_at,
+            "duration": round(self.elapsed, 3),
+            "interval": self.interval,
+            "samples": self.samples,
+            "stacks": len(self.stacks),
+            "stackSamples": sum(self.stacks.values()),
+            # Share of the wall time the sampler held the interpreter
+            "overheadPercent": round(100.0 * self.sampling_time / self.elapsed, 2) if self.elapsed else None,
+            "top": [{"function": name, "samples": samples} for name, samples in self.top()],
+        }
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.collapsed())
+        return path
+
+
+async def run_profile(seconds: float, interval: float = DEFAULT_INTERVAL, include_idle: bool = False) -> StackSampler:
+    """Profile the process for seconds without blocking the event loop; one session at a time"""
+    global _active
+    if not (math.isfinite(seconds) and 0 < seconds <= MAX_DURATION):
+        raise ValueError(f"Profiling duration must be between 0 and {MAX_DURATION:g} seconds")
+    if not (math.isfinite(interval) and interval >= MIN_INTERVAL):
+        raise ValueError(f"Sampling interval must be at least {MIN_INTERVAL * 1000:g} ms")
+    if _active is not None:
+        raise RuntimeError("A profiling session is already running")
+    sampler = StackSampler(interval, include_idle)
+    _active = sampler
+    try:
+        sampler.start(seconds)
+        while sampler.running:
+            await asyncio.sleep(min(0.1, seconds))
+    finally:
+        sampler.stop()
+        _active = None
+    return sampler
+
+
+def profile_path(name: str, directory: str = PROFILE_DIR) -> str:
+    """Collapsed stacks file of a session, e.g. profiles/api_20250811_231630.folded"""
+    return os.path.join(directory, f"{name}_{time.strftime('%Y%m%d_%H%M%S')}.folded")
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Per-channel quantization profiles shared by the WebSocket payloads, the exports and the recorder
+"""
+
+import math
+from typing import Optional, Dict
+
+import numpy as np
+
+
+class Quantizer:
+    """
+    Maps a float channel to a narrower storage type and back.
+
+    Integer types store round((value - offset) / scale); the decoding error is bounded by
+    scale / 2 inside [minimum, maximum] and values outside are clamped. Signed types reserve their
+    smallest code for NaN. Float types are a plain cast (float32 keeps 24 significant bits).
+    """
+
+    __slots__ = ("dtype", "scale", "offset", "decimals", "_low", "_high", "_nan_code")
+
+    def __init__(self, dtype, scale: Optional[float] = None, offset: float = 0.0):
+        self.dtype = np.dtype(dtype)
+        self.scale = scale
+        self.offset = offset
+        self._nan_code = None
+        if self.dtype.kind in "iu":
+            if scale is None:
+                raise ValueError(f"Integer quantization to {self.dtype} needs a scale")
+            info = np.iinfo(self.dtype)
+            self._low, self._high = info.min, info.max
+            if self.dtype.kind == "i":
+                self._nan_code = info.min
+                self._low += 1
+            # Enough decimals for the JSON value to keep the quantization step
+            self.decimals = max(0, math.ceil(-math.log10(scale)))
+        else:
+            self._low = self._high = None
+            self.decimals = None
+
+    @property
+    def minimum(self) -> Optional[float]:
+        return None if self.scale is None else self._low * self.scale + self.offset
+
+    @property
+    def maximum(self) -> Optional[float]:
+        return None if self.scale is None else self._high * self.scale + self.offset
+
+    @property
+    def max_error(self) -> float:
+        """Bound of the absolute (integer types) or relative (float types) error"""
+        if self.scale is not None:
+            return self.scale / 2
+        return float(np.finfo(self.dtype).eps) / 2
+
+    def encode(self, values: np.ndarray) -> np.ndarray:
+        """Stored representation of an array of values"""
+        if self.scale is None:
+            return np.asarray(values).astype(self.dtype)
+        scaled = (np.asarray(values, dtype=np.float64) - self.offset) / self.scale
+        nan = np.isnan(scaled)
+        codes = np.clip(np.rint(np.where(nan, 0.0, scaled)), self._low, self._high).astype(self.dtype)
+        if self._nan_code is not None:
+            codes[nan] = self._nan_code
+        return codes
+
+    def decode(self, codes: np.ndarray) -> np.ndarray:
+        """Float64 values of a stored array"""
+        if self.scale is None:
+            return np.asarray(codes).astype(np.float64)
+        values = codes.astype(np.float64) * self.scale + self.offset
+        if self._nan_code is not None:
+            values[codes == self._nan_code] = np.nan
+        return values
+
+    def code(self, value: float) -> int:
+        """Stored integer of one value (integer types only)"""
+        if value != value:
+            return 0 if self._nan_code is None else self._nan_code
+        return min(max(round((value - self.offset) / self.scale), self._low), self._high)
+
+    def value(self, code: int) -> float:
+        """Inverse of code()"""
+        if code == self._nan_code:
+            return float("nan")
+        return code * self.scale + self.offset
+
+    def round(self, value: Optional[float]) -> Optional[float]:
+        """Value as sent in JSON: quantized, then printed with no more digits than the precision needs"""
+        if value is None or value != value:
+            return value
+        if self.scale is not None:
+            return round(self.value(self.code(value)), self.decimals)
+        if self.dtype.itemsize == 4:
+            return float(f"{value:.7g}")
+        return value
+
+
+PROFILES: Dict[str, Quantizer] = {
+    # Pedals and clutch 0..1 in 255 steps, error <= 0.002
+    "pedal": Quantizer("u1", scale=1 / 255),
+    # Steering -1..1, error <= 0.000015
+    "steering": Quantizer("<i2", scale=1 / 32767),
+    # Temperatures by 0.1 K steps up to 3276 K (or °C), error <= 0.05 K
+    "temperature": Quantizer("<i2", scale=0.1),
+    # Speeds, positions and distances in float32: ~1 mm on a 10 km track
+    "speed": Quantizer("<f4"),
+    "position": Quantizer("<f4"),
+    "distance": Quantizer("<f4"),
+    # Gears -1..n, fractional gears of interpolated grids are rounded
+    "gear": Quantizer("i1", scale=1),
+    # Elapsed time stays float64 (24 h races, time index)
+    "time": Quantizer("<f8"),
+    "full": Quantizer("<f8"),
+}
+
+# Channel name -> profile
+CHANNEL_PROFILES = {
+    "elapsed_time": "time",
+    "throttle": "pedal",
+    "brake": "pedal",
+    "clutch": "pedal",
+    "steering": "steering",
+    "pos_x": "position",
+    "pos_y": "position",
+    "pos_z": "position",
+    "vel_x": "speed",
+    "vel_y": "speed",
+    "vel_z": "speed",
+    "lap_dist": "distance",
+    "lap_time": "time",
+    "speed": "speed",
+    "gear": "gear",
+    "tyre_temp": "temperature",
+    "brake_temp": "temperature",
+}
+
+
+def quantizer(channel: str, full_precision: bool = False) -> Quantizer:
+    """Quantizer of a channel, float64 for unknown channels or at full precision"""
+    if full_precision:
+        return PROFILES["full"]
+    return PROFILES[CHANNEL_PROFILES.get(channel, "full")]
@@ -700,39 +700,92 @@ class rF2WeatherControl(ctypes.Structure):
         ('mWeatherInfo', rF2WeatherControlInfo),
     ]
 class SubscribedBuffer(Enum):
-        Telemetry = 1,
-        Scoring = 2,
-        Rules = 4,
-        MultiRules = 8,
-        ForceFeedback = 16,
-        Graphics = 32,
-        PitInfo = 64,
-        Weather = 128,
+        Telemetry = 1
+        Scoring = 2
+        Rules = 4
+        MultiRules = 8
+        ForceFeedback = 16
+        Graphics = 32
+        PitInfo = 64
+        Weather = 128
         All = 255
 
+class BufferUnsubscribedError(RuntimeError):
+    """A buffer needed by SimInfo is disabled in the plugin UnsubscribedBuffersMask"""
+
+# Buffers SimInfo can map: subscription bit -> (structure, shared memory name)
+MAPPED_BUFFERS = {
+    SubscribedBuffer.Telemetry.value: (rF2Telemetry, "$rFactor2SMMP_Telemetry$"),
+    SubscribedBuffer.Scoring.value: (rF2Scoring, "$rFactor2SMMP_Scoring$"),
+}
+
+def subscription_mask(buffers) -> int:
+    """Mask of a SubscribedBuffer, a list of them or an int mask"""
+    if isinstance(buffers, SubscribedBuffer):
+        return buffers.value
+    if isinstance(buffers, int):
+        return buffers
+    mask = 0
+    for buffer in buffers:
+        mask |= buffer.value
+    return mask
+
 class SimInfo:
-    def __init__(self):
-        self._rf2_tele = None
-        self._rf2_scor = None
+    """
+    Mapped rF2 buffers.
+
+    Only the buffers of the subscription mask are mapped, on first access; the others read as None.
+    Extended is always mapped: it holds the plugin's UnsubscribedBuffersMask, checked at creation
+    so that a tool fails fast when a buffer it needs is disabled.
+    """
+    def __init__(self, subscribed=SubscribedBuffer.All):
+        self._maps = {}
+        self._buffers = {}
         self._rf2_ext = None
-        self.Rf2Tele = None
-        self.Rf2Scor = None
         self.Rf2Ext = None
+        self.subscribed = subscription_mask(subscribed)
 
-
-        self._rf2_tele = mmap.mmap(0, ctypes.sizeof(rF2Telemetry), "$rFactor2SMMP_Telemetry$")
-        self.Rf2Tele = rF2Telemetry.from_buffer(self._rf2_tele)
-        self._rf2_scor = mmap.mmap(0, ctypes.sizeof(rF2Scoring), "$rFactor2SMMP_Scoring$")
-        self.Rf2Scor = rF2Scoring.from_buffer(self._rf2_scor)
         self._rf2_ext = mmap.mmap(0, ctypes.sizeof(rF2Extended), "$rFactor2SMMP_Extended$")
         self.Rf2Ext = rF2Extended.from_buffer(self._rf2_ext)
+        self.check_subscriptions()
+
+    def check_subscriptions(self):
+        """Raise BufferUnsubscribedError if a subscribed buffer is disabled by the plugin"""
+        mappable = sum(MAPPED_BUFFERS)
+        disabled = self.subscribed & mappable & self.Rf2Ext.mUnsubscribedBuffersMask
+        if disabled:
+            names = [buffer.name for buffer in SubscribedBuffer if buffer.value & disabled and buffer.value in MAPPED_BUFFERS]
+            raise BufferUnsubscribedError(f"Buffers disabled by the plugin UnsubscribedBuffersMask: {', '.join(names)}")
+
+    def _buffer(self, bit):
+        if not self.subscribed & bit:
+            return None
+        buffer = self._buffers.get(bit)
+        if buffer is None:
+            struct_type, name = MAPPED_BUFFERS[bit]
+            self._maps[bit] = mmap.mmap(0, ctypes.sizeof(struct_type), name)
+            buffer = self._buffers[bit] = struct_type.from_buffer(self._maps[bit])
+        return buffer
+
+    @property
+    def Rf2Tele(self):
+        return self._buffer(SubscribedBuffer.Telemetry.value)
+
+    @property
+    def Rf2Scor(self):
+        return self._buffer(SubscribedBuffer.Scoring.value)
 
     def close(self):
       # This didn't help with the errors
       try:
-        self._rf2_tele.close() if self._rf2_tele else None
-        self._rf2_scor.close()
-        self._rf2_ext.close()
+        self._buffers.clear()
+        self.Rf2Ext = None
+        for shared_memory in self._maps.values():
+            shared_memory.close()
+        self._maps.clear()
+        if self._rf2_ext is not None:
+            self._rf2_ext.close()
+            self._rf2_ext = None
       except BufferError: # "cannot close exported pointers exist"
         pass
 
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Reference lap (ghost) files: one lap's channels on the lap distance grid with its metadata, in a
+binary layout that is memory-mapped and viewed as NumPy arrays without parsing
+"""
+
+import json
+import mmap
+import os
+import re
+import struct
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+from delta import ReferenceLap, TRACE_CHANNELS
+from quantization import Quantizer, quantizer
+
+REFERENCE_LAP_DIR = "reference_laps"
+FILE_EXTENSION = ".lap"
+# Laps imported through the API are stored next to the personal bests, never in place of one
+IMPORTED_SUFFIX = "_imported"
+# Largest lap file accepted on import (a lap of Le Mans is about 60 KB)
+MAX_IMPORT_BYTES = 4 * 1024 * 1024
+
+FILE_MAGIC = b"LMUREF01"
+# magic, metadata JSON length, number of channels, number of grid points
+FILE_HEADER = struct.Struct("<8sIHI")
+# channel name, stored dtype, quantization scale (0 for floats) and offset, data offset in the file
+CHANNEL_HEADER = struct.Struct("<16s3sddQ")
+# Channel data starts on multiples of this, so the views are aligned
+ALIGNMENT = 64
+
+LAP_CHANNELS = ("lap_time",) + TRACE_CHANNELS
+
+
+def reference_lap_path(track_name: str, vehicle_name: str, driver_name: str,
+                       directory: str = REFERENCE_LAP_DIR, suffix: str = "") -> str:
+    """File where the best lap of a driver in a car on a track is stored"""
+    name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"{track_name}_{vehicle_name}_{driver_name}".strip()) or "unknown"
+    return os.path.join(directory, f"{name}{suffix}{FILE_EXTENSION}")
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // ALIGNMENT) * ALIGNMENT
+
+
+def encode_reference_lap(reference: ReferenceLap, lap_length: float, grid_spacing: float,
+                         track_name: str, vehicle_name: str, driver_name: str) -> bytes:
+    """Binary form of a lap, each channel quantized with its profile"""
+    metadata = json.dumps({
+        "trackName": track_name,
+        "vehicleName": vehicle_name,
+        "driverName": driver_name,
+        "lapNumber": reference.lap_number,
+        "lapTime": reference.lap_time,
+        "lapLength": lap_length,
+        "gridSpacing": grid_spacing,
+    }).encode()
+    channels = [reference.times] + (list(reference.channels) if reference.channels is not None
+                                    else [np.full(len(reference.times), np.nan)] * len(TRACE_CHANNELS))
+    points = len(reference.times)
+
+    offset = _aligned(FILE_HEADER.size + len(metadata) + CHANNEL_HEADER.size * len(LAP_CHANNELS))
+    headers, blocks = [], []
+    for name, values in zip(LAP_CHANNELS, channels):
+        q = quantizer(name)
+        data = q.encode(values).tobytes()
+        headers.append(CHANNEL_HEADER.pack(name.encode(), q.dtype.str.encode(), q.scale or 0.0, q.offset, offset))
+        blocks.append((offset, data))
+        offset = _aligned(offset + len(data))
+
+    out = bytearray(offset)
+    out[:FILE_HEADER.size] = FILE_HEADER.pack(FILE_MAGIC, len(metadata), len(LAP_CHANNELS), points)
+    position = FILE_HEADER.size
+    out[position:position + len(metadata)] = metadata
+    position += len(metadata)
+    for header in headers:
+        out[position:position + CHANNEL_HEADER.size] = header
+        position += CHANNEL_HEADER.size
+    for start, data in blocks:
+        out[start:start + len(data)] = data
+    return bytes(out)
+
+
+def write_reference_lap(path: str, reference: ReferenceLap, lap_length: float, grid_spacing: float,
+                        track_name: str, vehicle_name: str, driver_name: str) -> str:
+    """Write a lap file, replacing any previous one atomically (it may be mapped by a reader)"""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    data = encode_reference_lap(reference, lap_length, grid_spacing, track_name, vehicle_name, driver_name)
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "wb") as f:
+        f.write(data)
+    os.replace(temp_path, path)
+    return path
+
+
+def saved_lap_time(path: str) -> Optional[float]:
+    """Lap time of an existing lap file, None when there is none or it cannot be read"""
+    try:
+        with ReferenceLapFile.open(path) as lap:
+            return float(lap.metadata["lapTime"])
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+def write_personal_best(path: str, reference: ReferenceLap, lap_length: float, grid_spacing: float,
+                        track_name: str, vehicle_name: str, driver_name: str) -> bool:
+    """Write a personal best unless the file already holds a faster lap, True when written"""
+    saved = saved_lap_time(path)
+    if saved is not None and saved <= reference.lap_time:
+        return False
+    write_reference_lap(path, reference, lap_length, grid_spacing, track_name, vehicle_name, driver_name)
+    return True
+
+
+class ReferenceLapFile:
+    """
+    Read-only view of a reference lap file or buffer.
+
+    Only the headers are parsed; raw() returns zero-copy views of the stored channels over the
+    buffer (a memory map for files), channel() their float64 values.
+    """
+
+    def __init__(self, buffer, name: Optional[str] = None):
+        self.name = name
+        self._buffer = buffer
+        self._mmap = buffer if isinstance(buffer, mmap.mmap) else None
+        # Released on errors too, so that a rejected map can be closed
+        with memoryview(buffer) as view:
+            if len(view) < FILE_HEADER.size:
+                raise ValueError("Not a reference lap file (truncated header)")
+            magic, metadata_length, num_channels, self.num_points = FILE_HEADER.unpack_from(view, 0)
+            if magic != FILE_MAGIC:
+                raise ValueError("Not a reference lap file (bad magic)")
+            position = FILE_HEADER.size
+            try:
+                self.metadata: Dict[str, Any] = json.loads(bytes(view[position:position + metadata_length]))
+            except ValueError:
+                raise ValueError("Corrupted reference lap metadata")
+            position += metadata_length
+
+            offsets: Dict[str, int] = {}
+            self._quantizers: Dict[str, Quantizer] = {}
+            for _ in range(num_channels):
+                if position + CHANNEL_HEADER.size > len(view):
+                    raise ValueError("Truncated reference lap channel table")
+                raw_name, dtype, scale, offset, data_offset = CHANNEL_HEADER.unpack_from(view, position)
+                position += CHANNEL_HEADER.size
+                channel = raw_name.rstrip(b"\0").decode()
+                try:
+                    q = Quantizer(dtype.decode(), scale or None, offset)
+                except (TypeError, ValueError):
+                    raise ValueError(f"Unknown storage type of reference lap channel {channel}")
+                if data_offset + q.dtype.itemsize * self.num_points > len(view):
+                    raise ValueError(f"Truncated reference lap channel {channel}")
+                self._quantizers[channel] = q
+                offsets[channel] = data_offset
+            if "lap_time" not in offsets:
+                raise ValueError("Reference lap file has no lap_time channel")
+        # Views are only taken once the whole file is validated
+        self._views = {channel: np.frombuffer(buffer, dtype=self._quantizers[channel].dtype, count=self.num_points,
+                                              offset=data_offset) for channel, data_offset in offsets.items()}
+
+    @classmethod
+    def open(cls, path: str) -> "ReferenceLapFile":
+        with open(path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            return cls(buffer, os.path.basename(path))
+        except ValueError:
+            buffer.close()
+            raise
+
+    @property
+    def channels(self) -> List[str]:
+        return list(self._views)
+
+    @property
+    def lap_length(self) -> float:
+        return float(self.metadata["lapLength"])
+
+    @property
+    def grid_spacing(self) -> float:
+        return float(self.metadata["gridSpacing"])
+
+    def raw(self, channel: str) -> np.ndarray:
+        """Stored codes of a channel, a view of the file"""
+        return self._views[channel]
+
+    def channel(self, channel: str) -> np.ndarray:
+        return self._quantizers[channel].decode(self._views[channel])
+
+    def to_reference(self, num_points: Optional[int] = None) -> ReferenceLap:
+        """Lap for DeltaEngine.set_reference(), resampled when the engine grid has another size"""
+        times = self.channel("lap_time")
+        channels = np.array([self.channel(name) if name in self._views else np.full(self.num_points, np.nan)
+                             for name in TRACE_CHANNELS])
+        if num_points is not None and num_points != self.num_points:
+            old_grid = np.linspace(0.0, 1.0, self.num_points)
+            new_grid = np.linspace(0.0, 1.0, num_points)
+            times = np.interp(new_grid, old_grid, times)
+            channels = np.array([np.interp(new_grid, old_grid, row) for row in channels])
+        return ReferenceLap(int(self.metadata.get("lapNumber", 0)), float(self.metadata["lapTime"]),
+                            times, channels, self.name)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Metadata for JSON serialization"""
+        return {"name": self.name, **self.metadata, "points": self.num_points, "channels": self.channels}
+
+    def close(self):
+        self._views = {}
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def __enter__(self) -> "ReferenceLapFile":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+"""
+Relay mode: the game-side process pushes one compressed binary stream upstream and the relay
+fans it out to any number of pit-wall clients, keeping that load off the driver's machine.
+
+    RELAY_TOKEN=secret python relay.py serve --port 8090
+    RELAY_TOKEN=secret python websocket_server.py --upstream ws://relay-host:8090/upstream
+    RELAY_TOKEN=secret python relay.py replay export/session_Hugo_Le_Mans_20250811_231630.frames --upstream ws://localhost:8090/upstream
+
+The upstream connection must present the shared token of the relay (--token or RELAY_TOKEN) as
+a bearer token on the handshake; the pit-wall clients are read-only and need none.
+"""
+
+import argparse
+import asyncio
+import hmac
+import json
+import logging
+import os
+import struct
+import time
+import zlib
+from http import HTTPStatus
+from typing import Optional, Dict, Any, List, Tuple
+
+import websockets
+
+from client_channel import ClientChannel, STREAM
+from topics import DERIVED_CHANNELS
+from frames import FrameBuffer, record_to_frame
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+UPSTREAM_PATH = "/upstream"
+TOKEN_ENV = "RELAY_TOKEN"
+# websockets >= 14 takes the handshake headers as additional_headers, earlier versions as extra_headers
+HEADERS_ARGUMENT = "additional_headers" if int(websockets.__version__.split(".")[0]) >= 14 else "extra_headers"
+# Batches per second pushed upstream (the relay clients pick their own rate)
+UPSTREAM_RATE = 60.0
+RECONNECT_DELAY = 2.0
+COMPRESSION_LEVEL = 6
+
+# kind (MESSAGE or STREAM), topic length, payload length
+RECORD_HEADER = struct.Struct("<BBI")
+
+
+def encode_batch(compressor, pending: List[Tuple[int, Optional[str], str]]) -> bytes:
+    """
+    One binary upstream message: the records of the pending messages, deflated with the
+    compressor of the connection and sync-flushed, so the dictionary carries over between batches
+    """
+    parts = []
+    for kind, topic, message in pending:
+        topic_bytes = (topic or "").encode()
+        payload = message.encode()
+        parts += [RECORD_HEADER.pack(kind, len(topic_bytes), len(payload)), topic_bytes, payload]
+    return compressor.compress(b"".join(parts)) + compressor.flush(zlib.Z_SYNC_FLUSH)
+
+
+def decode_batch(decompressor, data: bytes) -> List[Tuple[int, Optional[str], str]]:
+    """Inverse of encode_batch(), with the decompressor of the connection"""
+    raw = decompressor.decompress(data)
+    records = []
+    offset = 0
+    while offset < len(raw):
+        kind, topic_length, payload_length = RECORD_HEADER.unpack_from(raw, offset)
+        offset += RECORD_HEADER.size
+        topic = raw[offset:offset + topic_length].decode() or None
+        offset += topic_length
+        records.append((kind, topic, raw[offset:offset + payload_length].decode()))
+        offset += payload_length
+    return records
+
+
+class UpstreamLink(ClientChannel):
+    """
+    Game-side end of the relay, published to like any client.
+
+    Pending messages are batched at UPSTREAM_RATE and sent as one compressed binary message.
+    Rate control and backpressure are the ones of ClientChannel; the link reconnects when the
+    relay goes away. The token is sent as a bearer token on the handshake.
+    """
+
+    def __init__(self, url: str, token: Optional[str] = None, rate: float = UPSTREAM_RATE):
+        super().__init__(None, rate)
+        self.url = url
+        self.token = token
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.connections = 0
+        self._compressor = None
+
+    @property
+    def name(self) -> str:
+        return self.url
+
+    def wants(self, topic: Optional[str]) -> bool:
+        # Relay clients subscribe on the relay: the derived channels are forwarded, not the latency probes
+        return topic in DERIVED_CHANNELS or super().wants(topic)
+
+    async def run(self):
+        while True:
+            headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+            try:
+                async with websockets.connect(self.url, compression=None, **{HEADERS_ARGUMENT: headers}) as websocket:
+                    self.websocket = websocket
+                    self.connections += 1
+                    logger.info(f"Connected to relay {self.url}")
+                    self._compressor = zlib.compressobj(COMPRESSION_LEVEL)
+                    await self._deliver()
+            except (OSError, websockets.exceptions.WebSocketException) as e:
+                logger.warning(f"Relay {self.url} unavailable: {e}")
+            finally:
+                self.websocket = None
+                # The relay only caches the metadata it received on this connection
+                self.metadata_id = None
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _send(self, pending: List[Tuple[int, Optional[str], str]]):
+        data = encode_batch(self._compressor, pending)
+        await self.websocket.send(data)
+        self.sent += len(pending)
+        self.bytes_in += sum(len(message) for _, _, message in pending)
+        self.bytes_out += len(data)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = super().stats()
+        stats.update(type="upstreamStats", url=self.url, connections=self.connections,
+                     bytesIn=self.bytes_in, bytesOut=self.bytes_out,
+                     ratio=round(self.bytes_in / self.bytes_out, 2) if self.bytes_out else None)
+        return stats
+
+
+def upstream_authorized(path: str, headers, token: str) -> bool:
+    """Whether an upstream handshake carries the relay token (any other path needs none)"""
+    if path != UPSTREAM_PATH:
+        return True
+    return hmac.compare_digest(headers.get("Authorization", ""), f"Bearer {token}")
+
+
+class RelayServer:
+    """Fans the upstream stream out to the connected clients, each with its own ClientChannel"""
+
+    def __init__(self, token: str, host: str = "0.0.0.0", port: int = 8090):
+        if not token:
+            raise ValueError("The relay needs a token to authenticate its upstream")
+        self.token = token
+        self.host = host
+        self.port = port
+        self.clients: Dict[Any, ClientChannel] = {}
+        # Last sessionMetadata, sent first to the clients joining mid-session
+        self.metadata: Optional[str] = None
+        self.batches = 0
+        self.bytes_received = 0
+
+    def process_request(self, connection_or_path, request_or_headers):
+        """
+        Handshake hook: refuse an upstream connection without the token before it is upgraded.
+        websockets < 14 passes the path and request headers, later versions the connection and request.
+        """
+        if isinstance(connection_or_path, str):
+            if not upstream_authorized(connection_or_path, request_or_headers, self.token):
+                logger.warning("Upstream connection refused: bad or missing token")
+                return HTTPStatus.UNAUTHORIZED, [], b"Invalid relay token\n"
+            return None
+        if not upstream_authorized(request_or_headers.path, request_or_headers.headers, self.token):
+            logger.warning(f"Upstream connection refused from {connection_or_path.remote_address[0]}: bad or missing token")
+            return connection_or_path.respond(HTTPStatus.UNAUTHORIZED, "Invalid relay token\n")
+        return None
+
+    async def handle(self, websocket):
+        # websockets < 14 exposes the path on the connection, later versions on the request
+        path = getattr(websocket, "path", None) or websocket.request.path
+        if path == UPSTREAM_PATH:
+            await self.handle_upstream(websocket)
+        else:
+            await self.handle_client(websocket)
+
+    async def handle_upstream(self, websocket):
+        """Receive the game-side stream"""
+        address = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        logger.info(f"Upstream connected from {address}")
+        decompressor = zlib.decompressobj()
+        try:
+            async for data in websocket:
+                self.batches += 1
+                self.bytes_received += len(data)
+                for kind, topic, message in decode_batch(decompressor, data):
+                    if topic == "sessionMetadata":
+                        self.metadata = message
+                    for channel in self.clients.values():
+                        if kind == STREAM:
+                            channel.offer(topic, message)
+                        else:
+                            channel.push(message, topic)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        except (zlib.error, struct.error, UnicodeDecodeError) as e:
+            logger.error(f"Corrupted upstream stream from {address}: {e}")
+        finally:
+            logger.info(f"Upstream from {address} closed after {self.batches} batches, {self.bytes_received} bytes")
+
+    async def handle_client(self, websocket):
+        address = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
+        logger.info(f"New relay client from {address}")
+        channel = ClientChannel(websocket)
+        if self.metadata is not None:
+            channel.push(self.metadata, "sessionMetadata")
+        self.clients[websocket] = channel
+        sender = asyncio.create_task(channel.run())
+        try:
+            async for message in websocket:
+                channel.handle_message(message)
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            sender.cancel()
+            self.clients.pop(websocket, None)
+            logger.info(f"Relay client {address} closed: {channel.stats()}")
+
+    async def serve(self):
+        async with websockets.serve(self.handle, self.host, self.port, compression=None,
+                                    process_request=self.process_request):
+            logger.info(f"Relay listening on ws://{self.host}:{self.port} (upstream on {UPSTREAM_PATH})")
+            await asyncio.Future()
+
+
+async def replay_session(path: str, link: UpstreamLink, speed: float = 1.0, loop: bool = False):
+    """
+    Replay source: publish a session recording (FrameBuffer.write_binary) to the link at the
+    recorded pace, with its sessionMetadata and events, as the game-side server would
+    """
+    frames, names = FrameBuffer.read_binary(path)
+    with open(f"{path}.json", encoding="utf-8") as f:
+        events = json.load(f).get("events", [])
+    if not len(frames):
+        logger.warning(f"{path} has no frames")
+        return
+
+    while True:
+        next_event = 0
+        start_wall = time.perf_counter()
+        start_timestamp = frames["timestamp"][0]
+        for metadata_id, (start, end, driver, vehicle, track) in enumerate(names):
+            for index in range(start, end):
+                record = frames[index]
+                delay = (record["timestamp"] - start_timestamp) / speed - (time.perf_counter() - start_wall)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+                while next_event < len(events) and events[next_event]["frame"] <= index:
+                    event = {key: value for key, value in events[next_event].items() if key != "frame"}
+                    link.push(json.dumps(event), event.get("type"))
+                    next_event += 1
+
+                if link.metadata_id != metadata_id:
+                    link.push(json.dumps({"type": "sessionMetadata", "id": metadata_id, "driverName": driver,
+                                          "vehicleName": vehicle, "trackName": track,
+                                          "session": int(record["session"])}), "sessionMetadata")
+                    link.metadata_id = metadata_id
+                frame = record_to_frame(record, driver, vehicle, track, metadata_id, float(record["timestamp"]))
+                link.offer("telemetry", frame.to_json())
+        logger.info(f"Replayed {len(frames)} frames: {link.stats()}")
+        if not loop:
+            return
+        link.metadata_id = None
+
+
+async def run_replay(args: argparse.Namespace):
+    link = UpstreamLink(args.upstream, args.token)
+    sender = asyncio.create_task(link.run())
+    try:
+        await replay_session(args.path, link, args.speed, args.loop)
+        # Let the last batch go out
+        await asyncio.sleep(2.0 / link.rate)
+    finally:
+        sender.cancel()
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LMU telemetry relay")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve = commands.add_parser("serve", help="fan the upstream stream out to the clients")
+    serve.add_argument("--host", default="0.0.0.0", help="interface to listen on")
+    serve.add_argument("--port", type=int, default=8090, help="port to listen on")
+    serve.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                       help=f"shared token the upstream must present (default: ${TOKEN_ENV})")
+    replay = commands.add_parser("replay", help="push a session recording (.frames) upstream")
+    replay.add_argument("path", help="session recording written by the WebSocket server")
+    replay.add_argument("--upstream", default=f"ws://localhost:8090{UPSTREAM_PATH}", help="relay upstream URL")
+    replay.add_argument("--speed", type=float, default=1.0, help="replay speed factor")
+    replay.add_argument("--loop", action="store_true", help="replay the session again when it ends")
+    replay.add_argument("--token", default=os.environ.get(TOKEN_ENV),
+                        help=f"shared token of the relay (default: ${TOKEN_ENV})")
+    args = parser.parse_args()
+    if args.command == "serve" and not args.token:
+        parser.error(f"the relay needs a shared token: pass --token or set {TOKEN_ENV}")
+    return args
+
+
+def main():
+    args = parse_args()
+    try:
+        if args.command == "serve":
+            asyncio.run(RelayServer(args.token, args.host, args.port).serve())
+        else:
+            asyncio.run(run_replay(args))
+    except KeyboardInterrupt:
+        logger.info("Relay stopped")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Uniform resampling of the player frames on the sim clock (mElapsedTime)
+"""
+
+import math
+from bisect import bisect_right
+from collections import deque
+from typing import Optional, List
+
+from frames import TelemetryResponse
+
+# Recent frames kept to interpolate from
+RING_SIZE = 64
+
+
+class Resampler:
+    """
+    Turns frames stamped with mElapsedTime into frames exactly 1/rate apart on the sim clock.
+
+    Output times are multiples of 1/rate (computed from an integer index, so they do not drift).
+    Pedals and lap distance are interpolated linearly between the two frames around each output
+    time, the other fields (gear, place, corner, names...) are taken from the frame before it.
+    The ring is reset when the elapsed time goes backwards (new session, restart).
+    """
+
+    def __init__(self, rate: float, ring_size: int = RING_SIZE):
+        self.rate = rate
+        self._frames: deque = deque(maxlen=ring_size)
+        self._times: deque = deque(maxlen=ring_size)
+        self._next_index: Optional[int] = None
+
+    def add(self, frame: TelemetryResponse) -> List[TelemetryResponse]:
+        """Feed one new frame, return the uniform frames it completes"""
+        et = frame.elapsed_time
+        if et is None:
+            return []
+        if self._times and et <= self._times[-1]:
+            if et == self._times[-1]:
+                return []
+            self.reset()
+        self._frames.append(frame)
+        self._times.append(et)
+        if self._next_index is None:
+            self._next_index = math.ceil(et * self.rate)
+
+        output = []
+        times = list(self._times)
+        while True:
+            t = self._next_index / self.rate
+            if t > et:
+                break
+            i = max(bisect_right(times, t) - 1, 0)
+            output.append(self._interpolate(t, i))
+            self._next_index += 1
+        return output
+
+    def _interpolate(self, t: float, i: int) -> TelemetryResponse:
+        before = self._frames[i]
+        after = self._frames[i + 1] if i + 1 < len(self._frames) else before
+        span = after.elapsed_time - before.elapsed_time
+        w = (t - before.elapsed_time) / span if span > 0 else 0.0
+
+        lap_dist = before.lap_dist
+        if lap_dist is not None and after.lap_dist is not None and after.lap_dist >= lap_dist:
+            # No interpolation across the start/finish line, where the distance wraps
+            lap_dist += w * (after.lap_dist - lap_dist)
+        return TelemetryResponse(
+            before.driver_name, before.vehicle_name, before.track_name, before.place, before.gear,
+            before.brake + w * (after.brake - before.brake),
+            before.throttle + w * (after.throttle - before.throttle),
+            before.session, lap_dist, before.corner,
+            before.timestamp + w * (after.timestamp - before.timestamp),
+            before.metadata_id, t, before.version,
+        )
+
+    def reset(self):
+        self._frames.clear()
+        self._times.clear()
+        self._next_index = None
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Persistent on-disk cache for analysis results, keyed on the input data and the analysis parameters
+"""
+
+import contextlib
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+from typing import Optional, Dict, Any, Callable, Tuple
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".lmu_telemetry_cache")
+DEFAULT_MAX_BYTES = 2 * 1024**3
+
+# Name of the small index remembering the content hash of already seen files
+FILE_HASH_INDEX = "file_hashes.json"
+
+
+class ResultCache:
+    """
+    Size-bounded LRU cache of analysis results, stored as pickle files.
+
+    Entries are keyed on the function name, its version and every argument. File path arguments
+    are keyed on the content hash and modification time of the file, DataFrames and arrays on
+    their content. Reading an entry refreshes its modification time, which is used as the LRU
+    order when the cache grows over max_bytes.
+
+    Usage:
+        cache = ResultCache()
+
+        @cache.memoize(version=1)
+        def find_braking_segments(df, min_brake_intensity=50):
+            ...
+    """
+
+    def __init__(self, cache_dir: str = DEFAULT_CACHE_DIR, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._file_hashes = self._load_file_hashes()
+
+    def memoize(self, version: int = 1) -> Callable:
+        """Decorator caching the results of an analysis function. Bump version when it changes."""
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                key = self.make_key(f"{func.__module__}.{func.__qualname__}", version, bound.arguments)
+                found, result = self.get(key)
+                if found:
+                    return result
+                result = func(*args, **kwargs)
+                self.put(key, result)
+                return result
+
+            wrapper.cache = self
+            return wrapper
+        return decorator
+
+    def make_key(self, name: str, version: int, arguments: Dict[str, Any]) -> str:
+        """Cache key of one call"""
+        digest = hashlib.sha256(f"{name}:v{version}".encode())
+        for arg_name, value in arguments.items():
+            digest.update(arg_name.encode())
+            digest.update(self._fingerprint(value).encode())
+        return digest.hexdigest()
+
+    def _fingerprint(self, value: Any) -> str:
+        """Stable description of an argument value"""
+        if isinstance(value, (str, os.PathLike)) and os.path.isfile(value):
+            path = os.fspath(value)
+            stat = os.stat(path)
+            return f"file:{self.file_hash(path)}:{stat.st_mtime_ns}"
+        # pandas and numpy are optional, only look at their types when they are already loaded
+        if type(value).__module__.startswith("pandas"):
+            import pandas as pd
+            content = pd.util.hash_pandas_object(value, index=True).values.tobytes()
+            columns = repr(list(getattr(value, "columns", [getattr(value, "name", None)])))
+            return "pandas:" + hashlib.sha256(content + columns.encode()).hexdigest()
+        if type(value).__module__ == "numpy" and hasattr(value, "tobytes"):
+            return f"numpy:{value.dtype}:{value.shape}:" + hashlib.sha256(value.tobytes()).hexdigest()
+        return f"{type(value).__name__}:{value!r}"
+
+    def file_hash(self, path: str, block_size: int = 1 << 20) -> str:
+        """SHA-256 of a file, only recomputed when its size or modification time changes"""
+        stat = os.stat(path)
+        index_key = os.path.abspath(path)
+        known = self._file_hashes.get(index_key)
+        if known and known[0] == stat.st_size and known[1] == stat.st_mtime_ns:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(block_size), b""):
+                digest.update(block)
+        content_hash = digest.hexdigest()
+        self._file_hashes[index_key] = (stat.st_size, stat.st_mtime_ns, content_hash)
+        self._save_file_hashes()
+        return content_hash
+
+    def get(self, key: str) -> Tuple[bool, Any]:
+        """Return (True, result) on a hit, (False, None) on a miss"""
+        path = self._entry_path(key)
+        try:
+            with open(path, "rb") as f:
+                result = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError):
+            self.misses += 1
+            return False, None
+        try:
+            os.utime(path)  # most recently used
+        except OSError:
+            pass
+        self.hits += 1
+        return True, result
+
+    def put(self, key: str, result: Any):
+        """Store a result and evict the least recently used entries over the size limit"""
+        path = self._entry_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                pickle.dump(result, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, path)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            # Unpicklable results are simply not cached
+            return
+        finally:
+            _remove_temporary(tmp_path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries until the cache fits in max_bytes"""
+        entries = []
+        total = 0
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime_ns, stat.st_size, entry.path))
+                total += stat.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+    def clear(self):
+        """Remove every cached result"""
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith(".pkl"):
+                os.remove(entry.path)
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters and disk usage"""
+        sizes = [entry.stat().st_size for entry in os.scandir(self.cache_dir) if entry.name.endswith(".pkl")]
+        return {"hits": self.hits, "misses": self.misses, "entries": len(sizes),
+                "bytes": sum(sizes), "max_bytes": self.max_bytes}
+
+    def _entry_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.pkl")
+
+    def _load_file_hashes(self) -> Dict[str, Any]:
+        try:
+            with open(os.path.join(self.cache_dir, FILE_HASH_INDEX), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_file_hashes(self):
+        path = os.path.join(self.cache_dir, FILE_HASH_INDEX)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self._file_hashes, f)
+            os.replace(tmp_path, path)
+        finally:
+            _remove_temporary(tmp_path)
+
+
+def _remove_temporary(tmp_path: str):
+    """Remove a temporary file left by a failed write (already gone once renamed)"""
+    with contextlib.suppress(OSError):
+        os.remove(tmp_path)
+
+
+_default_cache: Optional[ResultCache] = None
+
+
+def default_cache() -> ResultCache:
+    """Process-wide cache in DEFAULT_CACHE_DIR"""
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ResultCache()
+    return _default_cache
+
+
+def memoize(version: int = 1) -> Callable:
+    """Decorator caching an analysis function in the default cache"""
+    def decorator(func: Callable) -> Callable:
+        cached = None
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            nonlocal cached
+            if cached is None:
+                cached = default_cache().memoize(version)(func)
+            return cached(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Decode-once cache of the static strings (driver, vehicle, track) and session metadata IDs
+"""
+
+from typing import Optional, Dict, Any, Tuple
+
+from rF2data import Cbytestring2Python
+
+# The cache is dropped when it grows over this many distinct raw strings (new sessions, many cars)
+MAX_CACHED_STRINGS = 4096
+
+
+class StringCache:
+    """Cbytestring2Python() memoized on the raw bytes of the C string"""
+
+    def __init__(self, max_size: int = MAX_CACHED_STRINGS):
+        self.max_size = max_size
+        self._strings: Dict[bytes, str] = {}
+
+    def decode(self, bytestring) -> str:
+        raw = bytes(bytestring)
+        value = self._strings.get(raw)
+        if value is None:
+            if len(self._strings) >= self.max_size:
+                self._strings.clear()
+            value = Cbytestring2Python(bytestring) or ""
+            self._strings[raw] = value
+        return value
+
+
+class SessionMetadata:
+    """
+    Small integer IDs for (driver, vehicle, track, session) combinations.
+
+    Frames only carry the ID; the names travel in a sessionMetadata message sent when the ID
+    changes, so they are decoded once per session instead of once per frame.
+    """
+
+    def __init__(self):
+        self.strings = StringCache()
+        self._ids: Dict[Tuple[str, str, str, int], int] = {}
+        self._metadata: Dict[int, Dict[str, Any]] = {}
+
+    def identify(self, player_vehicle, scoring_info) -> Tuple[int, str, str, str]:
+        """Metadata ID and decoded names of the player vehicle in the current session"""
+        driver_name = self.strings.decode(player_vehicle.mDriverName)
+        vehicle_name = self.strings.decode(player_vehicle.mVehicleName)
+        track_name = self.strings.decode(scoring_info.mTrackName)
+        metadata_id = self.register(driver_name, vehicle_name, track_name, scoring_info.mSession)
+        return metadata_id, driver_name, vehicle_name, track_name
+
+    def register(self, driver_name: str, vehicle_name: str, track_name: str, session: int) -> int:
+        """Metadata ID of decoded names (recordings replayed without the game)"""
+        key = (driver_name, vehicle_name, track_name, session)
+        metadata_id = self._ids.get(key)
+        if metadata_id is None:
+            metadata_id = len(self._ids)
+            self._ids[key] = metadata_id
+            self._metadata[metadata_id] = {
+                "type": "sessionMetadata",
+                "id": metadata_id,
+                "driverName": driver_name,
+                "vehicleName": vehicle_name,
+                "trackName": track_name,
+                "session": session,
+            }
+        return metadata_id
+
+    def message(self, metadata_id: int) -> Optional[Dict[str, Any]]:
+        """The sessionMetadata message of an ID"""
+        return self._metadata.get(metadata_id)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+"""
+Stint projections: fuel and tyre wear per lap fitted on the recent laps, laps remaining and pit window
+
+    python stint.py export/session_Hugo_Le_Mans_20250811_231630.frames
+"""
+
+import argparse
+import json
+import math
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+NUM_WHEELS = 4
+
+# Laps of a stint kept (ring), and laps the regressions are fitted on
+MAX_LAPS = 256
+DEFAULT_WINDOW = 8
+# Remaining tread (mWear, 1.0 = new) at which the tyres are considered done
+DEFAULT_TYRE_LIMIT = 0.4
+# Laps projected ahead
+HORIZON = 512
+# Fuel or tread going up by more than this between two laps is a pit stop
+REFILL_THRESHOLD = 0.5
+REPLACE_THRESHOLD = 0.02
+
+
+def _fit(y: np.ndarray):
+    """
+    Least squares line through per-lap values, one column per quantity: (intercept, slope) arrays
+    with x the stint lap index of the rows. Below 3 laps only the mean is used.
+    """
+    n = len(y)
+    x = np.arange(n, dtype=np.float64)
+    if n < 3:
+        return y.mean(axis=0), np.zeros(y.shape[1])
+    design = np.column_stack((np.ones(n), x - (n - 1)))
+    (intercept, slope), *_ = np.linalg.lstsq(design, y, rcond=None)
+    return intercept, slope
+
+
+def _laps_covered(remaining: np.ndarray, per_lap: np.ndarray, slope: np.ndarray) -> np.ndarray:
+    """
+    Laps (fractional) until the per-column remaining amounts are used up, with the per-lap use of
+    the coming laps following the fitted trend
+    """
+    steps = np.arange(1, HORIZON + 1, dtype=np.float64)[:, None]
+    use = np.maximum(per_lap + slope * steps, 1e-6)
+    used = np.cumsum(use, axis=0)
+    full = (used <= remaining).sum(axis=0)
+    before = np.where(full > 0, used[np.maximum(full - 1, 0), np.arange(len(full))], 0.0)
+    partial = (remaining - before) / use[np.minimum(full, HORIZON - 1), np.arange(len(full))]
+    laps = full + np.where(full < HORIZON, np.clip(partial, 0.0, 1.0), 0.0)
+    return np.where(per_lap > 1e-6, laps, np.inf)
+
+
+class StintEngine:
+    """
+    Fuel and tyre projections updated once per lap.
+
+    At each crossing of the line the fuel level and the remaining tread of the four tyres are
+    stored in fixed-size ring arrays, along with the lap time. The per-lap consumption and wear
+    of the last window laps are fitted with one least squares call each (wheels as columns), and
+    the fitted trend is projected forward to get the laps remaining and the pit window. A refuel
+    restarts the fuel stint, a tyre change the tyre stint, and the laps they happened on are not
+    fitted. Every projection message holds the inputs it was computed from, so recorded sessions
+    can be replayed through add_lap() offline.
+    """
+
+    def __init__(self, window: int = DEFAULT_WINDOW, tyre_limit: float = DEFAULT_TYRE_LIMIT):
+        self.window = window
+        self.tyre_limit = tyre_limit
+        self.fuel_used = np.zeros(MAX_LAPS)
+        self.wear_used = np.zeros((MAX_LAPS, NUM_WHEELS))
+        self.lap_times = np.zeros(MAX_LAPS)
+        self.last_projection: Optional[Dict[str, Any]] = None
+        self.reset()
+
+    def reset(self):
+        """Forget both stints (session change, restart)"""
+        self._fuel_laps = 0
+        self._tyre_laps = 0
+        self._timed_laps = 0
+        self._lap_number: Optional[int] = None
+        self._last_et: Optional[float] = None
+        self._line: Optional[tuple] = None  # (et, fuel, wear) at the last crossing of the line
+
+    def update(self, telemetry, scoring_info=None) -> Optional[Dict[str, Any]]:
+        """Consume one rF2VehicleTelemetry sample, return the projection when a lap completes"""
+        elapsed = telemetry.mElapsedTime
+        if self._last_et is not None and elapsed < self._last_et:
+            self.reset()
+        self._last_et = elapsed
+        lap_number = telemetry.mLapNumber
+        if lap_number == self._lap_number:
+            return None
+        first = self._lap_number is None
+        self._lap_number = lap_number
+        if first:
+            # Joined mid-lap, the fuel and wear at the line are not known
+            return None
+        end_et, max_laps = (scoring_info.mEndET, scoring_info.mMaxLaps) if scoring_info is not None else (0.0, 0)
+        return self.add_lap(lap_number, telemetry.mLapStartET, telemetry.mFuel, telemetry.mFuelCapacity,
+                            [wheel.mWear for wheel in telemetry.mWheels], end_et, max_laps)
+
+    def add_lap(self, lap: int, et: float, fuel: float, fuel_capacity: float, wear: List[float],
+                end_et: float = 0.0, max_laps: int = 0) -> Dict[str, Any]:
+        """Record the crossing of the line at the start of lap, at sim time et, and return the projection"""
+        wear = np.asarray(wear, dtype=np.float64)
+        line = self._line
+        self._line = (et, fuel, wear)
+        if line is None or et < line[0]:
+            # First crossing or new session: nothing to fit yet
+            self._fuel_laps = self._tyre_laps = self._timed_laps = 0
+            projection = self._project(lap, et, fuel, fuel_capacity, wear, end_et, max_laps)
+            self.last_projection = projection
+            return projection
+        previous_et, previous_fuel, previous_wear = line
+
+        fuel_delta = previous_fuel - fuel
+        if fuel_delta < -REFILL_THRESHOLD:
+            self._fuel_laps = 0
+        elif fuel_delta >= 0:
+            self.fuel_used[self._fuel_laps % MAX_LAPS] = fuel_delta
+            self._fuel_laps += 1
+        wear_delta = previous_wear - wear
+        if (wear_delta < -REPLACE_THRESHOLD).any():
+            self._tyre_laps = 0
+        elif (wear_delta >= 0).all():
+            self.wear_used[self._tyre_laps % MAX_LAPS] = wear_delta
+            self._tyre_laps += 1
+        lap_time = et - previous_et
+        if lap_time > 0:
+            self.lap_times[self._timed_laps % MAX_LAPS] = lap_time
+            self._timed_laps += 1
+
+        projection = self._project(lap, et, fuel, fuel_capacity, wear, end_et, max_laps)
+        self.last_projection = projection
+        return projection
+
+    def _recent(self, values: np.ndarray, count: int) -> np.ndarray:
+        """Last min(count, window) values of a ring, oldest first"""
+        n = min(count, self.window, MAX_LAPS)
+        return values[(np.arange(count - n, count)) % MAX_LAPS]
+
+    def _project(self, lap: int, et: float, fuel: float, fuel_capacity: float, wear: np.ndarray,
+                 end_et: float, max_laps: int) -> Dict[str, Any]:
+        fuel_per_lap = fuel_trend = laps_fuel = full_tank_laps = None
+        if self._fuel_laps:
+            intercept, slope = _fit(self._recent(self.fuel_used, self._fuel_laps)[:, None])
+            laps_fuel = float(_laps_covered(np.array([fuel]), intercept, slope)[0])
+            full_tank_laps = float(_laps_covered(np.array([fuel_capacity]), intercept, slope)[0])
+            fuel_per_lap, fuel_trend = float(intercept[0]), float(slope[0])
+
+        wear_per_lap = laps_tyres = None
+        if self._tyre_laps:
+            intercept, slope = _fit(self._recent(self.wear_used, self._tyre_laps))
+            # The most worn tyre decides
+            laps_tyres = float(_laps_covered(np.maximum(wear - self.tyre_limit, 0.0), intercept, slope).min())
+            wear_per_lap = intercept
+
+        lap_time = float(np.median(self._recent(self.lap_times, self._timed_laps))) if self._timed_laps else None
+        laps_to_go = None
+        if 0 < max_laps < 1_000_000:
+            laps_to_go = float(max(max_laps - lap + 1, 0))
+        if end_et > et and lap_time:
+            # Timed race: laps are started until the clock runs out
+            timed_laps = float(math.ceil((end_et - et) / lap_time))
+            laps_to_go = timed_laps if laps_to_go is None else min(laps_to_go, timed_laps)
+
+        limits = {"fuel": laps_fuel, "tyres": laps_tyres}
+        known = {name: laps for name, laps in limits.items() if laps is not None}
+        limited_by = min(known, key=known.get) if known else None
+        laps_remaining = known[limited_by] if known else None
+
+        pit_window = None
+        if laps_remaining is not None and math.isfinite(laps_remaining) and (laps_to_go is None or laps_remaining < laps_to_go):
+            # Latest lap to pit on, and earliest one from which a full tank reaches the end
+            close = lap + int(laps_remaining)
+            open_ = lap
+            if laps_to_go is not None and full_tank_laps is not None and math.isfinite(full_tank_laps):
+                open_ = min(max(lap, lap + int(math.ceil(laps_to_go - full_tank_laps))), close)
+            pit_window = {"open": open_, "close": close}
+
+        return {
+            "type": "stintProjection",
+            # Inputs, enough to replay the projection offline
+            "lap": lap,
+            "et": et,
+            "fuel": fuel,
+            "fuelCapacity": fuel_capacity,
+            "wear": wear.tolist(),
+            "endET": end_et,
+            "maxLaps": max_laps,
+            # Projection
+            "fuelLaps": min(self._fuel_laps, self.window),
+            "tyreLaps": min(self._tyre_laps, self.window),
+            "fuelPerLap": _round(fuel_per_lap, 3),
+            "fuelTrend": _round(fuel_trend, 4),
+            "wearPerLap": np.round(wear_per_lap, 5).tolist() if wear_per_lap is not None else None,
+            "lapTime": _round(lap_time, 3),
+            "lapsRemainingFuel": _round(laps_fuel, 1),
+            "lapsRemainingTyres": _round(laps_tyres, 1),
+            "lapsRemaining": _round(laps_remaining, 1),
+            "limitedBy": limited_by,
+            "lapsToGo": laps_to_go,
+            "fuelToFinish": _round(laps_to_go * fuel_per_lap, 1) if laps_to_go is not None and fuel_per_lap else None,
+            "pitWindow": pit_window,
+        }
+
+
+def _round(value: Optional[float], digits: int) -> Optional[float]:
+    if value is None or not math.isfinite(value):
+        return None
+    return round(value, digits)
+
+
+def replay(projections: List[Dict[str, Any]], window: int = DEFAULT_WINDOW,
+           tyre_limit: float = DEFAULT_TYRE_LIMIT) -> List[Dict[str, Any]]:
+    """Recompute recorded projections from their inputs"""
+    engine = StintEngine(window, tyre_limit)
+    return [engine.add_lap(p["lap"], p["et"], p["fuel"], p["fuelCapacity"], p["wear"], p["endET"], p["maxLaps"])
+            for p in projections]
+
+
+def accuracy(projections: List[Dict[str, Any]], ahead: int = 5) -> Dict[str, Any]:
+    """
+    Error of the projections against what happened next: fuel per lap against the next lap's use,
+    and projected fuel level ahead laps later against the recorded one (within the same stint)
+    """
+    by_lap = {p["lap"]: p for p in projections}
+    next_errors, ahead_errors, wear_errors = [], [], []
+    for p in projections:
+        following = by_lap.get(p["lap"] + 1)
+        if p["fuelPerLap"] is not None and following and following["fuel"] <= p["fuel"]:
+            next_errors.append(abs(p["fuelPerLap"] + p["fuelTrend"] - (p["fuel"] - following["fuel"])))
+        if p["wearPerLap"] is not None and following and min(np.subtract(p["wear"], following["wear"])) >= 0:
+            wear_errors.append(float(np.abs(np.subtract(p["wearPerLap"], np.subtract(p["wear"], following["wear"]))).max()))
+        later = [by_lap.get(p["lap"] + k) for k in range(1, ahead + 1)]
+        if p["fuelPerLap"] is not None and all(later) and all(a["fuel"] >= b["fuel"] for a, b in zip([p] + later, later)):
+            steps = np.arange(1, ahead + 1)
+            predicted = p["fuel"] - np.sum(p["fuelPerLap"] + p["fuelTrend"] * steps)
+            ahead_errors.append(abs(predicted - later[-1]["fuel"]))
+
+    def summary(errors):
+        return {"laps": len(errors), "mae": round(float(np.mean(errors)), 4) if errors else None,
+                "max": round(float(np.max(errors)), 4) if errors else None}
+
+    return {"fuelNextLap": summary(next_errors), f"fuel{ahead}LapsAhead": summary(ahead_errors),
+            "wearNextLap": summary(wear_errors)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay and score the stint projections of a session recording")
+    parser.add_argument("path", help="session recording (.frames) written by the WebSocket server")
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW, help="laps the regressions are fitted on")
+    parser.add_argument("--tyre-limit", type=float, default=DEFAULT_TYRE_LIMIT, help="remaining tread at which tyres are done")
+    parser.add_argument("--ahead", type=int, default=5, help="laps ahead the fuel level projection is scored at")
+    args = parser.parse_args()
+
+    with open(f"{args.path}.json", encoding="utf-8") as f:
+        recorded = [e for e in json.load(f).get("events", []) if e.get("type") == "stintProjection"]
+    if not recorded:
+        print(f"No stint projections in {args.path}")
+        return
+    replayed = replay(recorded, args.window, args.tyre_limit)
+    keys = ("fuelPerLap", "lapsRemainingFuel", "lapsRemainingTyres", "pitWindow")
+    mismatches = sum(1 for a, b in zip(recorded, replayed) if any(a[k] != b[k] for k in keys))
+    print(f"{len(recorded)} projections replayed, {mismatches} differ from the recorded ones")
+    print(json.dumps(accuracy(replayed, args.ahead), indent=2))
+
+
+if __name__ == "__main__":
+    main()
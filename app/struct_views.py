@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Zero-copy NumPy views over the fields of the mapped rF2 struct arrays
+"""
+
+import ctypes
+from typing import Tuple
+
+import numpy as np
+
+_CTYPES_TO_NUMPY = {
+    ctypes.c_double: np.float64,
+    ctypes.c_float: np.float32,
+    ctypes.c_int: np.int32,
+    ctypes.c_short: np.int16,
+    ctypes.c_ubyte: np.uint8,
+    ctypes.c_byte: np.int8,
+}
+
+
+def _unwrap_arrays(field_type) -> Tuple[type, Tuple[int, ...], Tuple[int, ...]]:
+    """Element type, shape and byte strides of a (possibly nested) ctypes array type"""
+    shape: Tuple[int, ...] = ()
+    strides: Tuple[int, ...] = ()
+    while issubclass(field_type, ctypes.Array):
+        shape += (field_type._length_,)
+        strides += (ctypes.sizeof(field_type._type_),)
+        field_type = field_type._type_
+    return field_type, shape, strides
+
+
+def field_view(struct_array, path: str) -> np.ndarray:
+    """
+    Live view of one field across every element of a ctypes struct array.
+
+    Example: field_view(info.Rf2Scor.mVehicles, "mPos.x") is a (128,) float64 array reading
+    straight from the shared memory. Array fields add trailing axes, so
+    field_view(info.Rf2Tele.mVehicles, "mWheels.mTemperature") is (128, 4, 3).
+    Copy the view to get a stable snapshot.
+    """
+    element_type = struct_array._type_
+    offset = 0
+    shape: Tuple[int, ...] = (len(struct_array),)
+    strides: Tuple[int, ...] = (ctypes.sizeof(element_type),)
+    field_type = element_type
+    for name in path.split("."):
+        if not issubclass(field_type, ctypes.Structure):
+            raise TypeError(f"Cannot select {name} in {path}, its parent is not a structure")
+        offset += getattr(field_type, name).offset
+        field_type, sub_shape, sub_strides = _unwrap_arrays(dict(field_type._fields_)[name])
+        shape += sub_shape
+        strides += sub_strides
+    if issubclass(field_type, ctypes.Structure):
+        raise TypeError(f"{path} is a structure, select one of its fields")
+
+    raw = np.frombuffer((ctypes.c_ubyte * ctypes.sizeof(struct_array)).from_buffer(struct_array), dtype=np.uint8)
+    return np.ndarray(shape=shape, dtype=_CTYPES_TO_NUMPY[field_type], buffer=raw, offset=offset, strides=strides)
@@ -0,0 +1,200 @@
+import gc
+import types
+import warnings
+
+import numpy as np
+import pytest
+
+from all_car_recorder import (AllCarRecorder, AllCarRecording, CHANNELS, read_recording, encode_channel,
+                              decode_channel)
+from rF2data import rF2Telemetry, rF2Scoring
+
+
+def fake_sim_info(num_vehicles: int = 3):
+    sim_info = types.SimpleNamespace(Rf2Tele=rF2Telemetry(), Rf2Scor=rF2Scoring())
+    sim_info.Rf2Tele.mNumVehicles = num_vehicles
+    sim_info.Rf2Scor.mScoringInfo.mNumVehicles = num_vehicles
+    for slot in range(num_vehicles):
+        sim_info.Rf2Tele.mVehicles[slot].mID = 10 + slot
+        sim_info.Rf2Scor.mVehicles[slot].mID = 10 + slot
+    return sim_info
+
+
+def record(path: str, sessions=((0.0, 20.0),), rate: float = 10.0, chunk_frames: int = 16) -> str:
+    """Recording of 3 cars, one elapsed time range per session"""
+    sim_info = fake_sim_info()
+    recorder = AllCarRecorder(sim_info, path, chunk_frames=chunk_frames)
+    version = 0
+    for session, (start, end) in enumerate(sessions):
+        sim_info.Rf2Scor.mScoringInfo.mSession = session
+        for et in np.arange(round(start * rate), round(end * rate)) / rate:
+            version += 1
+            sim_info.Rf2Tele.mVersionUpdateEnd = version
+            for slot in range(3):
+                vehicle = sim_info.Rf2Tele.mVehicles[slot]
+                vehicle.mElapsedTime = et
+                vehicle.mPos.x = et * 10 + slot
+                sim_info.Rf2Scor.mVehicles[slot].mLapDist = et * 50
+            recorder.capture()
+    recorder.close()
+    return path
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+    import api
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "export").mkdir()
+    return TestClient(api.app)
+
+
+@pytest.mark.parametrize("dtype", [np.float64, np.float32, np.int16])
+def test_channel_compression_is_lossless(dtype):
+    rng = np.random.default_rng(0)
+    values = (np.cumsum(rng.normal(size=(300, 5)), axis=0) * 10).astype(dtype)
+    data = encode_channel(values)
+    np.testing.assert_array_equal(decode_channel(data, 300, 5, dtype), values)
+
+
+def test_slowly_varying_channel_compresses():
+    values = np.round(np.linspace(0.0, 500.0, 512)[:, None] + np.arange(20), 2)
+    assert len(encode_channel(values)) < values.nbytes / 3
+
+
+def test_columns_sorted_by_vehicle_id_with_their_lap_distance(tmp_path):
+    sim_info = fake_sim_info()
+    # Telemetry and scoring slots in different orders
+    for slot, vehicle_id in enumerate([12, 10, 11]):
+        sim_info.Rf2Tele.mVehicles[slot].mID = vehicle_id
+        sim_info.Rf2Tele.mVehicles[slot].mPos.x = vehicle_id
+    for slot, vehicle_id in enumerate([11, 12, 10]):
+        sim_info.Rf2Scor.mVehicles[slot].mID = vehicle_id
+        sim_info.Rf2Scor.mVehicles[slot].mLapDist = vehicle_id * 100
+    path = str(tmp_path / "order.rec")
+    recorder = AllCarRecorder(sim_info, path)
+    sim_info.Rf2Tele.mVersionUpdateEnd = 1
+    assert recorder.capture()
+    # The same telemetry update is only recorded once
+    assert not recorder.capture()
+    recorder.close()
+    [chunk] = read_recording(path)
+    assert chunk["vehicle_ids"].tolist() == [10, 11, 12]
+    np.testing.assert_allclose(chunk["channels"]["pos_x"][0], [10, 11, 12], atol=0.01)
+    np.testing.assert_allclose(chunk["channels"]["lap_dist"][0], [1000, 1100, 1200], atol=0.1)
+
+
+def test_new_chunk_when_the_cars_change(tmp_path):
+    sim_info = fake_sim_info()
+    path = str(tmp_path / "join.rec")
+    recorder = AllCarRecorder(sim_info, path)
+    for version in range(1, 7):
+        if version == 4:
+            sim_info.Rf2Tele.mNumVehicles = 2
+        sim_info.Rf2Tele.mVersionUpdateEnd = version
+        sim_info.Rf2Tele.mVehicles[0].mElapsedTime = version
+        recorder.capture()
+    recorder.close()
+    assert [(chunk["frames"], len(chunk["vehicle_ids"])) for chunk in read_recording(path)] == [(3, 3), (3, 2)]
+    assert recorder.stats()["frames"] == 6
+    assert recorder.stats()["ratio"] > 1
+
+
+def test_slice_every_channel(tmp_path):
+    recording = AllCarRecording(record(str(tmp_path / "one.rec")))
+    try:
+        frames = recording.slice(10.0, 12.0)
+    finally:
+        recording.close()
+    assert frames["vehicle_ids"].tolist() == [10, 11, 12]
+    assert len(frames["elapsed_time"]) == 21
+    for name in CHANNELS:
+        assert frames["channels"][name].shape == (21, 3)
+    np.testing.assert_allclose(frames["channels"]["elapsed_time"][:, 0], frames["elapsed_time"])
+
+
+def test_slice_endpoint_default_channels(api_client, tmp_path):
+    record(str(tmp_path / "export" / "one.rec"))
+    response = api_client.get("/recordings/one.rec/slice", params={"start": 10, "end": 12})
+    assert response.status_code == 200
+    content = response.json()
+    assert len(content["elapsed_time"]) == 21
+    assert set(content["channels"]) == set(CHANNELS)
+    assert len(content["channels"]["elapsed_time"][0]) == 3
+
+
+def test_slice_endpoint_elapsed_time_channel(api_client, tmp_path):
+    record(str(tmp_path / "export" / "one.rec"))
+    response = api_client.get("/recordings/one.rec/slice", params={"start": 10, "end": 12, "channels": "elapsed_time"})
+    assert response.status_code == 200
+    assert len(response.json()["channels"]["elapsed_time"]) == 21
+
+
+def test_slice_across_sessions(tmp_path):
+    # The elapsed time restarts at every session of the same recording
+    path = record(str(tmp_path / "sessions.rec"), sessions=((0.0, 20.0), (0.0, 20.0), (5.0, 20.0)))
+    recording = AllCarRecording(path)
+    try:
+        assert recording.segments == [0, 1, 2]
+        frames = recording.slice(10.0, 12.0)
+        assert len(frames["elapsed_time"]) == 3 * 21
+        assert np.bincount(frames["segment"]).tolist() == [21, 21, 21]
+        second = recording.slice(10.0, 12.0, ["pos_x"], segment=1)
+        assert len(second["elapsed_time"]) == 21
+        assert second["segment"].tolist() == [1] * 21
+    finally:
+        recording.close()
+
+
+def test_index_rebuilt_with_segments(tmp_path):
+    path = record(str(tmp_path / "sessions.rec"), sessions=((0.0, 20.0), (0.0, 20.0)))
+    written = AllCarRecording(path)
+    index = written.index.copy()
+    written.close()
+    (tmp_path / "sessions.rec.idx").unlink()
+    rebuilt = AllCarRecording(path)
+    try:
+        np.testing.assert_array_equal(rebuilt.index, index)
+        assert len(rebuilt.slice(10.0, 12.0)["elapsed_time"]) == 2 * 21
+    finally:
+        rebuilt.close()
+
+
+def test_read_recording_every_chunk(tmp_path):
+    path = record(str(tmp_path / "one.rec"))
+    chunks = list(read_recording(path, ["pos_x"]))
+    assert sum(chunk["frames"] for chunk in chunks) == 200
+    assert all(list(chunk["channels"]) == ["pos_x"] for chunk in chunks)
+
+
+@pytest.mark.filterwarnings("error::pytest.PytestUnraisableExceptionWarning")
+def test_not_a_recording_is_closed(tmp_path):
+    path = tmp_path / "junk.rec"
+    path.write_bytes(b"not a recording at all")
+    with warnings.catch_warnings():
+        warnings.simplefilter("error", ResourceWarning)
+        with pytest.raises(ValueError):
+            AllCarRecording(str(path))
+        gc.collect()
+
+
+@pytest.mark.parametrize("params", [{"start": 0, "end": 3600}, {"start": 12, "end": 10},
+                                    {"start": "nan", "end": 10}])
+def test_slice_endpoint_range_rejected(api_client, tmp_path, params):
+    record(str(tmp_path / "export" / "one.rec"))
+    assert api_client.get("/recordings/one.rec/slice", params=params).status_code == 400
+
+
+def test_slice_value_limit(api_client, tmp_path, monkeypatch):
+    import api
+    path = record(str(tmp_path / "export" / "one.rec"))
+    recording = AllCarRecording(path)
+    try:
+        with pytest.raises(ValueError):
+            recording.slice(0.0, 20.0, ["pos_x"], max_values=100)
+        # 200 frames x 3 cars x (pos_x and the frame time)
+        assert len(recording.slice(0.0, 20.0, ["pos_x"], max_values=1200)["elapsed_time"]) == 200
+    finally:
+        recording.close()
+    monkeypatch.setattr(api, "MAX_SLICE_VALUES", 100)
+    assert api_client.get("/recordings/one.rec/slice", params={"start": 0, "end": 20}).status_code == 400
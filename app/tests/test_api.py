@@ -0,0 +1,86 @@
+import os
+import types
+
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from rF2data import rF2Telemetry, rF2Scoring
+
+
+@pytest.fixture
+def api_client(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.makedirs("export/season")
+    return TestClient(api.app)
+
+
+@pytest.mark.parametrize("directory", ["..", "/", "export/../..", "export/season/../.."])
+def test_batch_analysis_directory_outside_export(api_client, directory):
+    response = api_client.post("/batch-analysis", json={"directory": directory})
+    assert response.status_code == 400
+
+
+def test_batch_analysis_output_confined_to_export(api_client, tmp_path):
+    response = api_client.post("/batch-analysis", json={"directory": "export/season", "output": "../../evil.csv",
+                                                        "workers": 1})
+    assert response.status_code == 200
+    assert (tmp_path / "export" / "evil.csv").is_file()
+    assert not (tmp_path.parent / "evil.csv").exists()
+
+
+@pytest.mark.parametrize("bin_size", [0, -10, 0.001])
+def test_lap_matrix_bin_size_rejected(api_client, bin_size):
+    response = api_client.post("/lap-matrix", json={"directory": "export", "binSize": bin_size})
+    assert response.status_code == 400
+
+
+def test_lap_matrix_directory_outside_export(api_client):
+    response = api_client.post("/lap-matrix", json={"directory": "/tmp", "output": "/tmp/evil.lapm"})
+    assert response.status_code == 400
+
+
+def test_player_telemetry_follows_scoring():
+    info = types.SimpleNamespace(Rf2Tele=rF2Telemetry(), Rf2Scor=rF2Scoring())
+    info.Rf2Tele.mNumVehicles = info.Rf2Scor.mScoringInfo.mNumVehicles = 3
+    for slot, vehicle_id in enumerate((4, 9, 2)):
+        info.Rf2Tele.mVehicles[slot].mID = vehicle_id
+        # Scoring and telemetry slots are not in the same order
+        info.Rf2Scor.mVehicles[2 - slot].mID = vehicle_id
+    assert api.player_telemetry(info) is None
+    info.Rf2Scor.mVehicles[1].mIsPlayer = 1
+    assert api.player_telemetry(info).mID == 9
+    info.Rf2Scor.mVehicles[1].mIsPlayer = 0
+    info.Rf2Scor.mVehicles[0].mIsPlayer = 1
+    assert api.player_telemetry(info).mID == 2
+
+
+def export_chunk(start: int, rows: int, append_to=None):
+    data = [{"timestamp": f"2025-08-11T23:16:{start + i:02d}.000Z", "session": 10, "gear": 3, "brake": 0.25,
+             "throttle": 0.5, "driverName": "Hugo PDVN", "vehicleName": "Oreca", "trackName": "Le Mans", "place": 1,
+             "elapsedTime": float(start + i)} for i in range(rows)]
+    return {"data": data, "appendTo": append_to,
+            "sessionInfo": {"currentSession": 10, "totalPoints": rows, "startTime": "", "endTime": ""}}
+
+
+def test_export_csv_streamed_in_chunks(api_client, tmp_path):
+    first = api_client.post("/export-csv", json=export_chunk(0, 3)).json()
+    assert first["appended"] is False
+    assert first["filename"].startswith("telemetry_Hugo_PDVN_Le_Mans_Oreca_")
+    second = api_client.post("/export-csv", json=export_chunk(3, 2, first["filename"])).json()
+    assert second["appended"] is True
+    assert second["filename"] == first["filename"]
+    lines = (tmp_path / "export" / first["filename"]).read_text(encoding="utf-8").splitlines()
+    # One header, then the rows of both chunks in order
+    assert len(lines) == 6
+    assert lines[0].startswith("timestamp,")
+    assert [line.split(",")[10] for line in lines[1:]] == ["0.0", "1.0", "2.0", "3.0", "4.0"]
+    assert lines[1].split(",")[4:6] == ["25.0", "50.0"]
+
+
+def test_export_csv_append_confined_to_export(api_client, tmp_path):
+    (tmp_path / "victim.csv").write_text("keep\n", encoding="utf-8")
+    response = api_client.post("/export-csv", json=export_chunk(0, 1, "../victim.csv")).json()
+    # Not a previous export: a new file is started in export/
+    assert response["appended"] is False
+    assert (tmp_path / "victim.csv").read_text(encoding="utf-8") == "keep\n"
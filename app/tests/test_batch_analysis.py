@@ -0,0 +1,68 @@
+import numpy as np
+import pytest
+
+from batch_analysis import SessionAccumulator, analyze_export, find_braking_segments, find_exports
+from frames import FrameBuffer, TelemetryResponse, get_session_name
+
+LAP_LENGTH = 1000.0
+
+
+def brake_trace(laps: int = 3, lap_samples: int = 200) -> np.ndarray:
+    """One long braking zone per lap"""
+    lap = np.zeros(lap_samples)
+    lap[50:120] = np.linspace(100, 10, 70)
+    return np.tile(lap, laps)
+
+
+def write_recording(path: str, lap_time: float = 20.0, laps: int = 3, rate: float = 10.0):
+    """Laps at constant speed, braking once per lap, the lap distance wrapping at the line"""
+    buffer = FrameBuffer()
+    for i in range(int(laps * lap_time * rate)):
+        et = i / rate
+        lap_dist = (et / lap_time) % 1.0 * LAP_LENGTH
+        braking = 0.25 <= lap_dist / LAP_LENGTH < 0.4
+        buffer.append(TelemetryResponse("A", "Car", "Track", 1, 3, 1.0 if braking else 0.0,
+                                        0.0 if braking else 1.0, 10, lap_dist, -1, 1e9 + et, None, et, i))
+    buffer.write_binary(path)
+
+
+def test_accumulator_carry_stays_bounded_across_chunks():
+    brake = brake_trace()
+    whole = SessionAccumulator("RACE", "A", "Car", "Track")
+    whole.add(np.full(len(brake), "2024-01-01T00:00:00Z"), brake, 100 - brake, 50)
+    chunked = SessionAccumulator("RACE", "A", "Car", "Track")
+    for start in range(0, len(brake), 7):
+        part = brake[start:start + 7]
+        chunked.add(np.full(len(part), "2024-01-01T00:00:00Z"), part, 100 - part, 50)
+        assert len(chunked._carry) <= 7 + 2
+    assert chunked.segment_samples == whole.segment_samples
+    assert chunked.segment_peaks == whole.segment_peaks
+    starts, ends = find_braking_segments(brake)
+    assert chunked.segment_samples == (ends - starts + 1).tolist()
+
+
+def test_frames_recording_analysed_with_lap_stats(tmp_path):
+    path = str(tmp_path / "session.frames")
+    write_recording(path)
+    assert find_exports(str(tmp_path)) == [path]
+    [row] = analyze_export(path, chunk_rows=64)
+    assert row["session_name"] == get_session_name(10)
+    assert row["driver_name"] == "A"
+    assert row["braking_segments"] == 3
+    # The first lap starts before the recording: only the later, complete, laps are summarized
+    assert row["laps"] == 1
+    assert row["best_lap_time_s"] == pytest.approx(20.0, abs=0.2)
+    assert row["mean_brake_zones_per_lap"] == 1
+
+
+def test_csv_export_has_no_lap_stats(tmp_path):
+    path = str(tmp_path / "session.csv")
+    buffer = FrameBuffer()
+    for i in range(100):
+        buffer.append(TelemetryResponse("A", "Car", "Track", 1, 3, 1.0 if 20 <= i < 40 else 0.0, 0.5, 10,
+                                        None, None, 1e9 + i / 10, None, i / 10, i))
+    buffer.write_csv(path)
+    [row] = analyze_export(path)
+    assert row["braking_segments"] == 1
+    assert row["laps"] == 0
+    assert row["best_lap_time_s"] is None
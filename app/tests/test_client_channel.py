@@ -0,0 +1,76 @@
+import asyncio
+import json
+
+import websockets
+
+from client_channel import ClientChannel, MIN_RATE, MAX_RATE
+
+
+def test_stalled_client_is_slowed_down():
+    """A client that stops reading blocks send(): its rate must drop instead of staying at 60 Hz"""
+
+    async def scenario():
+        channels = []
+
+        async def handler(websocket):
+            channel = ClientChannel(websocket, MAX_RATE)
+            channels.append(channel)
+            sender = asyncio.create_task(channel.run())
+            try:
+                await websocket.wait_closed()
+            finally:
+                sender.cancel()
+
+        async with websockets.serve(handler, "127.0.0.1", 0, compression=None, close_timeout=0.1) as server:
+            port = server.sockets[0].getsockname()[1]
+            # max_queue=1: the client stops reading the socket after one message
+            async with websockets.connect(f"ws://127.0.0.1:{port}", compression=None, max_queue=1, close_timeout=0.1):
+                while not channels:
+                    await asyncio.sleep(0.01)
+                channel = channels[0]
+                payload = json.dumps({"type": "telemetry", "data": "x" * 200_000})
+                for _ in range(120):
+                    channel.offer("telemetry", payload)
+                    channel.push(json.dumps({"type": "event"}), "event")
+                    await asyncio.sleep(1.0 / MAX_RATE)
+                return channel.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["slowdowns"] > 0
+    assert stats["behind"]
+    assert stats["sending"]
+    assert stats["rate"] == MIN_RATE
+    assert stats["skippedTicks"] > 0
+
+
+class FailingWebSocket:
+    """Connection whose sends fail, like a connection closed by the peer"""
+
+    remote_address = ("127.0.0.1", 1234)
+    transport = None
+
+    def __init__(self):
+        self.closed = False
+
+    async def send(self, message):
+        raise ConnectionResetError("peer went away")
+
+    async def close(self):
+        self.closed = True
+
+
+def test_failed_send_closes_the_connection():
+    async def scenario():
+        errors = []
+        asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+        websocket = FailingWebSocket()
+        channel = ClientChannel(websocket, MAX_RATE)
+        channel.push(json.dumps({"type": "event"}), "event")
+        # run() ends by itself instead of dying with the send error
+        await asyncio.wait_for(channel.run(), 1.0)
+        return websocket, channel, errors
+
+    websocket, channel, errors = asyncio.run(scenario())
+    assert websocket.closed
+    assert channel.sent == 0
+    assert not errors
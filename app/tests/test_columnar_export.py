@@ -0,0 +1,90 @@
+import io
+
+import numpy as np
+import pyarrow.feather as feather
+import pyarrow.parquet as pq
+import pytest
+from fastapi.testclient import TestClient
+
+import api
+from columnar_export import COLUMNS, export_session, lap_numbers, parse_laps, session_table
+from frames import FrameBuffer, TelemetryResponse
+
+LAP_LENGTH = 1000.0
+LAP_TIME = 20.0
+
+
+def write_recording(path: str, laps: int = 4, rate: float = 10.0):
+    """Laps at constant speed, the driver name changing after the second lap"""
+    buffer = FrameBuffer()
+    for i in range(int(laps * LAP_TIME * rate)):
+        et = i / rate
+        driver = "A" if et < 2 * LAP_TIME else "B"
+        lap_dist = (et / LAP_TIME) % 1.0 * LAP_LENGTH
+        buffer.append(TelemetryResponse(driver, "Car", "Track", 1, 3, 0.0, 1.0, 10, lap_dist, None,
+                                        1e9 + et, None, et, i))
+    buffer.write_binary(path)
+    return path
+
+
+@pytest.fixture
+def recording(tmp_path):
+    return write_recording(str(tmp_path / "session.frames"))
+
+
+def test_parse_laps():
+    assert parse_laps("3, 5-7,") == [(3, 3), (5, 7)]
+
+
+def test_lap_numbers_from_the_events_or_the_lap_distance():
+    frames = np.zeros(5, dtype=[("elapsed_time", "<f8"), ("lap_dist", "<f4")])
+    frames["elapsed_time"] = [0.0, 1.0, 2.0, 3.0, np.nan]
+    frames["lap_dist"] = [900.0, 950.0, 10.0, 50.0, np.nan]
+    assert lap_numbers(frames, [], np.array(["A"], dtype=object)).tolist() == [1, 1, 2, 2, -1]
+    events = [{"type": "stintProjection", "et": 1.5, "lap": 8}]
+    assert lap_numbers(frames, events, np.array(["A"], dtype=object)).tolist() == [7, 7, 8, 8, -1]
+
+
+def test_every_column_by_default(recording):
+    table = session_table(recording)
+    assert table.column_names == COLUMNS
+    assert table.num_rows == 800
+    drivers = table.column("driver_name").chunk(0)
+    assert drivers.dictionary.to_pylist() == ["A", "B"]
+    assert drivers.to_pylist()[::400] == ["A", "B"]
+    assert table.column("session_name").to_pylist()[0] == "Race_1"
+    assert table.column("corner").null_count == 800
+
+
+def test_channels_laps_and_time_range_selected(recording):
+    table = session_table(recording, ["lap", "brake_percent"], laps=[(2, 3)])
+    assert table.column_names == ["lap", "brake_percent"]
+    assert set(table.column("lap").to_pylist()) == {2, 3}
+    assert table.num_rows == 400
+    table = session_table(recording, ["elapsed_time"], start=10.0, end=11.0)
+    np.testing.assert_allclose(table.column("elapsed_time").to_numpy(), np.arange(100, 111) / 10)
+    with pytest.raises(ValueError):
+        session_table(recording, ["rpm"])
+
+
+@pytest.mark.parametrize("format", ["parquet", "arrow"])
+def test_export_round_trip(recording, tmp_path, format):
+    summary = export_session(recording, str(tmp_path / f"out.{format}"), format, ["timestamp", "lap_dist"])
+    table = pq.read_table(summary["filepath"]) if format == "parquet" else feather.read_table(summary["filepath"])
+    assert summary["rows"] == table.num_rows == 800
+    assert table.column_names == ["timestamp", "lap_dist"]
+
+
+def test_export_endpoint(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_recording("export/session.frames")
+    client = TestClient(api.app)
+    response = client.get("/recordings/session.frames/export", params={"channels": "lap,gear", "laps": "4"})
+    assert response.status_code == 200
+    table = pq.read_table(io.BytesIO(response.content))
+    assert set(table.column("lap").to_pylist()) == {4}
+    # The temporary file is removed once sent
+    assert sorted(p.name for p in (tmp_path / "export").iterdir()) == ["session.frames", "session.frames.json"]
+    assert client.get("/recordings/session.frames/export", params={"format": "csv"}).status_code == 400
+    assert client.get("/recordings/session.frames/export", params={"channels": "rpm"}).status_code == 400
+    assert client.get("/recordings/missing.frames/export").status_code == 404
@@ -0,0 +1,39 @@
+import types
+
+from damage import DamageMonitor
+from rF2data import rF2Telemetry, rF2Scoring, rF2Extended
+
+
+def fake_sim_info(ids):
+    sim_info = types.SimpleNamespace(Rf2Tele=rF2Telemetry(), Rf2Scor=rF2Scoring(), Rf2Ext=rF2Extended())
+    set_vehicles(sim_info, ids)
+    return sim_info
+
+
+def set_vehicles(sim_info, ids):
+    sim_info.Rf2Tele.mNumVehicles = len(ids)
+    for slot, vehicle_id in enumerate(ids):
+        sim_info.Rf2Tele.mVehicles[slot].mID = vehicle_id
+    sim_info.Rf2Tele.mVersionUpdateEnd += 1
+
+
+def test_removed_vehicles_are_reported():
+    sim_info = fake_sim_info([10, 11, 12])
+    monitor = DamageMonitor(sim_info)
+    first = monitor.poll()
+    assert first["vehicleIds"] == [10, 11, 12]
+    assert first["removed"] == []
+
+    set_vehicles(sim_info, [10, 12])
+    message = monitor.poll()
+    assert message["removed"] == [11]
+    assert message["vehicleIds"] == [12]  # moved to slot 1
+
+    set_vehicles(sim_info, [10])
+    message = monitor.poll()
+    assert message["removed"] == [12]
+    assert message["vehicleIds"] == []
+    assert monitor.to_dict()["vehicleIds"] == [10]
+
+    set_vehicles(sim_info, [10])
+    assert monitor.poll() is None
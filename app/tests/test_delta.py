@@ -0,0 +1,85 @@
+import numpy as np
+import pytest
+
+from delta import DeltaEngine, ReferenceLap, TRACE_CHANNELS
+
+LAP_LENGTH = 1000.0
+RATE = 20.0
+
+
+def drive(engine: DeltaEngine, lap: int, start: float, lap_time: float, until: float = 1.0):
+    """A lap at constant speed, up to the given fraction of the lap"""
+    deltas = []
+    for i in range(int(lap_time * until * RATE) + 1):
+        t = i / RATE
+        speed = LAP_LENGTH / lap_time
+        values = [speed, 1.0, 0.0, 0.0, 4, t, 0.0]
+        deltas.append(engine.update(lap, start, start + t, min(t * speed, LAP_LENGTH), values))
+    return deltas
+
+
+def test_no_delta_before_a_reference_lap():
+    engine = DeltaEngine(LAP_LENGTH)
+    assert set(drive(engine, 1, 0.0, 50.0)) == {None}
+    assert engine.to_dict()["delta"] is None
+
+
+def test_completed_lap_becomes_the_reference_on_its_grid():
+    engine = DeltaEngine(LAP_LENGTH)
+    drive(engine, 1, 0.0, 50.0)
+    drive(engine, 2, 50.0, 55.0, until=0.5)
+    reference = engine.reference
+    assert reference is engine.best
+    assert reference.lap_number == 1
+    assert reference.lap_time == pytest.approx(50.0)
+    assert len(reference.times) == engine.num_points
+    np.testing.assert_allclose(reference.times, np.linspace(0.0, 50.0, engine.num_points), atol=1e-6)
+    # 10 % slower at constant speed: 2.5 s down at half distance
+    assert engine.delta == pytest.approx(2.5, abs=0.1)
+    message = engine.to_dict()
+    assert message["bestLap"] == 1
+    assert message["trace"]["speed"] == pytest.approx(20.0)
+    assert set(message["trace"]) == set(TRACE_CHANNELS)
+
+
+def test_reference_swapped_only_on_a_faster_complete_lap():
+    engine = DeltaEngine(LAP_LENGTH)
+    drive(engine, 1, 0.0, 50.0)
+    drive(engine, 2, 50.0, 55.0)
+    drive(engine, 3, 105.0, 45.0)
+    assert engine.best.lap_number == 1
+    # Lap 3 is faster: it is the reference from the start of lap 4
+    drive(engine, 4, 150.0, 50.0, until=0.4)
+    assert engine.best.lap_number == 3
+    assert engine.delta == pytest.approx(2.0, abs=0.1)
+    # An interrupted lap (pit entry) is never a reference, however short
+    drive(engine, 5, 200.0, 50.0, until=0.3)
+    drive(engine, 6, 215.0, 50.0, until=0.1)
+    assert engine.best.lap_number == 3
+
+
+def test_pinned_reference_survives_a_personal_best():
+    engine = DeltaEngine(LAP_LENGTH)
+    pinned = ReferenceLap(0, 40.0, np.linspace(0.0, 40.0, engine.num_points), source="fast.npz")
+    engine.set_reference(pinned)
+    drive(engine, 1, 0.0, 50.0)
+    drive(engine, 2, 50.0, 50.0, until=0.5)
+    assert engine.reference is pinned
+    assert engine.best.lap_number == 1
+    assert engine.delta == pytest.approx(5.0, abs=0.1)
+    assert engine.to_dict()["reference"] == "fast.npz"
+    engine.clear_reference()
+    assert engine.reference is engine.best
+
+
+def test_reference_on_another_grid_rejected():
+    engine = DeltaEngine(LAP_LENGTH)
+    with pytest.raises(ValueError):
+        engine.set_reference(ReferenceLap(0, 40.0, np.zeros(10)))
+
+
+def test_lap_distance_outside_the_lap_gives_no_delta():
+    engine = DeltaEngine(LAP_LENGTH)
+    drive(engine, 1, 0.0, 50.0)
+    assert engine.update(2, 50.0, 51.0, -5.0) is None
+    assert engine.update(2, 50.0, 51.0, LAP_LENGTH + 1) is None
@@ -0,0 +1,20 @@
+import pytest
+
+from dsp import Operator, default_channels
+from topics import DERIVED_CHANNELS
+
+
+def test_default_channels_are_opt_in_topics():
+    assert {channel.name for channel in default_channels()} == DERIVED_CHANNELS
+
+
+def test_operator_is_abstract():
+    with pytest.raises(TypeError):
+        Operator()
+
+    class Incomplete(Operator):
+        def reset(self, width: int):
+            pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
@@ -0,0 +1,90 @@
+import ctypes
+import types
+
+import pytest
+
+from events import EventEngine, MIN_IMPACT_MAGNITUDE
+from rF2data import rF2Telemetry, rF2Scoring
+
+
+@pytest.fixture
+def sim_info():
+    info = types.SimpleNamespace(Rf2Tele=rF2Telemetry(), Rf2Scor=rF2Scoring())
+    info.Rf2Scor.mScoringInfo.mNumVehicles = 2
+    info.Rf2Tele.mNumVehicles = 2
+    for slot, (vehicle_id, name) in enumerate([(3, "Hugo"), (8, "Léa")]):
+        info.Rf2Scor.mVehicles[slot].mID = vehicle_id
+        info.Rf2Scor.mVehicles[slot].mDriverName = (ctypes.c_ubyte * 32)(*name.encode())
+        info.Rf2Tele.mVehicles[slot].mID = vehicle_id
+    return info
+
+
+def bump(buffer):
+    """New shared memory update"""
+    buffer.mVersionUpdateBegin += 1
+    buffer.mVersionUpdateEnd += 1
+
+
+def test_first_poll_only_takes_the_snapshot(sim_info):
+    engine = EventEngine(sim_info)
+    sim_info.Rf2Scor.mVehicles[0].mInPits = 1
+    assert engine.poll() == []
+
+
+def test_scoring_changes_become_vehicle_events(sim_info):
+    engine = EventEngine(sim_info)
+    engine.poll()
+    vehicles = sim_info.Rf2Scor.mVehicles
+    vehicles[0].mInPits = 1
+    vehicles[0].mNumPitstops = 1
+    vehicles[1].mTotalLaps = 5
+    vehicles[1].mLastLapTime = 211.4567
+    sim_info.Rf2Scor.mScoringInfo.mCurrentET = 1200.0
+    # Nothing is diffed until the buffer version moves
+    assert engine.poll() == []
+    bump(sim_info.Rf2Scor)
+    events = engine.poll()
+    assert {(e["event"], e["driverName"]) for e in events} == {("pitEntry", "Hugo"), ("pitStop", "Hugo"),
+                                                               ("lapCompleted", "Léa")}
+    lap = next(e for e in events if e["event"] == "lapCompleted")
+    assert lap == {"type": "event", "event": "lapCompleted", "et": 1200.0, "vehicleId": 8,
+                   "driverName": "Léa", "lap": 5, "lapTime": 211.457}
+    vehicles[0].mInPits = 0
+    bump(sim_info.Rf2Scor)
+    assert [e["event"] for e in engine.poll()] == ["pitExit"]
+
+
+def test_reused_slot_is_not_an_event(sim_info):
+    engine = EventEngine(sim_info)
+    engine.poll()
+    # Another car joins in the slot of a car that left
+    sim_info.Rf2Scor.mVehicles[1].mID = 12
+    sim_info.Rf2Scor.mVehicles[1].mTotalLaps = 30
+    bump(sim_info.Rf2Scor)
+    assert engine.poll() == []
+
+
+def test_only_significant_impacts_reported(sim_info):
+    engine = EventEngine(sim_info)
+    engine.poll()
+    telemetry = sim_info.Rf2Tele.mVehicles
+    telemetry[0].mLastImpactET = 10.0
+    telemetry[0].mLastImpactMagnitude = MIN_IMPACT_MAGNITUDE / 2
+    telemetry[1].mLastImpactET = 11.0
+    telemetry[1].mLastImpactMagnitude = 2500.0
+    bump(sim_info.Rf2Tele)
+    [impact] = engine.poll()
+    assert impact["event"] == "impact"
+    assert (impact["vehicleId"], impact["driverName"], impact["magnitude"]) == (8, "Léa", 2500.0)
+
+
+def test_session_and_flag_changes(sim_info):
+    engine = EventEngine(sim_info)
+    engine.poll()
+    sim_info.Rf2Scor.mScoringInfo.mYellowFlagState = 1
+    sim_info.Rf2Scor.mScoringInfo.mSectorFlag[1] = 1
+    bump(sim_info.Rf2Scor)
+    events = {e["event"]: e for e in engine.poll()}
+    assert set(events) == {"yellowFlagStateChange", "sectorFlagsChange"}
+    assert events["sectorFlagsChange"]["previous"] == [0, 0, 0]
+    assert events["sectorFlagsChange"]["value"] == [0, 1, 0]
@@ -0,0 +1,79 @@
+import csv
+
+import numpy as np
+import pytest
+
+from frames import FrameBuffer, TelemetryResponse, FRAME_STRUCT, CSV_HEADERS, get_session_name, record_to_frame
+
+
+def frame(i: int, driver: str = "A", lap_dist=None) -> TelemetryResponse:
+    return TelemetryResponse(driver, "Car", "Track", 2, 4, 0.0, 1.0, 10, lap_dist, None,
+                             1e9 + i / 10, 7, 100.0 + i / 10, i)
+
+
+def test_frame_has_no_instance_dict():
+    with pytest.raises(AttributeError):
+        frame(0).extra = 1
+
+
+def test_bytes_round_trip_keeps_the_record_layout():
+    original = TelemetryResponse("A", "Car", "Track", 2, -1, 0.3, 0.75, 10, 1234.5, 3, 1e9, None, 100.25, 42)
+    data = original.to_bytes()
+    assert len(data) == FRAME_STRUCT.size
+    decoded = TelemetryResponse.from_bytes(data, "A", "Car", "Track")
+    assert decoded.to_dict(full_precision=False) == original.to_dict(full_precision=False)
+    assert (decoded.gear, decoded.corner, decoded.version) == (-1, 3, 42)
+    # Unknown values survive as None rather than NaN
+    unknown = TelemetryResponse.from_bytes(frame(0).to_bytes())
+    assert unknown.lap_dist is None and unknown.corner is None
+
+
+def test_names_only_sent_through_the_session_metadata():
+    message = frame(0).to_dict()
+    assert "driverName" not in message and "driver_name" not in message
+    assert message["metadataId"] == 7
+    assert (message["brake"], message["throttle"]) == (0.0, 1.0)
+
+
+def test_buffer_grows_in_chunks_and_keeps_name_ranges():
+    buffer = FrameBuffer(chunk_size=4)
+    for i in range(10):
+        buffer.append(frame(i, "A" if i < 6 else "B"))
+    buffer.add_event({"type": "event", "event": "pit"})
+    assert len(buffer) == 10
+    assert buffer.nbytes == 10 * FRAME_STRUCT.size
+    records = buffer.to_array()
+    np.testing.assert_allclose(records["elapsed_time"], 100.0 + np.arange(10) / 10)
+    assert list(buffer.names()) == [(0, 6, "A", "Car", "Track"), (6, 10, "B", "Car", "Track")]
+    assert record_to_frame(records[7], "B", "Car", "Track", timestamp=5.0).to_dict() == \
+        TelemetryResponse("B", "Car", "Track", 2, 4, 0.0, 1.0, 10, None, None, 5.0, None, 100.7, 7).to_dict()
+
+
+def test_binary_and_csv_files(tmp_path):
+    buffer = FrameBuffer(chunk_size=4)
+    for i in range(6):
+        buffer.append(frame(i, lap_dist=i * 10.0))
+    buffer.add_event({"type": "event", "event": "pit"})
+    path = str(tmp_path / "session.frames")
+    buffer.write_binary(path)
+    records, names = FrameBuffer.read_binary(path)
+    np.testing.assert_array_equal(records, buffer.to_array())
+    assert names == [(0, 6, "A", "Car", "Track")]
+
+    buffer.write_csv(str(tmp_path / "session.csv"))
+    with open(tmp_path / "session.csv", newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == CSV_HEADERS
+    assert len(rows) == 7
+    assert rows[1][2] == get_session_name(10) == "Race_1"
+    assert rows[1][4:6] == ["0.0", "100.0"]
+    assert rows[1][0].endswith("Z")
+
+
+def test_clear_empties_the_buffer():
+    buffer = FrameBuffer()
+    buffer.append(frame(0))
+    buffer.clear()
+    assert len(buffer) == 0
+    assert len(buffer.to_array()) == 0
+    assert list(buffer.names()) == []
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+
+import lap_matrix
+from frames import FrameBuffer, TelemetryResponse
+from lap_matrix import LapMatrix
+
+LAP_LENGTH = 1000.0
+
+
+def write_recording(path: str, driver: str, lap_time: float, laps: int = 3, rate: float = 20.0):
+    """Laps at constant speed, the lap distance wrapping at the line"""
+    buffer = FrameBuffer()
+    for i in range(int(laps * lap_time * rate)):
+        et = i / rate
+        lap_dist = (et / lap_time) % 1.0 * LAP_LENGTH
+        buffer.append(TelemetryResponse(driver, "Car", "Track", 1, 3, 0.0, 1.0, 10, lap_dist, -1,
+                                        1e9 + et, None, et, i))
+    buffer.write_binary(path)
+
+
+@pytest.fixture
+def recordings(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "export").mkdir()
+    write_recording("export/a.frames", "A", 50.0)
+    write_recording("export/b.frames", "B", 40.0)
+    return "export"
+
+
+def test_build_streams_one_recording_at_a_time(recordings, monkeypatch):
+    calls = []
+    read_binary, lap_rows = FrameBuffer.read_binary, lap_matrix.lap_rows
+    monkeypatch.setattr(lap_matrix.FrameBuffer, "read_binary", lambda path: calls.append("read") or read_binary(path))
+    monkeypatch.setattr(lap_matrix, "lap_rows", lambda *args: calls.append("rows") or lap_rows(*args))
+    matrix = LapMatrix.build([recordings], bin_size=10.0, output="export/m.lapm")
+    assert calls == ["read", "rows", "read", "rows"]
+    assert isinstance(matrix.values, np.memmap)
+    assert matrix.drivers == ["A", "B"]
+    # The first lap starts at the recording start: only the laps after a line crossing are complete
+    assert len(matrix) >= 4
+    expected = np.where(matrix.laps["driver"] == 0, 50.0, 40.0)
+    np.testing.assert_allclose(matrix.laps["lap_time"], expected, atol=0.1)
+
+
+def test_build_in_memory_matches_file(recordings):
+    in_memory = LapMatrix.build([recordings], bin_size=10.0)
+    mapped = LapMatrix.build([recordings], bin_size=10.0, output="export/m.lapm")
+    np.testing.assert_array_equal(in_memory.values, np.asarray(mapped.values))
+    assert in_memory.lap_length == pytest.approx(LAP_LENGTH, abs=5.0)
@@ -0,0 +1,88 @@
+import pytest
+
+from lap_stats import LapStatsEngine, BRAKE_ZONE_ON_THRESHOLD
+from rF2data import rF2VehicleTelemetry
+
+RATE = 10.0
+
+
+def sample(et: float, lap: int, lap_start: float, speed: float = 50.0, throttle: float = 1.0, brake: float = 0.0,
+           fuel: float = 50.0, sector: int = 0, lateral: float = 0.0, tyre_kelvin: float = 353.15):
+    telemetry = rF2VehicleTelemetry()
+    telemetry.mElapsedTime = et
+    telemetry.mLapNumber = lap
+    telemetry.mLapStartET = lap_start
+    telemetry.mLocalVel.z = -speed
+    telemetry.mLocalAccel.x = lateral
+    telemetry.mFilteredThrottle = throttle
+    telemetry.mFilteredBrake = brake
+    telemetry.mFuel = fuel
+    telemetry.mCurrentSector = sector
+    for wheel in telemetry.mWheels:
+        wheel.mTemperature[:] = [tyre_kelvin] * 3
+    return telemetry
+
+
+def drive_lap(engine: LapStatsEngine, lap: int, start: float, duration: float, fuel: float):
+    """One lap at full throttle with a single braking zone in the middle, burning 2 l"""
+    summaries = []
+    steps = int(duration * RATE)
+    for i in range(steps):
+        braking = steps // 2 <= i < steps // 2 + 5
+        summaries.append(engine.update(sample(
+            start + i / RATE, lap, start, speed=30.0 if braking else 60.0,
+            throttle=0.0 if braking else 1.0, brake=0.8 if braking else 0.0,
+            fuel=fuel - 2.0 * i / steps, sector=i * 3 // steps, lateral=10.0 if braking else 0.0)))
+    return [s for s in summaries if s is not None]
+
+
+def test_summary_emitted_when_the_lap_number_changes():
+    engine = LapStatsEngine()
+    assert drive_lap(engine, 1, 0.0, 60.0, 50.0) == []
+    [summary] = drive_lap(engine, 2, 60.0, 60.0, 48.0)
+    assert engine.last_summary is summary
+    assert summary["type"] == "lapStats"
+    assert summary["lap"] == 1
+    assert summary["lapTime"] == pytest.approx(60.0)
+    assert summary["brakeZones"] == 1
+    assert summary["maxSpeedKmh"] == pytest.approx(216.0)
+    assert summary["minCornerSpeedKmh"] == pytest.approx(108.0)
+    assert summary["fullThrottleTime"] == pytest.approx(59.4, abs=0.2)
+    assert summary["fuelUsed"] == pytest.approx(2.0, abs=0.05)
+    assert summary["tyreTempAvg"] == [pytest.approx(80.0, abs=0.5)] * 4
+    assert [sector["samples"] for sector in summary["sectors"]] == [200, 200, 200]
+    # The next lap starts from empty aggregates
+    assert engine.current()["lap"] == 2
+    assert engine.current()["brakeZones"] == 1
+
+
+def test_refuelling_does_not_cancel_consumption():
+    engine = LapStatsEngine()
+    engine.update(sample(0.0, 1, 0.0, fuel=10.0))
+    engine.update(sample(0.1, 1, 0.0, fuel=9.0))
+    engine.update(sample(0.2, 1, 0.0, fuel=60.0))
+    engine.update(sample(0.3, 1, 0.0, fuel=59.5))
+    assert engine.current()["fuelUsed"] == pytest.approx(1.5)
+
+
+def test_brake_zone_counted_once_until_released():
+    engine = LapStatsEngine()
+    for i, brake in enumerate([0.0, 0.5, 0.05, 0.5, 0.0, BRAKE_ZONE_ON_THRESHOLD]):
+        engine.update(sample(i / RATE, 1, 0.0, brake=brake))
+    # 0.05 is above the release threshold: the second press belongs to the same zone
+    assert engine.current()["brakeZones"] == 2
+
+
+def test_going_back_in_time_resets_the_lap():
+    engine = LapStatsEngine()
+    drive_lap(engine, 3, 100.0, 10.0, 50.0)
+    # Session restart: the clock goes back, no summary for the interrupted lap
+    assert engine.update(sample(0.0, 0, 0.0)) is None
+    assert engine.current()["lap"] == 0
+    assert engine.current()["samples"] == 1
+
+
+def test_pit_lane_sector_flag_is_masked():
+    engine = LapStatsEngine()
+    engine.update(sample(0.0, 1, 0.0, sector=0x80000002 - (1 << 32)))
+    assert [sector["samples"] for sector in engine.current()["sectors"]] == [0, 0, 1]
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import time
+
+import numpy as np
+import websockets
+
+from frames import FrameBuffer, TelemetryResponse
+from loadtest import _percentiles, compare, run_swarm, source_rate
+
+
+async def fake_server(websocket):
+    """Probe then frame of every telemetry update at 50 Hz, clientStats on request"""
+    requests = []
+
+    async def receive():
+        async for message in websocket:
+            requests.append(json.loads(message))
+            if requests[-1]["type"] == "getStats":
+                await websocket.send(json.dumps({"type": "clientStats", "requests": requests[:2]}))
+
+    receiver = asyncio.create_task(receive())
+    try:
+        version = 0
+        while True:
+            version += 1
+            await websocket.send(json.dumps({"type": "probe", "telemetryVersion": version, "readAt": time.time()}))
+            await asyncio.sleep(0.002)
+            await websocket.send(json.dumps({"metadataId": 0, "gear": 3, "telemetryVersion": version}))
+            await asyncio.sleep(0.018)
+    except websockets.exceptions.ConnectionClosed:
+        pass
+    finally:
+        receiver.cancel()
+
+
+def test_swarm_measures_frames_latency_and_server_stats():
+    async def scenario():
+        async with websockets.serve(fake_server, "127.0.0.1", 0) as server:
+            url = f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+            now = time.time()
+            return await run_swarm(url, 5, 30.0, now + 0.2, now + 1.2)
+
+    result = asyncio.run(scenario())
+    assert (result["connected"], result["failed"], result["errors"]) == (5, 0, 0)
+    # About 50 frames per client in the 1 s measurement window, each matched with its probe
+    assert 150 <= result["frames"] <= 300
+    assert len(result["latencies"]) >= result["frames"] - 5
+    assert 0.0 < np.median(result["latencies"]) < 0.05
+    assert len(result["stats"]) == 5
+    assert result["stats"][0]["requests"] == [{"type": "subscribe", "topics": ["telemetry", "probe"]},
+                                              {"type": "setRate", "rate": 30.0}]
+
+
+def test_unreachable_server_counted_as_failed():
+    result = asyncio.run(run_swarm("ws://127.0.0.1:9", 3, 30.0, time.time(), time.time() + 0.5))
+    assert (result["connected"], result["failed"]) == (0, 3)
+
+
+def test_percentiles():
+    assert _percentiles(np.array([]))["p50"] is None
+    stats = _percentiles(np.arange(1, 101, dtype=float))
+    assert (stats["samples"], stats["p50"], stats["max"]) == (100, 50.5, 100.0)
+
+
+def test_source_rate(tmp_path):
+    buffer = FrameBuffer()
+    for i in range(101):
+        buffer.append(TelemetryResponse("A", "Car", "Track", 1, 3, 0.0, 1.0, 10, None, None, 1e9 + i / 50, None, None, i))
+    buffer.write_binary(str(tmp_path / "session.frames"))
+    assert source_rate(str(tmp_path / "session.frames")) == 50.0
+
+
+def test_compare_only_shared_client_counts(capsys):
+    def step(clients, p50):
+        return {"clients": clients, "latencyMs": {"p50": p50, "p95": p50 * 2, "p99": p50 * 3},
+                "throughput": {"framesPerS": 100.0}, "frames": {"droppedRatio": 0.0},
+                "server": {"cpuPercent": 10.0, "rssMb": 50.0}}
+
+    compare({"steps": [step(10, 2.0), step(50, 4.0)]}, {"steps": [step(10, 3.0), step(100, 5.0)]})
+    output = capsys.readouterr().out
+    assert "10 clients" in output and "100 clients" not in output
+    assert "+50.0 %" in output
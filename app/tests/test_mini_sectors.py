@@ -0,0 +1,93 @@
+import types
+
+import numpy as np
+import pytest
+
+from mini_sectors import MiniSectorEngine
+from rF2data import rF2Scoring
+
+LAP_LENGTH = 1000.0
+SPEEDS = {3: 50.0, 8: 40.0}
+
+
+@pytest.fixture
+def sim_info():
+    info = types.SimpleNamespace(Rf2Scor=rF2Scoring())
+    info.Rf2Scor.mScoringInfo.mLapDist = LAP_LENGTH
+    info.Rf2Scor.mScoringInfo.mNumVehicles = len(SPEEDS)
+    for slot, vehicle_id in enumerate(SPEEDS):
+        info.Rf2Scor.mVehicles[slot].mID = vehicle_id
+    return info
+
+
+def scoring_update(sim_info, et: float, distances):
+    scoring = sim_info.Rf2Scor
+    scoring.mVersionUpdateEnd += 1
+    scoring.mScoringInfo.mCurrentET = et
+    for slot, dist in enumerate(distances):
+        scoring.mVehicles[slot].mLapDist = dist
+
+
+def drive(engine, sim_info, start: float, end: float, rate: float = 5.0):
+    """Constant speed laps for both cars, scoring updates at rate"""
+    messages = []
+    for et in np.arange(round(start * rate), round(end * rate)) / rate:
+        scoring_update(sim_info, et, [(et * speed + 3.0) % LAP_LENGTH for speed in SPEEDS.values()])
+        message = engine.poll()
+        if message is not None:
+            messages.append(message)
+    return messages
+
+
+def test_every_boundary_timed_across_the_line(sim_info):
+    engine = MiniSectorEngine(sim_info, count=10)
+    messages = drive(engine, sim_info, 0.0, 60.0)
+    assert messages[0]["type"] == "miniSectors"
+    # 100 m mini-sectors at 50 and 40 m/s, several boundaries per update for none of them
+    np.testing.assert_allclose(engine.last[0, :10], 2.0, atol=1e-6)
+    np.testing.assert_allclose(engine.last[1, :10], 2.5, atol=1e-6)
+    np.testing.assert_allclose(engine.session_best, 2.0, atol=1e-6)
+    table = engine.to_dict()
+    assert table["vehicleIds"] == [3, 8]
+    assert table["best"][1] == [2.5] * 10
+
+
+def test_only_the_changed_cells_are_sent(sim_info):
+    engine = MiniSectorEngine(sim_info, count=10)
+    drive(engine, sim_info, 0.0, 10.0)
+    # Same buffer version: nothing new
+    assert engine.poll() is None
+    # Only the first car reaches 600 m between 11.8 and 12.0 s
+    message = drive(engine, sim_info, 10.0, 12.2)[-1]
+    assert (message["et"], message["vehicleIds"], message["sectors"]) == (12.0, [3], [5])
+    assert message["personalBest"] == [True] and message["sessionBest"] == [True]
+    # The same time on the next lap is no improvement
+    message = drive(engine, sim_info, 12.2, 32.2)[-1]
+    assert (message["et"], message["vehicleIds"], message["sectors"]) == (32.0, [3], [5])
+    assert message["personalBest"] == [False] and message["sessionBest"] == [False]
+
+
+def test_several_boundaries_crossed_between_two_updates(sim_info):
+    engine = MiniSectorEngine(sim_info, count=100)
+    drive(engine, sim_info, 0.0, 45.0)
+    # 10 m mini-sectors passed at up to 5 per update: all timed, interpolated between updates
+    np.testing.assert_allclose(engine.last[0], 0.2, atol=1e-6)
+    np.testing.assert_allclose(engine.last[1], 0.25, atol=1e-6)
+
+
+def test_teleported_car_restarts_its_timing(sim_info):
+    engine = MiniSectorEngine(sim_info, count=10)
+    drive(engine, sim_info, 0.0, 5.0)
+    # Back to the garage: no mini-sector time for the jump, timing restarts at the next boundary
+    scoring_update(sim_info, 5.0, [600.0, 203.0])
+    engine.poll()
+    scoring_update(sim_info, 5.2, [610.0, 211.0])
+    assert engine.poll() is None
+
+
+def test_session_restart_resets_the_tables(sim_info):
+    engine = MiniSectorEngine(sim_info, count=10)
+    drive(engine, sim_info, 0.0, 30.0)
+    scoring_update(sim_info, 1.0, [0.0, 0.0])
+    engine.poll()
+    assert np.isnan(engine.best).all()
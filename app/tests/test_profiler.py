@@ -0,0 +1,12 @@
+import asyncio
+
+import pytest
+
+from profiler import run_profile
+
+
+@pytest.mark.parametrize("seconds, interval", [(float("nan"), 0.01), (float("inf"), 0.01),
+                                               (1.0, float("nan")), (1.0, float("inf")), (1.0, 0.0)])
+def test_invalid_profile_rejected(seconds, interval):
+    with pytest.raises(ValueError):
+        asyncio.run(run_profile(seconds, interval))
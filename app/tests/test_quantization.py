@@ -0,0 +1,14 @@
+import numpy as np
+import pytest
+
+from quantization import PROFILES, quantizer
+
+
+@pytest.mark.parametrize("channel", ["tyre_temp", "brake_temp"])
+def test_temperatures_use_the_temperature_profile(channel):
+    q = quantizer(channel)
+    assert q is PROFILES["temperature"]
+    assert q.dtype == np.dtype("<i2")
+    values = np.linspace(250.0, 1200.0, 10001)
+    assert np.abs(q.decode(q.encode(values)) - values).max() <= 0.05 + 1e-9
+    assert quantizer(channel, full_precision=True) is PROFILES["full"]
@@ -0,0 +1,48 @@
+import numpy as np
+
+from delta import ReferenceLap, TRACE_CHANNELS
+from reference_lap import ReferenceLapFile, write_personal_best, saved_lap_time
+
+POINTS = 51
+
+
+def lap(lap_time: float, lap_number: int = 1) -> ReferenceLap:
+    times = np.linspace(0.0, lap_time, POINTS)
+    return ReferenceLap(lap_number, lap_time, times, np.zeros((len(TRACE_CHANNELS), POINTS)))
+
+
+def write(path, reference: ReferenceLap) -> bool:
+    return write_personal_best(str(path), reference, 100.0, 2.0, "Track", "Car", "Driver")
+
+
+def test_slower_lap_keeps_the_saved_best(tmp_path):
+    path = tmp_path / "best.lap"
+    assert saved_lap_time(str(path)) is None
+    assert write(path, lap(90.0, 3))
+    # First lap of a new session, slower than the best of an earlier one
+    assert not write(path, lap(95.0, 1))
+    assert saved_lap_time(str(path)) == 90.0
+    assert write(path, lap(89.5, 2))
+    with ReferenceLapFile.open(str(path)) as saved:
+        assert saved.metadata["lapNumber"] == 2
+        assert saved.channel("lap_time")[-1] == 89.5
+
+
+def test_import_never_replaces_a_personal_best(tmp_path, monkeypatch):
+    from fastapi.testclient import TestClient
+
+    import api
+    from reference_lap import encode_reference_lap, reference_lap_path, MAX_IMPORT_BYTES
+
+    monkeypatch.chdir(tmp_path)
+    client = TestClient(api.app)
+    personal_best = reference_lap_path("Track", "Car", "Driver")
+    assert write(personal_best, lap(90.0))
+    data = encode_reference_lap(lap(80.0), 100.0, 2.0, "Track", "Car", "Driver")
+
+    response = client.post("/reference-laps", content=data)
+    assert response.status_code == 200
+    assert response.json()["name"] == "Track_Car_Driver_imported.lap"
+    assert saved_lap_time(personal_best) == 90.0
+    assert client.post("/reference-laps", content=data).status_code == 409
+    assert client.post("/reference-laps", content=b"\0" * (MAX_IMPORT_BYTES + 1)).status_code == 413
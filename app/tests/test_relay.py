@@ -0,0 +1,86 @@
+import asyncio
+import json
+import zlib
+
+import pytest
+import websockets
+
+from client_channel import MESSAGE, STREAM
+from relay import RelayServer, UpstreamLink, UPSTREAM_PATH, HEADERS_ARGUMENT, encode_batch, decode_batch
+
+
+def relay_scenario(client):
+    """Run the client coroutine against a relay listening on a free port"""
+
+    async def scenario():
+        relay = RelayServer("secret")
+        async with websockets.serve(relay.handle, "127.0.0.1", 0, compression=None, close_timeout=0.1,
+                                    process_request=relay.process_request) as server:
+            port = server.sockets[0].getsockname()[1]
+            return relay, await client(f"ws://127.0.0.1:{port}", relay)
+
+    return asyncio.run(scenario())
+
+
+def test_relay_requires_a_token():
+    with pytest.raises(ValueError):
+        RelayServer("")
+
+
+@pytest.mark.parametrize("headers", [{}, {"Authorization": "Bearer wrong"}])
+def test_upstream_without_the_token_is_refused_on_handshake(headers):
+    async def client(url, relay):
+        with pytest.raises(websockets.exceptions.InvalidStatus) as refused:
+            async with websockets.connect(url + UPSTREAM_PATH, **{HEADERS_ARGUMENT: headers}):
+                pass
+        return refused.value.response.status_code
+
+    relay, status = relay_scenario(client)
+    assert status == 401
+    assert relay.batches == 0
+
+
+def test_upstream_with_the_token_is_fanned_out():
+    async def client(url, relay):
+        async with websockets.connect(url + "/ws", close_timeout=0.1) as viewer:
+            link = UpstreamLink(url + UPSTREAM_PATH, "secret")
+            link.push(json.dumps({"type": "event", "event": "lapCompleted"}), "event")
+            sender = asyncio.create_task(link.run())
+            try:
+                return json.loads(await asyncio.wait_for(viewer.recv(), 2.0)), link.connections
+            finally:
+                sender.cancel()
+
+    relay, (received, connections) = relay_scenario(client)
+    assert received == {"type": "event", "event": "lapCompleted"}
+    assert connections == 1
+    assert relay.batches >= 1
+
+
+def test_batches_share_the_compression_dictionary():
+    compressor, decompressor = zlib.compressobj(), zlib.decompressobj()
+    frame = json.dumps({"metadataId": 0, "gear": 4, "brake": 0.0, "throttle": 1.0, "lapDist": 1234.5})
+    batches = [[(STREAM, "telemetry", frame), (MESSAGE, None, "{}"), (MESSAGE, "event", "é")] for _ in range(3)]
+    encoded = [encode_batch(compressor, batch) for batch in batches]
+    assert [decode_batch(decompressor, data) for data in encoded] == batches
+    # Later batches only refer back to the first one
+    assert len(encoded[2]) < len(encoded[0]) / 2
+
+
+def test_late_client_gets_the_session_metadata_first():
+    metadata = json.dumps({"type": "sessionMetadata", "id": 0, "driverName": "Hugo"})
+
+    async def client(url, relay):
+        link = UpstreamLink(url + UPSTREAM_PATH, "secret")
+        link.push(metadata, "sessionMetadata")
+        sender = asyncio.create_task(link.run())
+        try:
+            while relay.metadata is None:
+                await asyncio.sleep(0.01)
+            async with websockets.connect(url + "/ws", close_timeout=0.1) as viewer:
+                return await asyncio.wait_for(viewer.recv(), 2.0)
+        finally:
+            sender.cancel()
+
+    relay, received = relay_scenario(client)
+    assert received == metadata == relay.metadata
@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from frames import TelemetryResponse
+from resample import Resampler
+
+
+def frame(et, brake: float = 0.0, lap_dist=None, gear: int = 3) -> TelemetryResponse:
+    return TelemetryResponse("A", "Car", "Track", 1, gear, brake, 1.0, 10, lap_dist, None, 1e9 + (et or 0), 0, et, 1)
+
+
+def test_jittered_input_comes_out_on_a_uniform_grid():
+    rng = np.random.default_rng(1)
+    resampler = Resampler(50.0)
+    times = np.cumsum(rng.uniform(0.005, 0.03, 2000)) + 10.0
+    output = []
+    for et in times:
+        output += resampler.add(frame(float(et), brake=float(et % 1.0)))
+    out_times = np.array([f.elapsed_time for f in output])
+    # Multiples of 1/rate computed from an integer index: no drift over 2000 frames
+    np.testing.assert_array_equal(out_times, np.arange(np.ceil(times[0] * 50), np.floor(times[-1] * 50) + 1) / 50)
+    brake = np.array([f.brake for f in output])
+    continuous = (out_times % 1.0 > 0.05) & (out_times % 1.0 < 0.95)
+    np.testing.assert_allclose(brake[continuous], out_times[continuous] % 1.0, atol=1e-9)
+
+
+def test_pedals_interpolated_and_discrete_fields_held():
+    resampler = Resampler(10.0)
+    assert [f.elapsed_time for f in resampler.add(frame(1.0, brake=0.0, gear=3))] == [1.0]
+    [out] = resampler.add(frame(1.15, brake=0.6, gear=4))
+    assert out.elapsed_time == pytest.approx(1.1)
+    assert out.brake == pytest.approx(0.4)
+    assert out.gear == 3
+
+
+def test_lap_distance_not_interpolated_across_the_line():
+    resampler = Resampler(10.0)
+    resampler.add(frame(1.0, lap_dist=13560.0))
+    crossing = resampler.add(frame(1.2, lap_dist=20.0))
+    assert [f.lap_dist for f in crossing] == [13560.0, 20.0]
+
+
+def test_frames_without_sim_clock_or_repeated_are_ignored():
+    resampler = Resampler(10.0)
+    assert resampler.add(frame(None)) == []
+    resampler.add(frame(1.0))
+    assert resampler.add(frame(1.0)) == []
+
+
+def test_clock_going_back_restarts_the_grid():
+    resampler = Resampler(10.0)
+    resampler.add(frame(100.0))
+    resampler.add(frame(100.3))
+    assert [round(f.elapsed_time, 1) for f in resampler.add(frame(5.05))] == []
+    assert [round(f.elapsed_time, 1) for f in resampler.add(frame(5.25))] == [5.1, 5.2]
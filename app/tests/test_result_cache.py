@@ -0,0 +1,47 @@
+import os
+
+import pytest
+
+from result_cache import ResultCache
+
+
+class FailingPickle:
+    """Result whose pickling fails half-way with an error other than a pickling error"""
+
+    def __reduce__(self):
+        raise RuntimeError("cannot serialize")
+
+
+def temporary_files(cache: ResultCache):
+    return [name for name in os.listdir(cache.cache_dir) if name.endswith(".tmp")]
+
+
+def test_memoized_result_is_read_back(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    calls = []
+
+    @cache.memoize(version=1)
+    def analysis(value, scale=2):
+        calls.append(value)
+        return value * scale
+
+    assert analysis(3) == 6
+    assert analysis(3) == 6
+    assert analysis(3, scale=3) == 9
+    assert calls == [3, 3]
+    assert cache.stats()["hits"] == 1
+
+
+def test_unpicklable_result_is_not_cached(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    cache.put("key", lambda: None)
+    assert cache.get("key") == (False, None)
+    assert temporary_files(cache) == []
+
+
+def test_failed_write_leaves_no_temporary_file(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    with pytest.raises(RuntimeError):
+        cache.put("key", [FailingPickle()])
+    assert temporary_files(cache) == []
+    assert cache.get("key") == (False, None)
@@ -0,0 +1,50 @@
+import ctypes
+
+import session_metadata
+from rF2data import rF2ScoringInfo, rF2VehicleScoring
+from session_metadata import SessionMetadata, StringCache
+
+
+def c_string(text: str, size: int):
+    return (ctypes.c_ubyte * size)(*text.encode("utf-8"))
+
+
+def scoring(driver: str, vehicle: str = "Oreca 07", track: str = "Le Mans", session: int = 10):
+    player = rF2VehicleScoring()
+    player.mDriverName = c_string(driver, 32)
+    player.mVehicleName = c_string(vehicle, 64)
+    info = rF2ScoringInfo()
+    info.mTrackName = c_string(track, 64)
+    info.mSession = session
+    return player, info
+
+
+def test_strings_decoded_once(monkeypatch):
+    decoded = []
+    decode = session_metadata.Cbytestring2Python
+    monkeypatch.setattr(session_metadata, "Cbytestring2Python", lambda b: decoded.append(1) or decode(b))
+    cache = StringCache()
+    for _ in range(3):
+        assert cache.decode(c_string("Hugo", 32)) == "Hugo"
+    assert cache.decode(c_string("Léa", 32)) == "Léa"
+    assert len(decoded) == 2
+
+
+def test_cache_dropped_over_its_size():
+    cache = StringCache(max_size=2)
+    for name in ["A", "B", "C"]:
+        cache.decode(c_string(name, 32))
+    assert len(cache._strings) == 1
+
+
+def test_one_id_per_driver_vehicle_track_and_session():
+    metadata = SessionMetadata()
+    first = metadata.identify(*scoring("Hugo"))
+    assert first == (0, "Hugo", "Oreca 07", "Le Mans")
+    assert metadata.identify(*scoring("Hugo")) == first
+    assert metadata.identify(*scoring("Hugo", session=11))[0] == 1
+    assert metadata.identify(*scoring("Léa"))[0] == 2
+    assert metadata.register("Hugo", "Oreca 07", "Le Mans", 10) == 0
+    assert metadata.message(2) == {"type": "sessionMetadata", "id": 2, "driverName": "Léa",
+                                   "vehicleName": "Oreca 07", "trackName": "Le Mans", "session": 10}
+    assert metadata.message(99) is None
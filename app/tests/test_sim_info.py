@@ -0,0 +1,65 @@
+import pytest
+
+import rF2data
+from rF2data import SimInfo, SubscribedBuffer, BufferUnsubscribedError, subscription_mask
+
+
+class FakeSharedMemory(bytearray):
+    """Stands for the plugin's named shared memory (mmap tag names only exist on Windows)"""
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def mapped(monkeypatch):
+    """Names of the shared memory buffers mapped, the Extended buffer returned with an unsubscribed mask"""
+    names = []
+    unsubscribed = {"mask": 0}
+
+    def fake_mmap(fileno, size, name):
+        names.append(name)
+        shared_memory = FakeSharedMemory(size)
+        if name == "$rFactor2SMMP_Extended$":
+            extended = rF2data.rF2Extended.from_buffer(shared_memory)
+            extended.mUnsubscribedBuffersMask = unsubscribed["mask"]
+            del extended
+        return shared_memory
+
+    monkeypatch.setattr(rF2data.mmap, "mmap", fake_mmap)
+    return names, unsubscribed
+
+
+def test_subscription_mask_forms():
+    assert subscription_mask(SubscribedBuffer.Telemetry) == 1
+    assert subscription_mask([SubscribedBuffer.Telemetry, SubscribedBuffer.Scoring]) == 3
+    assert subscription_mask(6) == 6
+    assert subscription_mask(SubscribedBuffer.All) == 255
+
+
+def test_only_subscribed_buffers_mapped_on_first_access(mapped):
+    names, _ = mapped
+    info = SimInfo(SubscribedBuffer.Telemetry)
+    assert names == ["$rFactor2SMMP_Extended$"]
+    assert info.Rf2Scor is None
+    telemetry = info.Rf2Tele
+    assert info.Rf2Tele is telemetry
+    assert names == ["$rFactor2SMMP_Extended$", "$rFactor2SMMP_Telemetry$"]
+    info.close()
+    assert info.Rf2Ext is None
+
+
+def test_every_buffer_mapped_by_default(mapped):
+    names, _ = mapped
+    info = SimInfo()
+    assert info.Rf2Tele is not None and info.Rf2Scor is not None
+    assert sorted(names) == ["$rFactor2SMMP_Extended$", "$rFactor2SMMP_Scoring$", "$rFactor2SMMP_Telemetry$"]
+
+
+def test_disabled_subscribed_buffer_fails_fast(mapped):
+    _, unsubscribed = mapped
+    unsubscribed["mask"] = SubscribedBuffer.Scoring.value
+    with pytest.raises(BufferUnsubscribedError, match="Scoring"):
+        SimInfo([SubscribedBuffer.Telemetry, SubscribedBuffer.Scoring])
+    # A tool that does not need the disabled buffer still starts
+    assert SimInfo(SubscribedBuffer.Telemetry).Rf2Tele is not None
@@ -0,0 +1,88 @@
+import pytest
+
+from stint import StintEngine, replay, accuracy
+from rF2data import rF2VehicleTelemetry
+
+LAP_TIME = 200.0
+
+
+def drive(engine: StintEngine, laps, fuel: float = 60.0, burn: float = 3.0, wear_rate: float = 0.01,
+          max_laps: int = 0, end_et: float = 0.0, start_lap: int = 1):
+    """Cross the line at every lap start with a constant consumption and wear"""
+    projections = []
+    for k in range(laps):
+        projections.append(engine.add_lap(start_lap + k, (start_lap + k) * LAP_TIME, fuel - burn * k, 100.0,
+                                          [1.0 - wear_rate * k] * 4, end_et, max_laps))
+    return projections
+
+
+def test_constant_consumption_projected():
+    engine = StintEngine()
+    last = drive(engine, 6)[-1]
+    assert last["fuelPerLap"] == pytest.approx(3.0)
+    assert last["fuelTrend"] == pytest.approx(0.0, abs=1e-6)
+    # 45 l left at 3 l per lap, the tyres would last (0.95 - 0.4) / 0.01 = 55 laps
+    assert last["lapsRemainingFuel"] == pytest.approx(15.0)
+    assert last["lapsRemainingTyres"] == pytest.approx(55.0)
+    assert last["limitedBy"] == "fuel"
+    assert last["wearPerLap"] == [pytest.approx(0.01)] * 4
+    assert last["lapTime"] == pytest.approx(LAP_TIME)
+
+
+def test_pit_window_of_a_lap_race():
+    engine = StintEngine()
+    last = drive(engine, 6, fuel=61.0, max_laps=40)[-1]
+    # Lap 6 of 40: 35 to go, 15.3 on board, a full tank (100 l) covers 33.3
+    assert last["lapsToGo"] == 35
+    assert last["lapsRemaining"] == pytest.approx(15.3)
+    assert last["fuelToFinish"] == pytest.approx(105.0)
+    assert last["pitWindow"] == {"open": 8, "close": 21}
+
+
+def test_timed_race_laps_to_go():
+    engine = StintEngine()
+    last = drive(engine, 6, fuel=61.0, end_et=6 * LAP_TIME + 20 * LAP_TIME - 1)[-1]
+    # A lap is started until the clock runs out
+    assert last["lapsToGo"] == 20
+    assert last["pitWindow"] == {"open": 6, "close": 21}
+
+
+def test_no_pit_window_when_the_fuel_reaches_the_end():
+    engine = StintEngine()
+    assert drive(engine, 6, max_laps=12)[-1]["pitWindow"] is None
+
+
+def test_refuel_restarts_the_fuel_stint_only():
+    engine = StintEngine()
+    drive(engine, 6)
+    refuelled = engine.add_lap(7, 7 * LAP_TIME, 90.0, 100.0, [0.94] * 4)
+    assert refuelled["fuelLaps"] == 0
+    assert refuelled["fuelPerLap"] is None
+    assert refuelled["tyreLaps"] == 6
+    assert engine.add_lap(8, 8 * LAP_TIME, 87.5, 100.0, [0.93] * 4)["fuelPerLap"] == pytest.approx(2.5)
+
+
+def test_update_from_telemetry_on_lap_change():
+    engine = StintEngine()
+    telemetry = rF2VehicleTelemetry()
+    telemetry.mLapNumber = 3
+    telemetry.mElapsedTime = 650.0
+    # Joined mid-lap: nothing until the next crossing of the line
+    assert engine.update(telemetry) is None
+    telemetry.mLapNumber = 4
+    telemetry.mLapStartET = 800.0
+    telemetry.mElapsedTime = 800.1
+    telemetry.mFuel = 40.0
+    telemetry.mFuelCapacity = 100.0
+    projection = engine.update(telemetry)
+    assert (projection["lap"], projection["et"], projection["fuel"]) == (4, 800.0, 40.0)
+    assert engine.update(telemetry) is None
+
+
+def test_recorded_projections_replayed_and_scored():
+    engine = StintEngine()
+    recorded = drive(engine, 10, burn=2.5)
+    assert replay(recorded) == recorded
+    scores = accuracy(recorded)
+    assert scores["fuelNextLap"]["laps"] == 8
+    assert scores["fuelNextLap"]["mae"] == pytest.approx(0.0, abs=1e-3)
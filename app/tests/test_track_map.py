@@ -0,0 +1,45 @@
+import numpy as np
+
+from track_map import TrackMap, TrackMapBuilder
+
+LAP_LENGTH = 1000.0
+
+
+def circle_lap(radius: float, samples: int = 2000):
+    lap_dists = np.linspace(0.0, LAP_LENGTH, samples, endpoint=False)
+    angles = 2 * np.pi * lap_dists / LAP_LENGTH
+    return lap_dists, np.column_stack((radius * np.cos(angles), radius * np.sin(angles)))
+
+
+def test_seeded_builder_extends_the_saved_map(tmp_path):
+    builder = TrackMapBuilder("Test", LAP_LENGTH)
+    for _ in range(3):
+        assert builder.add_lap(*circle_lap(100.0))
+    path = builder.build().save(str(tmp_path / "Test.npz"))
+
+    saved = TrackMap.load(path)
+    assert saved.laps == 3
+    seeded = TrackMapBuilder("Test", LAP_LENGTH)
+    assert seeded.seed(saved)
+    assert seeded.add_lap(*circle_lap(104.0))
+    track_map = seeded.build()
+    assert track_map.laps == 4
+    # One new lap among four moves the centreline by a quarter of its offset
+    radii = np.hypot(track_map.points[:, 0], track_map.points[:, 1])
+    assert np.allclose(radii, 101.0, atol=0.2)
+
+
+def test_seed_rejects_another_grid(tmp_path):
+    builder = TrackMapBuilder("Test", LAP_LENGTH)
+    builder.add_lap(*circle_lap(100.0))
+    assert not TrackMapBuilder("Test", 2 * LAP_LENGTH).seed(builder.build())
+
+
+def test_repeated_scoring_samples_counted_once():
+    builder = TrackMapBuilder("Test", LAP_LENGTH)
+    lap_dists, positions = circle_lap(100.0, samples=50)
+    for i, (lap_dist, (x, z)) in enumerate(zip(lap_dists, positions)):
+        # 60 Hz ticks over 5 Hz scoring: every scoring sample is seen 12 times
+        for _ in range(12):
+            builder.update(1, lap_dist, x, z, et=i * 0.2)
+    assert builder._lap_counts.max() == 1
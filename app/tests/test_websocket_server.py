@@ -0,0 +1,9 @@
+import pytest
+
+from client_channel import DEFAULT_RATE, MAX_RATE
+from websocket_server import LMUWebSocketServer
+
+
+@pytest.mark.parametrize("resample_rate, client_rate", [(None, DEFAULT_RATE), (50.0, 50.0), (100.0, MAX_RATE)])
+def test_client_rate_follows_the_resample_rate(resample_rate, client_rate):
+    assert LMUWebSocketServer(resample_rate=resample_rate).client_rate == client_rate
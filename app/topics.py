@@ -0,0 +1,7 @@
+#!/usr/bin/env python3
+"""
+Names of the message topics shared by the server, the DSP stage and the relay
+"""
+
+# Derived channels of dsp.default_channels(), each one an opt-in topic
+DERIVED_CHANNELS = frozenset({"brakeRate", "steeringRate", "jerk", "yawRate"})
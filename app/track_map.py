@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Track model learnt from recorded laps: racing-line centreline, corners and a grid spatial index
+to answer "lap distance / corner for this world position" without nearest-neighbour scans
+"""
+
+import math
+import os
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+TRACK_MAP_DIR = "track_maps"
+
+# Distance (meters) between two centreline points
+DEFAULT_RESOLUTION = 5.0
+# A lap is only learnt if it covered at least this fraction of the centreline bins
+MIN_LAP_COVERAGE = 0.95
+# Radius (meters) under which the centreline is considered to be a corner
+MAX_CORNER_RADIUS = 250.0
+# Headings are measured over chords of this length (meters) before corner detection
+CURVATURE_WINDOW = 40.0
+# Corners shorter than this (meters) are ignored, straights shorter than this are merged
+MIN_CORNER_LENGTH = 20.0
+# Live samples further apart than this number of bins are not interpolated (teleport, pit exit)
+MAX_FILL_BINS = 20
+
+
+def track_map_path(track_name: str, directory: str = TRACK_MAP_DIR) -> str:
+    """File where the map of a track is stored"""
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", track_name.strip()) or "unknown"
+    return os.path.join(directory, f"{safe_name}.npz")
+
+
+class TrackMap:
+    """
+    Compact centreline polyline with a uniform grid index.
+
+    Point i of the polyline sits at lap distance (i + 0.5) * resolution. The grid stores, for
+    every cell, the indices of the polyline points inside it (padded with -1), so a query only
+    looks at the 3x3 cells around the position.
+    """
+
+    def __init__(self, track_name: str, lap_length: float, resolution: float,
+                 points: np.ndarray, corner_ids: np.ndarray, laps: int = 1,
+                 counts: Optional[np.ndarray] = None):
+        self.track_name = track_name
+        self.lap_length = float(lap_length)
+        self.resolution = float(resolution)
+        self.points = np.ascontiguousarray(points, dtype=np.float32)          # (n, 2) world x/z
+        self.corner_ids = np.ascontiguousarray(corner_ids, dtype=np.int16)   # (n,) -1 on straights
+        self.num_corners = int(self.corner_ids.max()) + 1 if len(self.corner_ids) else 0
+        # Laps the map was learnt from and position samples per point, to keep learning from it
+        self.laps = int(laps)
+        self.counts = None if counts is None else np.asarray(counts, dtype=np.int64)
+        self._build_index()
+
+    def _build_index(self):
+        """Bucket the polyline points into a uniform grid"""
+        n = len(self.points)
+        self.cell_size = self.resolution * 8.0
+        self.origin = self.points.min(axis=0) - self.cell_size
+        cells = np.floor((self.points - self.origin) / self.cell_size).astype(np.int64)
+        self.grid_shape = tuple(int(v) for v in cells.max(axis=0) + 2)
+        flat = cells[:, 0] * self.grid_shape[1] + cells[:, 1]
+
+        order = np.argsort(flat, kind="stable")
+        counts = np.bincount(flat, minlength=self.grid_shape[0] * self.grid_shape[1])
+        depth = max(int(counts.max()), 1)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        slot = np.arange(n) - starts[flat[order]]
+
+        self.grid = np.full((self.grid_shape[0] * self.grid_shape[1], depth), -1, dtype=np.int32)
+        self.grid[flat[order], slot] = order
+
+        # Plain Python copies for the single-position path, cheaper than numpy on tiny inputs
+        self._xs = self.points[:, 0].tolist()
+        self._zs = self.points[:, 1].tolist()
+        self._grid_lists = {int(c): self.grid[c][self.grid[c] >= 0].tolist() for c in np.unique(flat)}
+
+    def _project(self, i: int, x: float, z: float) -> Tuple[float, float]:
+        """Lap distance and squared distance of (x, z) projected around polyline point i"""
+        n = len(self._xs)
+        best = (self._point_distance(i), (self._xs[i] - x) ** 2 + (self._zs[i] - z) ** 2)
+        for j, k in ((i - 1, i), (i, i + 1)):
+            ax, az = self._xs[j % n], self._zs[j % n]
+            bx, bz = self._xs[k % n], self._zs[k % n]
+            dx, dz = bx - ax, bz - az
+            length_sq = dx * dx + dz * dz
+            if length_sq == 0.0:
+                continue
+            t = ((x - ax) * dx + (z - az) * dz) / length_sq
+            if 0.0 <= t <= 1.0:
+                px, pz = ax + t * dx, az + t * dz
+                dist_sq = (px - x) ** 2 + (pz - z) ** 2
+                if dist_sq < best[1]:
+                    best = ((self._point_distance(j) + t * self.resolution) % self.lap_length, dist_sq)
+        return best
+
+    def _point_distance(self, i: int) -> float:
+        return ((i % len(self._xs)) + 0.5) * self.resolution
+
+    def locate(self, x: float, z: float) -> Tuple[float, int]:
+        """Lap distance (meters) and corner ID (-1 on straights) of one world position"""
+        cx = int((x - self.origin[0]) // self.cell_size)
+        cz = int((z - self.origin[1]) // self.cell_size)
+        nearest, nearest_dist = -1, math.inf
+        for ix in (cx - 1, cx, cx + 1):
+            if ix < 0 or ix >= self.grid_shape[0]:
+                continue
+            for iz in (cz - 1, cz, cz + 1):
+                if iz < 0 or iz >= self.grid_shape[1]:
+                    continue
+                for i in self._grid_lists.get(ix * self.grid_shape[1] + iz, ()):
+                    dist = (self._xs[i] - x) ** 2 + (self._zs[i] - z) ** 2
+                    if dist < nearest_dist:
+                        nearest, nearest_dist = i, dist
+        if nearest == -1:
+            # Far away from the racing line (pit lane, off track): full scan
+            nearest = int(np.argmin(((self.points - (x, z)) ** 2).sum(axis=1)))
+        lap_dist, _ = self._project(nearest, x, z)
+        return float(lap_dist), int(self.corner_ids[nearest])
+
+    def locate_many(self, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Vectorized locate() over an (n, 2) array of world x/z positions"""
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        cells = np.floor((positions - self.origin) / self.cell_size).astype(np.int64)
+
+        # Gather the candidate points of the 3x3 neighbourhood of every position
+        candidates = []
+        for ox in (-1, 0, 1):
+            for oz in (-1, 0, 1):
+                cx = np.clip(cells[:, 0] + ox, 0, self.grid_shape[0] - 1)
+                cz = np.clip(cells[:, 1] + oz, 0, self.grid_shape[1] - 1)
+                candidates.append(self.grid[cx * self.grid_shape[1] + cz])
+        candidates = np.concatenate(candidates, axis=1)
+        valid = candidates >= 0
+        coords = self.points[np.where(valid, candidates, 0)]
+        dist = ((coords - positions[:, None, :].astype(np.float32)) ** 2).sum(axis=2)
+        dist[~valid] = np.inf
+        nearest = candidates[np.arange(len(positions)), np.argmin(dist, axis=1)]
+
+        lost = ~valid.any(axis=1)
+        if lost.any():
+            lost_pos = positions[lost].astype(np.float32)
+            nearest[lost] = np.argmin(((self.points[None, :, :] - lost_pos[:, None, :]) ** 2).sum(axis=2), axis=1)
+
+        # Project on the segments before and after the nearest point
+        n = len(self.points)
+        best_dist = ((self.points[nearest] - positions) ** 2).sum(axis=1)
+        lap_dist = (nearest + 0.5) * self.resolution
+        for j in (nearest - 1, nearest):
+            a = self.points[j % n].astype(np.float64)
+            seg = self.points[(j + 1) % n] - a
+            length_sq = (seg ** 2).sum(axis=1)
+            t = np.where(length_sq > 0, ((positions - a) * seg).sum(axis=1) / np.maximum(length_sq, 1e-9), -1.0)
+            on_segment = (t >= 0.0) & (t <= 1.0)
+            seg_dist = ((a + t[:, None] * seg - positions) ** 2).sum(axis=1)
+            better = on_segment & (seg_dist < best_dist)
+            best_dist = np.where(better, seg_dist, best_dist)
+            lap_dist = np.where(better, ((j % n) + 0.5 + t) * self.resolution, lap_dist)
+
+        return np.mod(lap_dist, self.lap_length), self.corner_ids[nearest].astype(np.int32)
+
+    def corner_at(self, lap_dist: float) -> int:
+        """Corner ID (-1 on straights) at a lap distance"""
+        i = int(lap_dist // self.resolution) % len(self.corner_ids)
+        return int(self.corner_ids[i])
+
+    def corners(self) -> List[Dict[str, Any]]:
+        """Start and end lap distance of every corner"""
+        result = []
+        for corner in range(self.num_corners):
+            indices = np.flatnonzero(self.corner_ids == corner)
+            # A corner crossing the start/finish line has a gap in its indices
+            split = np.flatnonzero(np.diff(indices) > 1)
+            start = indices[split[0] + 1] if len(split) else indices[0]
+            end = indices[split[0]] if len(split) else indices[-1]
+            result.append({
+                "corner": corner,
+                "start": round(float(start * self.resolution), 1),
+                "end": round(float((end + 1) * self.resolution), 1),
+            })
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Convert to dictionary for JSON serialization"""
+        return {
+            "trackName": self.track_name,
+            "lapLength": self.lap_length,
+            "resolution": self.resolution,
+            "laps": self.laps,
+            "points": np.round(self.points, 2).tolist(),
+            "corners": self.corners(),
+        }
+
+    def save(self, path: Optional[str] = None) -> str:
+        """Write the map to a compressed .npz file"""
+        path = path or track_map_path(self.track_name)
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        extra = {} if self.counts is None else {"counts": self.counts}
+        np.savez_compressed(path, track_name=self.track_name, lap_length=self.lap_length,
+                            resolution=self.resolution, points=self.points, corner_ids=self.corner_ids,
+                            laps=self.laps, **extra)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "TrackMap":
+        """Read a map written by save()"""
+        with np.load(path) as data:
+            # Maps saved before the lap count was stored count as one lap
+            return cls(str(data["track_name"]), float(data["lap_length"]), float(data["resolution"]),
+                       data["points"], data["corner_ids"], int(data["laps"]) if "laps" in data.files else 1,
+                       data["counts"] if "counts" in data.files else None)
+
+
+def detect_corners(points: np.ndarray, resolution: float) -> np.ndarray:
+    """Corner ID of every centreline point from the smoothed curvature, -1 on straights"""
+    n = len(points)
+    half = max(int(CURVATURE_WINDOW / resolution / 2), 1)
+    # Heading over a chord of CURVATURE_WINDOW meters, which filters the lateral noise of the laps
+    chord = np.roll(points, -half, axis=0) - np.roll(points, half, axis=0)
+    heading = np.arctan2(chord[:, 1], chord[:, 0])
+    turn = np.roll(heading, -half) - np.roll(heading, half)
+    turn = (turn + np.pi) % (2 * np.pi) - np.pi
+    curvature = np.abs(turn) / (2 * half * resolution)
+    in_corner = curvature > 1.0 / MAX_CORNER_RADIUS
+
+    # Merge short straights into the surrounding corner, then drop short corners
+    min_points = max(int(MIN_CORNER_LENGTH / resolution), 1)
+    for value in (False, True):
+        in_corner = _filter_runs(in_corner, value, min_points)
+
+    corner_ids = np.full(n, -1, dtype=np.int16)
+    if in_corner.all() or not in_corner.any():
+        return corner_ids
+    # Number the corners from the first straight so that a corner spanning the line keeps one ID
+    shift = int(np.argmin(in_corner))
+    rolled = np.roll(in_corner, -shift)
+    starts = rolled & ~np.roll(rolled, 1)
+    ids = np.cumsum(starts) - 1
+    corner_ids[:] = np.roll(np.where(rolled, ids, -1), shift)
+    return corner_ids
+
+
+def _filter_runs(mask: np.ndarray, value: bool, min_length: int) -> np.ndarray:
+    """Flip the circular runs of `value` shorter than min_length"""
+    if mask.all() or not mask.any():
+        return mask
+    shift = int(np.argmax(mask != mask[0]))
+    rolled = np.roll(mask, -shift)
+    edges = np.flatnonzero(np.diff(np.concatenate(([not rolled[0]], rolled))) != 0)
+    lengths = np.diff(np.concatenate((edges, [len(rolled)])))
+    result = rolled.copy()
+    for start, length in zip(edges, lengths):
+        if rolled[start] == value and length < min_length:
+            result[start:start + length] = not value
+    return np.roll(result, shift)
+
+
+class TrackMapBuilder:
+    """
+    Learns the centreline of a track from complete laps.
+
+    Positions are binned by lap distance and averaged over every lap that covered the whole
+    track, so memory stays proportional to the track length whatever the number of laps.
+    """
+
+    def __init__(self, track_name: str, lap_length: float, resolution: float = DEFAULT_RESOLUTION):
+        self.track_name = track_name
+        self.lap_length = float(lap_length)
+        self.resolution = resolution
+        self.num_bins = max(int(math.ceil(self.lap_length / resolution)), 4)
+        self.sums = np.zeros((self.num_bins, 2))
+        self.counts = np.zeros(self.num_bins, dtype=np.int64)
+        self.laps_learnt = 0
+        self._lap_sums = np.zeros((self.num_bins, 2))
+        self._lap_counts = np.zeros(self.num_bins, dtype=np.int64)
+        self._lap_number: Optional[int] = None
+        self._last_sample: Optional[Tuple[float, float, float]] = None
+        self._last_update: Optional[Tuple[int, float, Optional[float]]] = None
+
+    def update(self, lap_number: int, lap_dist: float, x: float, z: float, et: Optional[float] = None) -> bool:
+        """
+        Add one position sample, return True when a complete lap was just learnt. Scoring is
+        updated a few times per second: a sample with the same lap distance and scoring time (et)
+        as the previous one is a repeat and is ignored.
+        """
+        sample = (lap_number, lap_dist, et)
+        if sample == self._last_update:
+            return False
+        self._last_update = sample
+        learnt = False
+        if self._lap_number is not None and lap_number != self._lap_number:
+            learnt = self.end_lap()
+            self._last_sample = None
+        self._lap_number = lap_number
+
+        if not 0.0 <= lap_dist < self.lap_length:
+            return learnt
+        i = int(lap_dist / self.resolution)
+        self._add_to_bin(i, x, z)
+
+        # Scoring positions come at a few Hz: fill the bins skipped since the previous sample
+        if self._last_sample is not None:
+            last_dist, last_x, last_z = self._last_sample
+            last_i = int(last_dist / self.resolution)
+            if 1 < i - last_i <= MAX_FILL_BINS:
+                for j in range(last_i + 1, i):
+                    t = ((j + 0.5) * self.resolution - last_dist) / (lap_dist - last_dist)
+                    self._add_to_bin(j, last_x + t * (x - last_x), last_z + t * (z - last_z))
+        self._last_sample = (lap_dist, x, z)
+        return learnt
+
+    def _add_to_bin(self, i: int, x: float, z: float):
+        self._lap_sums[i, 0] += x
+        self._lap_sums[i, 1] += z
+        self._lap_counts[i] += 1
+
+    def add_lap(self, lap_dists: np.ndarray, positions: np.ndarray) -> bool:
+        """Learn one recorded lap at once (batch counterpart of update())"""
+        lap_dists = np.asarray(lap_dists, dtype=np.float64)
+        positions = np.asarray(positions, dtype=np.float64).reshape(-1, 2)
+        keep = (lap_dists >= 0.0) & (lap_dists < self.lap_length)
+        bins = (lap_dists[keep] / self.resolution).astype(np.int64)
+        np.add.at(self._lap_sums, bins, positions[keep])
+        self._lap_counts += np.bincount(bins, minlength=self.num_bins)
+        return self.end_lap()
+
+    def seed(self, track_map: TrackMap) -> bool:
+        """
+        Start from the laps of a saved map, so the laps learnt next are averaged with them instead
+        of replacing them. False when the map is on another grid and cannot be extended.
+        """
+        if track_map.resolution != self.resolution or len(track_map.points) != self.num_bins:
+            return False
+        counts = track_map.counts if track_map.counts is not None else np.full(self.num_bins, track_map.laps)
+        self.counts[:] = counts
+        self.sums[:] = track_map.points * counts[:, None]
+        self.laps_learnt = track_map.laps
+        return True
+
+    def end_lap(self) -> bool:
+        """Fold the lap in progress into the model if it covered the whole track"""
+        coverage = np.count_nonzero(self._lap_counts) / self.num_bins
+        learnt = coverage >= MIN_LAP_COVERAGE
+        if learnt:
+            self.sums += self._lap_sums
+            self.counts += self._lap_counts
+            self.laps_learnt += 1
+        self._lap_sums[:] = 0.0
+        self._lap_counts[:] = 0
+        return learnt
+
+    def build(self) -> Optional[TrackMap]:
+        """Centreline and corners of the laps learnt so far"""
+        if self.laps_learnt == 0:
+            return None
+        seen = self.counts > 0
+        centres = (np.arange(self.num_bins) + 0.5) * self.resolution
+        points = np.empty((self.num_bins, 2))
+        for axis in range(2):
+            # Bins no lap went through are interpolated along the (closed) track
+            points[:, axis] = np.interp(centres, centres[seen], self.sums[seen, axis] / self.counts[seen],
+                                        period=self.lap_length)
+        return TrackMap(self.track_name, self.lap_length, self.resolution, points,
+                        detect_corners(points, self.resolution), self.laps_learnt, self.counts.copy())
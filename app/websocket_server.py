@@ -3,16 +3,37 @@
 Python WebSocket server for LMU telemetry data
 """
 
+import argparse
 import asyncio
 import json
 import logging
+import os
+import math
+import re
 import time
+from datetime import datetime
 from typing import Optional, Dict, Any
 import websockets
 from websockets.server import WebSocketServerProtocol
 
 # Import our LMU data structures
-from rF2data import SimInfo, Cbytestring2Python, rFactor2Constants
+from rF2data import SimInfo, SubscribedBuffer, rFactor2Constants
+from lap_stats import LapStatsEngine
+from stint import StintEngine
+from track_map import TrackMap, TrackMapBuilder, track_map_path
+from delta import DeltaEngine
+from reference_lap import ReferenceLapFile, reference_lap_path, write_personal_best, REFERENCE_LAP_DIR, FILE_EXTENSION
+from frames import TelemetryResponse, FrameBuffer, record_to_frame
+from session_metadata import SessionMetadata
+from events import EventEngine
+from mini_sectors import MiniSectorEngine
+from damage import DamageMonitor
+from dsp import DSPStage
+from all_car_recorder import AllCarRecorder
+from client_channel import ClientChannel, DEFAULT_RATE, MAX_RATE
+from relay import UpstreamLink, TOKEN_ENV
+from resample import Resampler
+from profiler import run_profile, profile_path
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -20,48 +41,63 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.DEBUG)
 
 
-class TelemetryResponse:
-    """Data structure for WebSocket response"""
-    
-    def __init__(self, driver_name: str, vehicle_name: str, track_name: str, place: int, 
-                 gear: int, brake: float, throttle: float, session: int):
-        self.driver_name = driver_name
-        self.vehicle_name = vehicle_name
-        self.track_name = track_name
-        self.place = place
-        self.gear = gear
-        self.brake = brake
-        self.throttle = throttle
-        self.session = session
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """Convert to dictionary for JSON serialization"""
-        return {
-            "driverName": self.driver_name,
-            "vehicleName": self.vehicle_name,
-            "trackName": self.track_name,
-            "place": self.place,
-            "gear": self.gear,
-            "brake": self.brake,
-            "throttle": self.throttle,
-            "session": self.session
-        }
-
-
 class LMUWebSocketServer:
     """WebSocket server for LMU telemetry data"""
     
-    def __init__(self, host: str = "localhost", port: int = 8080):
+    def __init__(self, host: str = "localhost", port: int = 8080, record_all_cars: bool = False,
+                 full_precision: bool = False, upstream: Optional[str] = None,
+                 upstream_token: Optional[str] = None, resample_rate: Optional[float] = None, reference: Optional[str] = None,
+                 replay: Optional[str] = None, replay_speed: float = 1.0):
         self.host = host
         self.port = port
+        self.record_all_cars = record_all_cars
+        self.full_precision = full_precision
+        self.upstream = upstream
+        self.upstream_token = upstream_token
+        self.upstream_link: Optional[UpstreamLink] = None
+        self.resampler = Resampler(resample_rate) if resample_rate else None
+        # Resampled frames are only all delivered to the clients ticking at the resample rate
+        self.client_rate = min(resample_rate, MAX_RATE) if resample_rate else DEFAULT_RATE
+        # Session recording published in place of the shared memory (load tests without the game)
+        self.replay = replay
+        self.replay_speed = replay_speed
+        self.last_version: Optional[int] = None
+        self.all_car_recorder: Optional[AllCarRecorder] = None
         self.sim_info: Optional[SimInfo] = None
-        self.active_connections = set()
+        self.clients: Dict[Any, ClientChannel] = {}
+        self.lap_stats = LapStatsEngine()
+        self.stint = StintEngine()
+        self.dsp = DSPStage()
+        self.telemetry_task: Optional[asyncio.Task] = None
+        # The event loop only keeps weak references to tasks
+        self.background_tasks: set = set()
+        self.track_map: Optional[TrackMap] = None
+        self.track_map_builder: Optional[TrackMapBuilder] = None
+        self.delta_engine: Optional[DeltaEngine] = None
+        # Reference lap file the delta is computed against instead of the personal best
+        self.reference = reference
+        self.saved_best = None
+        self.session_metadata = SessionMetadata()
+        self.event_engine: Optional[EventEngine] = None
+        self.mini_sectors: Optional[MiniSectorEngine] = None
+        self.damage_monitor: Optional[DamageMonitor] = None
+        self.session_buffer = FrameBuffer()
+        self.buffer_session: Optional[int] = None
+        self.export_dir = "export"
         
     async def initialize_sim_info(self) -> bool:
         """Initialize connection to LMU shared memory"""
         try:
-            self.sim_info = SimInfo()
+            self.sim_info = SimInfo([SubscribedBuffer.Telemetry, SubscribedBuffer.Scoring])
+            self.event_engine = EventEngine(self.sim_info, self.session_metadata.strings)
+            self.mini_sectors = MiniSectorEngine(self.sim_info)
+            self.damage_monitor = DamageMonitor(self.sim_info)
             logger.info("Successfully connected to LMU shared memory")
+            if self.record_all_cars:
+                os.makedirs(self.export_dir, exist_ok=True)
+                path = os.path.join(self.export_dir, f"allcars_{datetime.now().strftime('%Y%m%d_%H%M%S')}.rec")
+                self.all_car_recorder = AllCarRecorder(self.sim_info, path, full_precision=self.full_precision)
+                logger.info(f"Recording all cars to {path}")
             return True
         except Exception as e:
             logger.error(f"Failed to connect to LMU shared memory: {e}")
@@ -76,7 +112,6 @@ class LMUWebSocketServer:
         vehicles = self.sim_info.Rf2Scor.mVehicles
         for i in range(rFactor2Constants.MAX_MAPPED_VEHICLES):
             vehicle = vehicles[i]
-            logger.debug(f"Vehicle: {vehicle.mID}, {vehicle.mIsPlayer}, {Cbytestring2Python(vehicle.mDriverName)}, {Cbytestring2Python(vehicle.mVehicleName)}")
             # Check if this slot has a valid vehicle and if it's the player vehicle
             if vehicle.mIsPlayer == 1:
                 return vehicle, vehicle.mID
@@ -106,77 +141,347 @@ class LMUWebSocketServer:
                 logger.debug("No player vehicle found")
                 return None
             
-            # Get data from scoring
-            driver_name = Cbytestring2Python(player_vehicle.mDriverName)
-            vehicle_name = Cbytestring2Python(player_vehicle.mVehicleName)
-            track_name = Cbytestring2Python(self.sim_info.Rf2Scor.mScoringInfo.mTrackName)
-            place = player_vehicle.mPlace
-            session = self.sim_info.Rf2Scor.mScoringInfo.mSession
-            
             # Find corresponding telemetry data
             player_telemetry = self.find_player_telemetry(player_vehicle_id)
             if player_telemetry is None:
                 logger.debug(f"No telemetry data found for player vehicle ID: {player_vehicle_id}")
                 return None
             
-            # Get telemetry data
-            gear = player_telemetry.mGear
-            throttle = player_telemetry.mFilteredThrottle
-            brake = player_telemetry.mFilteredBrake
-            
-            return TelemetryResponse(
-                driver_name=driver_name,
-                vehicle_name=vehicle_name,
-                track_name=track_name,
-                place=place,
-                gear=gear,
-                brake=brake,
-                throttle=throttle,
-                session=session
-            )
+            return self.build_frame(player_vehicle, player_telemetry)
             
         except Exception as e:
             logger.error(f"Error getting telemetry data: {e}")
             return None
     
+    def build_frame(self, player_vehicle, player_telemetry) -> TelemetryResponse:
+        """Build the response frame from the player scoring and telemetry data"""
+        # Get data from scoring, names are decoded once per session
+        scoring_info = self.sim_info.Rf2Scor.mScoringInfo
+        metadata_id, driver_name, vehicle_name, track_name = self.session_metadata.identify(player_vehicle, scoring_info)
+        place = player_vehicle.mPlace
+        session = scoring_info.mSession
+        
+        # Get telemetry data
+        gear = player_telemetry.mGear
+        elapsed_time = player_telemetry.mElapsedTime
+        version = self.sim_info.Rf2Tele.mVersionUpdateEnd
+        throttle = player_telemetry.mFilteredThrottle
+        brake = player_telemetry.mFilteredBrake
+        
+        # Position on track from the learnt track map, if any
+        lap_dist, corner = None, None
+        if self.track_map is not None:
+            lap_dist, corner = self.track_map.locate(player_telemetry.mPos.x, player_telemetry.mPos.z)
+            lap_dist = round(lap_dist, 1)
+        
+        return TelemetryResponse(
+            driver_name=driver_name,
+            vehicle_name=vehicle_name,
+            track_name=track_name,
+            place=place,
+            gear=gear,
+            brake=brake,
+            throttle=throttle,
+            session=session,
+            lap_dist=lap_dist,
+            corner=corner,
+            metadata_id=metadata_id,
+            elapsed_time=elapsed_time,
+            version=version
+        )
+    
+    def buffer_frame(self, frame: TelemetryResponse):
+        """Keep the frame in the session buffer, saving the buffer in the background when the session changes"""
+        if len(self.session_buffer) and self.buffer_session != frame.session:
+            buffer = self.session_buffer
+            self.session_buffer = FrameBuffer()
+            asyncio.get_running_loop().run_in_executor(None, self.save_session_buffer, buffer)
+        self.buffer_session = frame.session
+        self.session_buffer.append(frame)
+    
+    def save_session_buffer(self, buffer: FrameBuffer) -> Optional[str]:
+        """Write a buffered session to the export directory (binary records and CSV)"""
+        if not len(buffer):
+            return None
+        
+        _, _, driver_name, _, track_name = next(buffer.names())
+        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        name = re.sub(r"[^A-Za-z0-9_.-]+", "_", f"session_{driver_name}_{track_name}_{timestamp}")
+        base = os.path.join(self.export_dir, name)
+        buffer.write_binary(f"{base}.frames")
+        buffer.write_csv(f"{base}.csv")
+        logger.info(f"Saved {len(buffer)} frames ({buffer.nbytes} bytes) to {base}")
+        return base
+    
     async def handle_client(self, websocket: WebSocketServerProtocol):
         """Handle WebSocket client connection"""
         client_address = f"{websocket.remote_address[0]}:{websocket.remote_address[1]}"
         logger.info(f"New WebSocket connection from {client_address}")
         
-        # Add to active connections
-        self.active_connections.add(websocket)
+        # Messages are sent by the client channel at the client rate, the connection only
+        # receives control messages (setRate, subscribe, getStats, setReference, profile)
+        channel = ClientChannel(websocket, self.client_rate)
+        self.clients[websocket] = channel
+        sender = asyncio.create_task(channel.run())
         
         try:
-            # Send data every 1000ms (1 second)
-            while True:
-                telemetry_data = self.get_telemetry_data()
-                
-                if telemetry_data:
-                    # Convert to JSON and send
-                    json_data = json.dumps(telemetry_data.to_dict())
-                    logger.info(json_data)
-                    
-                    await websocket.send(json_data)
-                else:
-                    # Send empty data or status message if no player found
-                    status_msg = json.dumps({"status": "no_player_vehicle_found"})
-                    await websocket.send(status_msg)
-                
-                await asyncio.sleep(0.1)
+            async for message in websocket:
+                request = channel.handle_message(message)
+                if request is not None:
+                    self.handle_request(request, channel)
                 
         except websockets.exceptions.ConnectionClosed:
-            logger.info(f"WebSocket connection closed for {client_address}")
+            pass
         except Exception as e:
             logger.error(f"Error in WebSocket handler for {client_address}: {e}")
         finally:
-            # Remove from active connections
-            self.active_connections.discard(websocket)
+            sender.cancel()
+            self.clients.pop(websocket, None)
+            logger.info(f"WebSocket connection closed for {client_address}: {channel.stats()}")
+    
+    def handle_request(self, request: Dict[str, Any], channel: ClientChannel):
+        """Server-wide control messages: setReference, clearReference and profile"""
+        if request.get("type") == "setReference":
+            name = request.get("name")
+            if isinstance(name, str):
+                self.reference = name
+                self.apply_reference()
+        elif request.get("type") == "clearReference":
+            self.reference = None
+            if self.delta_engine is not None:
+                self.delta_engine.clear_reference()
+            logger.info("Delta back to the personal best")
+        elif request.get("type") == "profile":
+            self.spawn(self.profile(request, channel))
+    
+    def spawn(self, coroutine) -> asyncio.Task:
+        """Run a coroutine in a task kept referenced until it is done"""
+        task = asyncio.create_task(coroutine)
+        self.background_tasks.add(task)
+        task.add_done_callback(self.background_tasks.discard)
+        return task
+    
+    async def profile(self, request: Dict[str, Any], channel: ClientChannel):
+        """Sample the server stacks for the requested time and send the collapsed stacks to the client"""
+        try:
+            sampler = await run_profile(float(request.get("seconds", 30)), float(request.get("intervalMs", 10)) / 1000.0,
+                                        bool(request.get("idle", False)))
+        except (TypeError, ValueError, RuntimeError) as e:
+            channel.push(json.dumps({"type": "profileResult", "error": str(e)}), "profileResult")
+            return
+        path = sampler.save(profile_path("websocket"))
+        summary = sampler.summary()
+        logger.info(f"Profile of {summary['samples']} samples saved to {path} (overhead {summary['overheadPercent']} %)")
+        channel.push(json.dumps({"type": "profileResult", **summary, "file": path, "collapsed": sampler.collapsed()}),
+                     "profileResult")
+    
+    def apply_reference(self):
+        """Load the reference lap file into the delta engine, if it is for the current track"""
+        if self.reference is None or self.delta_engine is None:
+            return
+        # Only names inside reference_laps/: the name may come from a client
+        path = os.path.join(REFERENCE_LAP_DIR, os.path.basename(self.reference))
+        if not path.endswith(FILE_EXTENSION):
+            path += FILE_EXTENSION
+        try:
+            start = time.perf_counter()
+            with ReferenceLapFile.open(path) as lap:
+                track_name = self.track_map_builder.track_name
+                if lap.metadata.get("trackName") != track_name:
+                    logger.warning(f"Reference lap {lap.name} is for {lap.metadata.get('trackName')}, not {track_name}")
+                    return
+                self.delta_engine.set_reference(lap.to_reference(self.delta_engine.num_points))
+                logger.info(f"Delta against {lap.name} ({lap.metadata.get('driverName')}, {lap.metadata['lapTime']:.3f}s), "
+                            f"loaded in {(time.perf_counter() - start) * 1000:.1f} ms")
+        except (OSError, ValueError, KeyError) as e:
+            logger.error(f"Cannot load reference lap {self.reference}: {e}")
+    
+    def save_best_lap(self, frame: TelemetryResponse):
+        """Write the personal best to its reference lap file when it changed and beats the saved one"""
+        best = self.delta_engine.best
+        if best is None or best is self.saved_best:
+            return
+        self.saved_best = best
+        path = reference_lap_path(frame.track_name, frame.vehicle_name, frame.driver_name)
+        asyncio.get_running_loop().run_in_executor(
+            None, self.write_best_lap, path, best, self.delta_engine.lap_length, self.delta_engine.grid_spacing,
+            frame.track_name, frame.vehicle_name, frame.driver_name)
+    
+    def write_best_lap(self, path: str, best, *args):
+        """Write the best lap of the session unless the file holds a faster one from an earlier session"""
+        if write_personal_best(path, best, *args):
+            logger.info(f"Best lap {best.lap_time:.3f}s saved to {path}")
+        else:
+            logger.info(f"Best lap {best.lap_time:.3f}s not saved, {path} holds a faster lap")
+    
+    def publish(self, message: Dict[str, Any], stream: Optional[str] = None):
+        """Send a message to every client, latest-value only when it belongs to a continuous stream"""
+        if not self.clients:
+            return
+        data = json.dumps(message)
+        for channel in self.clients.values():
+            if stream is None:
+                channel.push(data, message.get("type"))
+            else:
+                channel.offer(stream, data)
+    
+    def publish_probe(self, frame: TelemetryResponse):
+        """Read time of a new telemetry update, for the clients measuring the latency (opt-in probe topic)"""
+        self.publish({"type": "probe", "telemetryVersion": frame.version, "readAt": frame.timestamp}, "probe")
+    
+    def publish_derived(self):
+        """Latest value of every derived channel, each one a topic the clients subscribe to"""
+        for message in self.dsp.messages():
+            # Opt-in topics: not serialized when nobody subscribed
+            if any(channel.wants(message["channel"]) for channel in self.clients.values()):
+                self.publish(message, message["channel"])
+    
+    def publish_frame(self, frame: Optional[TelemetryResponse]):
+        """Publish the player frame, preceded by its sessionMetadata for the clients that did not get it"""
+        if not self.clients:
+            return
+        if frame is None:
+            self.publish({"status": "no_player_vehicle_found"}, "telemetry")
+            return
+        data = frame.to_json(self.full_precision)
+        for channel in self.clients.values():
+            if channel.metadata_id != frame.metadata_id:
+                channel.push(json.dumps(self.session_metadata.message(frame.metadata_id)), "sessionMetadata")
+                channel.metadata_id = frame.metadata_id
+            channel.offer("telemetry", data)
+    
+    def update_track_map(self, player_vehicle):
+        """Learn the track map from the player positions, loading a saved one on track change"""
+        scoring_info = self.sim_info.Rf2Scor.mScoringInfo
+        track_name = self.session_metadata.strings.decode(scoring_info.mTrackName)
+        if self.track_map_builder is None or self.track_map_builder.track_name != track_name:
+            self.track_map_builder = TrackMapBuilder(track_name, scoring_info.mLapDist)
+            self.delta_engine = DeltaEngine(scoring_info.mLapDist)
+            self.saved_best = None
+            self.apply_reference()
+            try:
+                self.track_map = TrackMap.load(track_map_path(track_name))
+                # The laps driven now are added to the saved ones
+                seeded = self.track_map_builder.seed(self.track_map)
+                logger.info(f"Loaded track map for {track_name} ({self.track_map.laps} laps"
+                            f"{'' if seeded else ', on another grid'})")
+            except (OSError, KeyError):
+                self.track_map = None
+        
+        if self.track_map_builder.update(player_vehicle.mTotalLaps, player_vehicle.mLapDist,
+                                         player_vehicle.mPos.x, player_vehicle.mPos.z, scoring_info.mCurrentET):
+            if self.track_map is not None and self.track_map_builder.laps_learnt <= self.track_map.laps:
+                # Not seeded from the saved map: keep it until more laps were learnt than it holds
+                return
+            self.track_map = self.track_map_builder.build()
+            path = self.track_map.save()
+            logger.info(f"Track map updated from {self.track_map_builder.laps_learnt} laps: {path}")
+    
+    def update_delta(self, player_vehicle, player_telemetry) -> Optional[float]:
+        """Feed the delta engine with the lap distance and the trace channels of the current frame"""
+        if self.track_map is not None:
+            lap_dist, _ = self.track_map.locate(player_telemetry.mPos.x, player_telemetry.mPos.z)
+        else:
+            # Scoring is only updated a few times per second
+            lap_dist = player_vehicle.mLapDist
+        vel = player_telemetry.mLocalVel
+        values = (math.sqrt(vel.x**2 + vel.y**2 + vel.z**2), player_telemetry.mFilteredThrottle,
+                  player_telemetry.mFilteredBrake, player_telemetry.mUnfilteredSteering, player_telemetry.mGear,
+                  player_telemetry.mPos.x, player_telemetry.mPos.z)
+        return self.delta_engine.update(player_telemetry.mLapNumber, player_telemetry.mLapStartET,
+                                        player_telemetry.mElapsedTime, lap_dist, values)
+    
+    async def telemetry_loop(self, interval: float = 1.0 / 60.0):
+        """Sample the player telemetry at a fixed rate and feed the live engines"""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                if self.all_car_recorder is not None:
+                    self.all_car_recorder.capture()
+                
+                for event in self.event_engine.poll():
+                    logger.info(f"Event: {event}")
+                    self.session_buffer.add_event(event)
+                    self.publish(event)
+                
+                mini_sectors = self.mini_sectors.poll()
+                if mini_sectors:
+                    self.publish(mini_sectors)
+                
+                damage = self.damage_monitor.poll()
+                if damage:
+                    self.publish(damage)
+                
+                player_vehicle, player_vehicle_id = self.find_player_vehicle()
+                player_telemetry = None
+                if player_vehicle_id != -1:
+                    self.update_track_map(player_vehicle)
+                    player_telemetry = self.find_player_telemetry(player_vehicle_id)
+                if player_telemetry is None:
+                    self.publish_frame(None)
+                else:
+                    frame = self.build_frame(player_vehicle, player_telemetry)
+                    # Only frames read from a new telemetry update are samples, the loop may
+                    # run faster than the game writes
+                    if frame.version != self.last_version:
+                        self.last_version = frame.version
+                        self.publish_probe(frame)
+                        for sample in self.resampler.add(frame) if self.resampler else [frame]:
+                            self.buffer_frame(sample)
+                            self.publish_frame(sample)
+                    if self.dsp.update(player_telemetry):
+                        self.publish_derived()
+                    self.update_delta(player_vehicle, player_telemetry)
+                    self.save_best_lap(frame)
+                    self.publish(self.delta_engine.to_dict(), "delta")
+                    
+                    lap_summary = self.lap_stats.update(player_telemetry)
+                    if lap_summary:
+                        logger.info(f"Lap {lap_summary['lap']} completed: {lap_summary['lapTime']}s")
+                        self.publish(lap_summary)
+                    
+                    stint = self.stint.update(player_telemetry, self.sim_info.Rf2Scor.mScoringInfo)
+                    if stint:
+                        # Recorded with the session so the projections can be replayed offline (python stint.py)
+                        self.session_buffer.add_event(stint)
+                        self.publish(stint)
+            except Exception as e:
+                logger.error(f"Error in telemetry loop: {e}")
+            
+            # Fixed rate: the processing time is not added to the period
+            next_tick = max(next_tick + interval, loop.time())
+            await asyncio.sleep(next_tick - loop.time())
+    
+    async def replay_loop(self):
+        """Publish the frames of a session recording (.frames) at the recorded pace, in a loop"""
+        frames, names = FrameBuffer.read_binary(self.replay)
+        if not len(frames):
+            logger.error(f"{self.replay} has no frames")
+            return
+        loops = 0
+        while True:
+            start_wall = time.perf_counter()
+            start_timestamp = frames["timestamp"][0]
+            for start, end, driver_name, vehicle_name, track_name in names:
+                for index in range(start, end):
+                    record = frames[index]
+                    delay = (record["timestamp"] - start_timestamp) / self.replay_speed - (time.perf_counter() - start_wall)
+                    await asyncio.sleep(max(delay, 0.0))
+                    metadata_id = self.session_metadata.register(driver_name, vehicle_name, track_name, int(record["session"]))
+                    # Stamped now, like a frame read from the shared memory
+                    frame = record_to_frame(record, driver_name, vehicle_name, track_name, metadata_id)
+                    self.publish_probe(frame)
+                    self.publish_frame(frame)
+            loops += 1
+            logger.info(f"Replayed {len(frames)} frames of {self.replay} ({loops} times)")
     
     async def start_server(self):
         """Start the WebSocket server"""
+        if self.replay:
+            logger.info(f"Replaying {self.replay} instead of the LMU shared memory")
         # Initialize connection to LMU
-        if not await self.initialize_sim_info():
+        elif not await self.initialize_sim_info():
             logger.error("Failed to initialize LMU connection. Make sure LMU is running.")
             return
         
@@ -190,19 +495,36 @@ class LMUWebSocketServer:
             subprotocols=[]
         ):
             logger.info(f"WebSocket server started on ws://{self.host}:{self.port}")
+            self.telemetry_task = asyncio.create_task(self.replay_loop() if self.replay else self.telemetry_loop())
+            if self.upstream:
+                # The relay is published to like any other client
+                self.upstream_link = UpstreamLink(self.upstream, self.upstream_token)
+                self.clients[self.upstream_link] = self.upstream_link
+                self.spawn(self.upstream_link.run())
+                logger.info(f"Pushing the telemetry stream to the relay {self.upstream}")
             # Keep the server running indefinitely
             await asyncio.Future()  # Run forever
     
     def cleanup(self):
         """Cleanup resources"""
+        self.save_session_buffer(self.session_buffer)
+        if self.all_car_recorder is not None:
+            self.all_car_recorder.close()
+            logger.info(f"All-car recording closed: {self.all_car_recorder.stats()}")
+        if self.upstream_link is not None:
+            logger.info(f"Relay link closed: {self.upstream_link.stats()}")
         if self.sim_info:
             self.sim_info.close()
             logger.info("Closed LMU shared memory connection")
 
 
-async def main():
+async def main(args: argparse.Namespace):
     """Main function to start the server"""
-    server = LMUWebSocketServer(host="localhost", port=8080)
+    server = LMUWebSocketServer(host=args.host, port=args.port, record_all_cars=args.record_all_cars,
+                                 full_precision=args.full_precision, upstream=args.upstream,
+                                 upstream_token=args.upstream_token,
+                                 resample_rate=args.resample, reference=args.reference,
+                                 replay=args.replay, replay_speed=args.replay_speed)
     
     try:
         await server.start_server()
@@ -214,12 +536,36 @@ async def main():
         server.cleanup()
 
 
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="LMU WebSocket Server")
+    parser.add_argument("--host", default="localhost", help="interface to listen on")
+    parser.add_argument("--port", type=int, default=8080, help="port to listen on")
+    parser.add_argument("--record-all-cars", action="store_true",
+                        help="record position, velocity, lap distance and inputs of every car to export/")
+    parser.add_argument("--full-precision", action="store_true",
+                        help="send unrounded frames and record all cars in float64 (session exports stay quantized)")
+    parser.add_argument("--upstream", metavar="URL",
+                        help="also push the stream to a relay (python relay.py serve), e.g. ws://relay-host:8090/upstream")
+    parser.add_argument("--upstream-token", metavar="TOKEN", default=os.environ.get(TOKEN_ENV),
+                        help=f"shared token of the relay (default: ${TOKEN_ENV})")
+    parser.add_argument("--resample", type=float, metavar="HZ",
+                        help="send and record frames exactly 1/HZ apart on the sim clock, interpolated from the recent frames; "
+                             "clients then receive them at HZ (up to 60) by default")
+    parser.add_argument("--reference", metavar="FILE",
+                        help="compute the delta against this reference lap of reference_laps/")
+    parser.add_argument("--replay", metavar="FILE",
+                        help="publish a session recording (.frames) in a loop instead of reading the game, e.g. for loadtest.py")
+    parser.add_argument("--replay-speed", type=float, default=1.0, help="replay speed factor")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     print("LMU WebSocket Server")
     print("==========================")
     print("Make sure LMU is running before starting this server.")
-    print("Server will be available at: ws://localhost:8080")
+    print(f"Server will be available at: ws://{args.host}:{args.port}")
     print("Press Ctrl+C to stop the server")
     print()
     
-    asyncio.run(main())
+    asyncio.run(main(args))
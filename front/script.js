@@ -1,6 +1,6 @@
-const WS_URL = "ws://localhost:8080/ws";
+// Frames are decoded by the worker, which owns the WebSocket and the data buffers
+const worker = new Worker('telemetry-worker.js');
 
-let sock;
 const statusEl = document.getElementById('status');
 const gearValueEl = document.getElementById('gearValue');
 const gearDescriptionEl = document.getElementById('gearDescription');
@@ -13,22 +13,15 @@ const sessionDescriptionEl = document.getElementById('sessionDescription');
 const trackValueEl = document.getElementById('trackValue');
 const vehicleValueEl = document.getElementById('vehicleValue');
 
-// Smoothie Charts setup
-let brakeChart, throttleChart;
-let brakeTimeSeries, throttleTimeSeries;
-let startTime;
+let brakeCanvas, throttleCanvas;
 
 // Data collection for export
-let telemetryData = [];
 let isCollectingData = false;
 let currentSession = null;
 
 function initializeCharts() {
-  startTime = Date.now();
-  
-  // Verify canvas elements exist and have proper dimensions
-  const brakeCanvas = document.getElementById('brakeChart');
-  const throttleCanvas = document.getElementById('throttleChart');
+  brakeCanvas = document.getElementById('brakeChart');
+  throttleCanvas = document.getElementById('throttleChart');
   
   if (!brakeCanvas || !throttleCanvas) {
     console.error('Canvas elements not found!');
@@ -40,53 +33,31 @@ function initializeCharts() {
   brakeCanvas.height = brakeCanvas.offsetHeight;
   throttleCanvas.width = throttleCanvas.offsetWidth;
   throttleCanvas.height = throttleCanvas.offsetHeight;
+}
+
+// Draw the last samples of a channel (0.0-1.0) as a filled line, newest on the right
+function drawSeries(canvas, values, stroke, fill) {
+  if (!canvas) return;
+  const ctx = canvas.getContext('2d');
+  const width = canvas.width;
+  const height = canvas.height;
+  ctx.fillStyle = '#000';
+  ctx.fillRect(0, 0, width, height);
+  if (values.length < 2) return;
   
-  console.log('Canvas dimensions:', {
-    brake: { width: brakeCanvas.width, height: brakeCanvas.height },
-    throttle: { width: throttleCanvas.width, height: throttleCanvas.height }
-  });
-  
-  // Initialize brake chart - simplified like the working example
-  brakeChart = new SmoothieChart();
-  brakeTimeSeries = new TimeSeries();
-  brakeChart.addTimeSeries(brakeTimeSeries, { 
-    strokeStyle: 'rgba(239, 68, 68, 1)', 
-    fillStyle: 'rgba(239, 68, 68, 0.2)', 
-    lineWidth: 3 
-  });
-  
-  // Initialize throttle chart - simplified like the working example
-  throttleChart = new SmoothieChart();
-  throttleTimeSeries = new TimeSeries();
-  throttleChart.addTimeSeries(throttleTimeSeries, { 
-    strokeStyle: 'rgba(16, 185, 129, 1)', 
-    fillStyle: 'rgba(16, 185, 129, 0.2)', 
-    lineWidth: 3 
-  });
-  
-  // Start the charts using canvas IDs like the working example
-  brakeChart.streamTo(document.getElementById("brakeChart"), 100);
-  throttleChart.streamTo(document.getElementById("throttleChart"), 100);
-  
-  // Add test data using absolute timestamps like the working example
-  setTimeout(() => {
-    brakeTimeSeries.append(Date.now(), 25);
-    throttleTimeSeries.append(Date.now(), 30);
-    console.log('Test data added to charts');
-    
-    setTimeout(() => {
-      brakeTimeSeries.append(Date.now(), 40);
-      throttleTimeSeries.append(Date.now(), 60);
-      
-      setTimeout(() => {
-        brakeTimeSeries.append(Date.now(), 15);
-        throttleTimeSeries.append(Date.now(), 80);
-        console.log('Additional test data added');
-      }, 200);
-    }, 200);
-  }, 100);
-  
-  console.log('Charts initialized successfully');
+  const step = width / (values.length - 1);
+  ctx.beginPath();
+  ctx.moveTo(0, height);
+  for (let i = 0; i < values.length; i++) {
+    const value = Number.isNaN(values[i]) ? 0 : Math.min(Math.max(values[i], 0), 1);
+    ctx.lineTo(i * step, height - value * height);
+  }
+  ctx.lineTo(width, height);
+  ctx.fillStyle = fill;
+  ctx.fill();
+  ctx.strokeStyle = stroke;
+  ctx.lineWidth = 3;
+  ctx.stroke();
 }
 
 function updateGearDisplay(gear) {
@@ -115,17 +86,6 @@ function updateBrakeDisplay(brake) {
   const percentage = Math.min(Math.max(brake * 100, 0), 100);
   brakeValueEl.textContent = `${percentage.toFixed(0)}%`;
   brakeFillEl.style.width = `${percentage}%`;
-  
-  // Add data point to chart with absolute timestamp like the working example
-  if (brakeTimeSeries) {
-    brakeTimeSeries.append(Date.now(), percentage);
-    console.log(`Brake chart data: ${Date.now()}, ${percentage}%`);
-    
-    // Debug TimeSeries state
-    if (brakeTimeSeries.data.length > 0) {
-      console.log(`Brake TimeSeries has ${brakeTimeSeries.data.length} data points`);
-    }
-  }
 }
 
 function updateThrottleDisplay(throttle) {
@@ -133,17 +93,6 @@ function updateThrottleDisplay(throttle) {
   const percentage = Math.min(Math.max(throttle * 100, 0), 100);
   throttleValueEl.textContent = `${percentage.toFixed(0)}%`;
   throttleFillEl.style.width = `${percentage}%`;
-  
-  // Add data point to chart with absolute timestamp like the working example
-  if (throttleTimeSeries) {
-    throttleTimeSeries.append(Date.now(), percentage);
-    console.log(`Throttle chart data: ${Date.now()}, ${percentage}%`);
-    
-    // Debug TimeSeries state
-    if (throttleTimeSeries.data.length > 0) {
-      console.log(`Throttle TimeSeries has ${throttleTimeSeries.data.length} data points`);
-    }
-  }
 }
 
 function updateSessionDisplay(session) {
@@ -199,39 +148,8 @@ function updateSessionDisplay(session) {
 function startDataCollection() {
   console.log('Starting data collection');
   isCollectingData = true;
-  telemetryData = []; // Reset data
-}
-
-function collectTelemetryData(data) {
-  if (!isCollectingData) return;
-  
-  // Check that all required data is present
-  if (typeof data.session !== 'number' ||
-      typeof data.gear !== 'number' ||
-      typeof data.brake !== 'number' ||
-      typeof data.throttle !== 'number' ||
-      !data.driverName ||
-      !data.vehicleName ||
-      typeof data.place !== 'number') {
-    console.warn('Incomplete data, point ignored:', data);
-    return;
-  }
-  
-  const timestamp = new Date().toISOString();
-  const dataPoint = {
-    timestamp: timestamp,
-    session: data.session,
-    gear: data.gear,
-    brake: data.brake,
-    throttle: data.throttle,
-    driverName: data.driverName,
-    vehicleName: data.vehicleName,
-    trackName: data.trackName || 'Unknown Track',
-    place: data.place
-  };
-  
-  telemetryData.push(dataPoint);
-  console.log(`Collected data: ${telemetryData.length} points`);
+  // The worker streams the collected rows to the export endpoint in chunks
+  worker.postMessage({ type: 'startCollection' });
 }
 
 function updateExportButtonVisibility(visible) {
@@ -257,126 +175,67 @@ function updateVehicleDisplay(vehicleName) {
   }
 }
 
-function cleanTelemetryData() {
-  // Clean incomplete data before export
-  const cleanedData = telemetryData.filter(point => {
-    return typeof point.session === 'number' &&
-           typeof point.gear === 'number' &&
-           typeof point.brake === 'number' &&
-           typeof point.throttle === 'number' &&
-           point.driverName &&
-           point.vehicleName &&
-           typeof point.place === 'number';
-  });
-  
-  if (cleanedData.length !== telemetryData.length) {
-    console.log(`Cleaning: ${telemetryData.length - cleanedData.length} incomplete points removed`);
-  }
-  
-  return cleanedData;
-}
-
-async function exportTelemetryData() {
-  if (telemetryData.length === 0) {
+function exportTelemetryData() {
+  if (!isCollectingData) {
     alert('No data to export');
     return;
   }
   
-  // Clean data before export
-  const cleanedData = cleanTelemetryData();
-  
-  if (cleanedData.length === 0) {
-    alert('No complete data to export');
-    return;
-  }
-  
   const exportBtn = document.getElementById('exportBtn');
-  const originalText = exportBtn.textContent;
+  exportBtn.dataset.originalText = exportBtn.textContent;
   exportBtn.textContent = 'Export in progress...';
   exportBtn.disabled = true;
   
-  try {
-    const response = await fetch('http://localhost:8000/export-csv', {
-      method: 'POST',
-      headers: {
-        'Content-Type': 'application/json',
-      },
-      body: JSON.stringify({
-        data: cleanedData,
-        sessionInfo: {
-          currentSession: currentSession,
-          totalPoints: cleanedData.length,
-          startTime: cleanedData[0]?.timestamp,
-          endTime: cleanedData[cleanedData.length - 1]?.timestamp
-        }
-      })
-    });
-    
-    if (response.ok) {
-      const result = await response.json();
-      const message = `Export successful! 
-File: ${result.filename}
-Points exported: ${cleanedData.length}
-${telemetryData.length !== cleanedData.length ? 
-  `Points removed (incomplete): ${telemetryData.length - cleanedData.length}` : ''}`;
-      alert(message);
-    } else {
-      const errorData = await response.json();
-      console.error('Error details:', errorData);
-      throw new Error('Error during export');
-    }
-  } catch (error) {
-    console.error('Error during export:', error);
+  // The worker sends the rows not streamed yet and answers with an exported/exportError message
+  worker.postMessage({ type: 'export' });
+}
+
+function finishExport(message) {
+  const exportBtn = document.getElementById('exportBtn');
+  exportBtn.textContent = exportBtn.dataset.originalText;
+  exportBtn.disabled = false;
+  
+  if (message.type === 'exported') {
+    alert(`Export successful! 
+File: ${message.filename}
+Points exported: ${message.points}
+${message.dropped ? `Points dropped (API unreachable): ${message.dropped}` : ''}`);
+  } else {
+    console.error('Error during export:', message.error);
     alert('Error during export');
-  } finally {
-    exportBtn.textContent = originalText;
-    exportBtn.disabled = false;
   }
 }
 
-function connectWebSocket() {
-  sock = new WebSocket(WS_URL);
+function updateFrame(obj) {
+  // Update displays
+  if (typeof obj.gear === 'number') {
+    updateGearDisplay(obj.gear);
+  }
+  if (typeof obj.brake === 'number') {
+    updateBrakeDisplay(obj.brake);
+  }
+  if (typeof obj.throttle === 'number') {
+    updateThrottleDisplay(obj.throttle);
+  }
+  if (typeof obj.session === 'number') {
+    updateSessionDisplay(obj.session);
+  }
+  if (obj.trackName !== undefined) {
+    updateTrackDisplay(obj.trackName);
+  }
+  if (obj.vehicleName !== undefined) {
+    updateVehicleDisplay(obj.vehicleName);
+  }
+}
 
-  sock.onopen = () => {
+function updateConnectionStatus(message) {
+  if (message.connected) {
     statusEl.textContent = 'Connected';
     statusEl.className = 'status connected';
-    console.log('WebSocket connected');
-  };
-
-  sock.onmessage = (evt) => {
-    let obj;
-    try {
-      obj = JSON.parse(evt.data);
-    } catch (e) {
-      console.warn("Invalid JSON:", e);
-      return;
-    }
-    
-    // Update displays
-    if (typeof obj.gear === 'number') {
-      updateGearDisplay(obj.gear);
-    }
-    if (typeof obj.brake === 'number') {
-      updateBrakeDisplay(obj.brake);
-    }
-    if (typeof obj.throttle === 'number') {
-      updateThrottleDisplay(obj.throttle);
-    }
-    if (typeof obj.session === 'number') {
-      updateSessionDisplay(obj.session);
-    }
-    if (obj.trackName !== undefined) {
-      updateTrackDisplay(obj.trackName);
-    }
-    if (obj.vehicleName !== undefined) {
-      updateVehicleDisplay(obj.vehicleName);
-    }
-    
-    // Collect data for export
-    collectTelemetryData(obj);
-  };
-
-  sock.onclose = (ev) => {
+  } else if (message.error) {
+    statusEl.textContent = 'Connection error';
+    statusEl.className = 'status disconnected';
+  } else {
     statusEl.textContent = 'Disconnected - Reconnecting...';
     statusEl.className = 'status disconnected';
     gearValueEl.textContent = '-';
@@ -385,19 +244,24 @@ function connectWebSocket() {
     sessionDescriptionEl.textContent = 'Connection lost';
     trackValueEl.textContent = '-';
     vehicleValueEl.textContent = '-';
-    setTimeout(connectWebSocket, 1000);
-  };
-
-  sock.onerror = (err) => {
-    console.error("WebSocket error:", err);
-    statusEl.textContent = 'Connection error';
-    statusEl.className = 'status disconnected';
-  };
+  }
 }
 
+worker.onmessage = (evt) => {
+  const message = evt.data;
+  if (message.type === 'frame') {
+    updateFrame(message.frame);
+  } else if (message.type === 'series') {
+    drawSeries(brakeCanvas, message.brake, 'rgba(239, 68, 68, 1)', 'rgba(239, 68, 68, 0.2)');
+    drawSeries(throttleCanvas, message.throttle, 'rgba(16, 185, 129, 1)', 'rgba(16, 185, 129, 0.2)');
+  } else if (message.type === 'status') {
+    updateConnectionStatus(message);
+  } else if (message.type === 'exported' || message.type === 'exportError') {
+    finishExport(message);
+  }
+};
+
 // Initialize charts when DOM is loaded
 document.addEventListener('DOMContentLoaded', function() {
-  console.log('DOM loaded, initializing charts...');
   initializeCharts();
-  connectWebSocket();
 });
@@ -0,0 +1,217 @@
+// Telemetry decoding off the main thread: owns the WebSocket, parses the frames into
+// fixed-capacity typed-array ring buffers and streams the collected data to the export
+// endpoint in chunks, so the dashboard memory stays flat however long the session is.
+
+const WS_URL = "ws://localhost:8080/ws";
+const EXPORT_URL = "http://localhost:8000/export-csv";
+
+// ~1 h at 10 Hz for the chart history
+const RING_CAPACITY = 36000;
+// Samples sent to the page for the charts
+const CHART_SAMPLES = 300;
+const CHART_INTERVAL_MS = 100;
+// Collected rows sent to the export endpoint per request
+const EXPORT_CHUNK_ROWS = 3000;
+// Rows kept while the API is unreachable, the oldest are dropped beyond that
+const MAX_PENDING_ROWS = 4 * EXPORT_CHUNK_ROWS;
+
+class RingBuffer {
+  constructor(capacity) {
+    this.capacity = capacity;
+    this.length = 0;
+    this.next = 0;
+    this.channels = {
+      time: new Float64Array(capacity),        // wall clock, ms
+      elapsedTime: new Float64Array(capacity), // sim clock, s
+      brake: new Float32Array(capacity),
+      throttle: new Float32Array(capacity),
+      lapDist: new Float32Array(capacity),
+      gear: new Float32Array(capacity),
+    };
+  }
+
+  push(values) {
+    for (const name in this.channels) {
+      const value = values[name];
+      this.channels[name][this.next] = typeof value === 'number' ? value : NaN;
+    }
+    this.next = (this.next + 1) % this.capacity;
+    this.length = Math.min(this.length + 1, this.capacity);
+  }
+
+  // Copy of the last count samples of a channel, oldest first
+  last(name, count) {
+    const n = Math.min(count, this.length);
+    const source = this.channels[name];
+    const out = new source.constructor(n);
+    const start = (this.next - n + this.capacity) % this.capacity;
+    if (start + n <= this.capacity) {
+      out.set(source.subarray(start, start + n));
+    } else {
+      out.set(source.subarray(start));
+      out.set(source.subarray(0, n - (this.capacity - start)), this.capacity - start);
+    }
+    return out;
+  }
+}
+
+const ring = new RingBuffer(RING_CAPACITY);
+const sessionMetadata = {};
+let sock;
+let chartDirty = false;
+
+// Export streaming state
+let collecting = false;
+let exportFile = null;
+let pendingRows = [];
+let exportedRows = 0;
+let droppedRows = 0;
+let exportInFlight = null;
+
+function connect() {
+  sock = new WebSocket(WS_URL);
+  sock.onopen = () => postMessage({ type: 'status', connected: true });
+  sock.onclose = () => {
+    postMessage({ type: 'status', connected: false });
+    setTimeout(connect, 1000);
+  };
+  sock.onerror = () => postMessage({ type: 'status', connected: false, error: true });
+  sock.onmessage = (evt) => {
+    let obj;
+    try {
+      obj = JSON.parse(evt.data);
+    } catch (e) {
+      return;
+    }
+    // Typed messages (session metadata, lap stats, delta...) are not telemetry frames
+    if (obj.type === 'sessionMetadata') {
+      sessionMetadata[obj.id] = obj;
+      return;
+    }
+    if (obj.type !== undefined || obj.status !== undefined) {
+      return;
+    }
+    handleFrame(obj);
+  };
+}
+
+function handleFrame(frame) {
+  // Frames reference the names through their metadata ID
+  const metadata = sessionMetadata[frame.metadataId];
+  if (metadata) {
+    frame.driverName = metadata.driverName;
+    frame.vehicleName = metadata.vehicleName;
+    frame.trackName = metadata.trackName;
+  }
+  const now = Date.now();
+  ring.push({ ...frame, time: now });
+  chartDirty = true;
+  postMessage({ type: 'frame', frame: frame });
+  collect(frame, now);
+}
+
+function collect(frame, now) {
+  if (!collecting) return;
+  if (typeof frame.session !== 'number' ||
+      typeof frame.gear !== 'number' ||
+      typeof frame.brake !== 'number' ||
+      typeof frame.throttle !== 'number' ||
+      !frame.driverName ||
+      !frame.vehicleName ||
+      typeof frame.place !== 'number') {
+    return;
+  }
+  pendingRows.push({
+    timestamp: new Date(now).toISOString(),
+    session: frame.session,
+    gear: frame.gear,
+    brake: frame.brake,
+    throttle: frame.throttle,
+    driverName: frame.driverName,
+    vehicleName: frame.vehicleName,
+    trackName: frame.trackName || 'Unknown Track',
+    place: frame.place,
+    elapsedTime: frame.elapsedTime,
+    telemetryVersion: frame.telemetryVersion
+  });
+  if (pendingRows.length > MAX_PENDING_ROWS) {
+    droppedRows += pendingRows.length - MAX_PENDING_ROWS;
+    pendingRows.splice(0, pendingRows.length - MAX_PENDING_ROWS);
+  }
+  if (pendingRows.length >= EXPORT_CHUNK_ROWS && !exportInFlight) {
+    flushExport().catch((e) => console.warn('Export chunk failed, will retry:', e));
+  }
+}
+
+// Send the pending rows to the export endpoint, appending to the file of the collection
+async function flushExport() {
+  if (exportInFlight) {
+    await exportInFlight;
+  }
+  if (pendingRows.length === 0) {
+    return;
+  }
+  const rows = pendingRows.splice(0, EXPORT_CHUNK_ROWS);
+  exportInFlight = (async () => {
+    try {
+      const response = await fetch(EXPORT_URL, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+          data: rows,
+          appendTo: exportFile,
+          sessionInfo: {
+            currentSession: rows[rows.length - 1].session,
+            totalPoints: rows.length,
+            startTime: rows[0].timestamp,
+            endTime: rows[rows.length - 1].timestamp
+          }
+        })
+      });
+      if (!response.ok) {
+        throw new Error(`Export failed with status ${response.status}`);
+      }
+      const result = await response.json();
+      exportFile = result.filename;
+      exportedRows += rows.length;
+    } catch (e) {
+      // Put the rows back for the next attempt
+      pendingRows.unshift(...rows);
+      throw e;
+    } finally {
+      exportInFlight = null;
+    }
+  })();
+  await exportInFlight;
+}
+
+onmessage = async (evt) => {
+  const message = evt.data;
+  if (message.type === 'startCollection') {
+    collecting = true;
+    exportFile = null;
+    pendingRows = [];
+    exportedRows = 0;
+    droppedRows = 0;
+  } else if (message.type === 'export') {
+    try {
+      while (pendingRows.length) {
+        await flushExport();
+      }
+      postMessage({ type: 'exported', filename: exportFile, points: exportedRows, dropped: droppedRows });
+    } catch (e) {
+      postMessage({ type: 'exportError', error: String(e) });
+    }
+  }
+};
+
+// Chart snapshots, transferred rather than copied
+setInterval(() => {
+  if (!chartDirty) return;
+  chartDirty = false;
+  const brake = ring.last('brake', CHART_SAMPLES);
+  const throttle = ring.last('throttle', CHART_SAMPLES);
+  postMessage({ type: 'series', brake: brake, throttle: throttle }, [brake.buffer, throttle.buffer]);
+}, CHART_INTERVAL_MS);
+
+connect();